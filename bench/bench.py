@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for iRackPilot Firmware
+Runs the HTTP server, IPMI client and protocol, and the UF2 converter on
+desktop CPython and checks the numbers against a stored baseline
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import shims
+
+shims.install()
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from create_uf2 import FAMILY_ID_RP2040, convert_to_uf2
+from http_server import HTTPServer
+from ipmi_client import IPMIClient
+from ipmi_protocol import IPMIProtocol, IPMIResponse
+from fleet import Fleet
+from bmc_sim import Faults, Rack, SimulatedBMC
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(BENCH_DIR), "build", "bench.json")
+
+# A metric counts as regressed when it is this much worse than the baseline;
+# noisy ones (thread scheduling, tail latency, file I/O) get the wider threshold
+DEFAULT_THRESHOLD = 0.25
+NOISY_THRESHOLD = 0.5
+
+# Reference workload: time-based metrics are rescaled by its speed relative
+# to the baseline's, so a slower or busier machine doesn't read as a regression
+CALIBRATION = "calibration.ops_per_s"
+
+SUITES = ("http", "ipmi", "fleet", "uf2")
+
+# (name, method, path, JSON body) requested by the HTTP suite
+ENDPOINTS = (
+    ("GET /status", "GET", "/status", None),
+    ("GET /ipmi/info", "GET", "/ipmi/info", None),
+    ("GET /metrics", "GET", "/metrics", None),
+    ("POST /ipmi/command", "POST", "/ipmi/command", {"command": "power status"}),
+)
+
+STATUS = {
+    "status": "ready",
+    "firmware_version": "1.0.0",
+    "wifi_connected": True,
+    "ip_address": "127.0.0.1",
+    "model": "Pico W",
+}
+
+
+class Results:
+    """
+    Named measurements, each with a unit and which direction is better
+
+    Every suite runs several times; a metric's value is the median of its runs.
+    scale marks metrics that follow the machine's speed (rates and latencies,
+    not heap bytes or simulated network delays); noisy ones are compared
+    with the wider threshold.
+    """
+
+    def __init__(self):
+        self.runs = {}
+
+    def add(self, name, value, unit, better="higher", scale=True, noisy=False):
+        entry = self.runs.setdefault(name, {"unit": unit, "better": better, "scale": scale,
+                                            "noisy": noisy, "runs": []})
+        entry["runs"].append(round(value, 3))
+
+    def metrics(self):
+        return {name: {"value": percentile(entry["runs"], 0.5), "unit": entry["unit"],
+                       "better": entry["better"], "scale": entry["scale"],
+                       "noisy": entry["noisy"], "runs": entry["runs"]}
+                for name, entry in self.runs.items()}
+
+    def print(self):
+        for name, metric in self.metrics().items():
+            print(f"  {name:<48} {metric['value']:>12.2f} {metric['unit']}")
+
+    def add_latency(self, prefix, latencies, elapsed, unit, scale=True, noisy=False):
+        self.add(f"{prefix}.rate", len(latencies) / elapsed, unit, scale=scale, noisy=noisy)
+        self.add(f"{prefix}.p50_ms", percentile(latencies, 0.50) * 1000, "ms", "lower",
+                 scale=scale, noisy=noisy)
+        self.add(f"{prefix}.p99_ms", percentile(latencies, 0.99) * 1000, "ms", "lower",
+                 scale=scale, noisy=True)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def measure_alloc(make, rounds):
+    """
+    Median transient heap (tracemalloc peak above the starting level)
+    of awaiting make() alone, after one warm-up call
+    """
+    await make()
+    tracemalloc.start()
+    peaks = []
+    try:
+        for _ in range(rounds):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            await make()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return percentile(peaks, 0.5)
+
+
+async def start_bmc(**options):
+    bmc = SimulatedBMC(**options)
+    return bmc, await bmc.start()
+
+
+async def stop_bmc(bmc):
+    """Stop a simulated BMC (or rack) once its handlers have seen the clients disconnect"""
+    await asyncio.sleep(0.05)
+    await bmc.stop()
+
+
+async def connect_client(port):
+    client = IPMIClient()
+    if not await client.connect("127.0.0.1", port, "admin", "admin", "Generic"):
+        raise RuntimeError("Could not connect to the simulated BMC")
+    return client
+
+
+def http_request(port, method, path, body=None):
+    """Blocking HTTP/1.1 request on a new connection, returns the status code"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    sock = socket.create_connection(("127.0.0.1", port))
+    try:
+        sock.sendall(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                     f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        response = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    finally:
+        sock.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def bench_http(results, clients, requests):
+    """Requests/s, latency and transient heap per endpoint under concurrent clients"""
+    bmc, bmc_port = await start_bmc()
+    ipmi = await connect_client(bmc_port)
+    server = HTTPServer("127.0.0.1", 0)
+    server.setup_routes(ipmi, None, lambda: STATUS)
+    task = asyncio.create_task(server.start())
+    await asyncio.sleep(0)
+    port = server.socket.getsockname()[1]
+
+    for name, method, path, body in ENDPOINTS:
+        latencies = []
+
+        def client():
+            for _ in range(requests):
+                start = time.perf_counter()
+                status = http_request(port, method, path, body)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    raise RuntimeError(f"{name} returned {status}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*[asyncio.to_thread(client) for _ in range(clients)])
+        # Client threads contend with the server for the GIL: noisy
+        results.add_latency(f"http.{name}", latencies, time.perf_counter() - start, "req/s",
+                            noisy=True)
+
+        raw = f"{method} {path} HTTP/1.1\r\nHost: bench\r\n\r\n"
+        if body is not None:
+            raw += json.dumps(body)
+        results.add(f"http.{name}.peak_alloc_bytes",
+                    await measure_alloc(lambda: server.handle_request(raw), 50), "B", "lower",
+                    scale=False)
+
+    task.cancel()
+    server.socket.close()
+    ipmi.disconnect()
+    await stop_bmc(bmc)
+
+
+async def bench_ipmi(results, commands, clients):
+    """IPMI round trips per second (one and many sessions) and protocol codec speed"""
+    bmc, port = await start_bmc()
+    reply = bmc.respond(IPMIProtocol().get_chassis_status())
+
+    client = await connect_client(port)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(commands):
+        sent = time.perf_counter()
+        await client.get_power_state()
+        latencies.append(time.perf_counter() - sent)
+    results.add_latency("ipmi.get_power_state", latencies, time.perf_counter() - start, "cmd/s")
+    results.add("ipmi.get_power_state.peak_alloc_bytes",
+                await measure_alloc(client.get_power_state, 200), "B", "lower", scale=False)
+    results.add("ipmi.get_device_info.peak_alloc_bytes",
+                await measure_alloc(client.get_device_info, 200), "B", "lower", scale=False)
+    client.disconnect()
+
+    sessions = [await connect_client(port) for _ in range(clients)]
+    latencies = []
+
+    async def poll(session):
+        for _ in range(commands // clients):
+            sent = time.perf_counter()
+            await session.read_sensor(1)
+            latencies.append(time.perf_counter() - sent)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[poll(session) for session in sessions])
+    results.add_latency(f"ipmi.read_sensor.{clients}_sessions", latencies,
+                        time.perf_counter() - start, "cmd/s")
+    for session in sessions:
+        session.disconnect()
+    await stop_bmc(bmc)
+
+    protocol = IPMIProtocol()
+    response = IPMIResponse()
+    results.add("ipmi.protocol.parse_per_s",
+                best_rate(lambda: protocol.parse_ipmi_response(reply, response), commands * 5),
+                "op/s")
+    results.add("ipmi.protocol.build_per_s",
+                best_rate(protocol.get_chassis_status, commands * 5), "op/s")
+
+
+def calibration_op(values=tuple(range(32))):
+    """Fixed interpreter work (dict, str and int operations) that measures machine speed"""
+    table = {}
+    for value in values:
+        table[str(value)] = value * 3 + 1
+    return sum(table.values())
+
+
+def calibrate(results):
+    results.add(CALIBRATION, best_rate(calibration_op, 20000), "op/s", scale=False)
+
+
+def best_rate(func, calls, rounds=5):
+    """Calls per second of func, best of rounds (timeit style, collector off)"""
+    best = None
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(calls):
+                func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if collecting:
+            gc.enable()
+    return calls / best
+
+
+async def bench_fleet(results, bmcs, latency_ms):
+    """Polling a rack of simulated BMCs (with network-like latency) through Fleet.map()"""
+    rack = Rack(bmcs, faults=Faults(latency_ms=latency_ms, jitter_ms=latency_ms / 2))
+    hosts = await rack.start()
+    fleet = Fleet()
+    start = time.perf_counter()
+    summary = await fleet.map(hosts, lambda client: client.get_power_state(),
+                              username="admin", password="admin")
+    elapsed = time.perf_counter() - start
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} of {bmcs} simulated BMCs failed")
+    latencies = [record["elapsed_ms"] / 1000 for record in summary["results"]]
+    # Dominated by the simulated latency, not by the machine's speed
+    results.add_latency(f"fleet.get_power_state.{bmcs}_bmcs", latencies, elapsed, "host/s",
+                        scale=False)
+    await stop_bmc(rack)
+
+
+def firmware_image(size):
+    """Deterministic image: random code with a quarter of the pages erased (0xFF)"""
+    rng = random.Random(0)
+    pages = []
+    for _ in range(size // 256):
+        pages.append(b"\xff" * 256 if rng.random() < 0.25 else rng.randbytes(256))
+    return b"".join(pages)
+
+
+def bench_uf2(results, size_mb, rounds=3):
+    """UF2 conversion throughput in input MB/s, best of rounds"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "firmware.bin")
+        with open(source, "wb") as f:
+            f.write(firmware_image(size_mb * 1024 * 1024))
+        for sparse in (False, True):
+            best = None
+            for _ in range(rounds):
+                start = time.perf_counter()
+                convert_to_uf2([(source, None)], os.path.join(tmp, "firmware.uf2"),
+                               FAMILY_ID_RP2040, sparse=sparse)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            name = "uf2.sparse" if sparse else "uf2.dense"
+            results.add(f"{name}.mb_per_s", size_mb / best, "MB/s", noisy=True)
+
+
+def compare(metrics, baseline, threshold, noisy_threshold=NOISY_THRESHOLD):
+    """
+    Print every metric against the baseline
+
+    Time-based metrics are first rescaled by the calibration speed of this
+    run relative to the baseline's ("expected" column).
+
+    Returns:
+        Names of metrics worse than expected by more than their threshold
+    """
+    base_metrics = baseline.get("metrics", {})
+    factor = 1.0
+    if CALIBRATION in base_metrics and CALIBRATION in metrics:
+        factor = metrics[CALIBRATION]["value"] / base_metrics[CALIBRATION]["value"]
+        print(f"\nMachine speed vs baseline: {factor:.2f}x (time-based metrics rescaled)")
+    else:
+        print("\nBaseline has no calibration; comparing raw numbers")
+
+    regressions = []
+    print(f"\n{'metric':<48} {'baseline':>12} {'expected':>12} {'current':>12} {'change':>8}")
+    for name, base in base_metrics.items():
+        current = metrics.get(name)
+        if name == CALIBRATION or current is None or not base["value"]:
+            continue
+        higher = base["better"] == "higher"
+        expected = base["value"]
+        if current.get("scale", True):
+            expected = expected * factor if higher else expected / factor
+        change = (current["value"] - expected) / expected
+        worse = -change if higher else change
+        limit = noisy_threshold if current.get("noisy") else threshold
+        flag = ""
+        if worse > limit:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {base['value']:>12.2f} {expected:>12.2f} {current['value']:>12.2f} "
+              f"{change:>+8.1%}{flag}")
+    return regressions
+
+
+@contextlib.contextmanager
+def scratch_directory():
+    """
+    Run in a fresh temporary working directory
+
+    The firmware keeps its FRU and SEL caches in relative directories;
+    each run starts cold and nothing is left in the source tree.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the iRackPilot firmware on CPython")
+    parser.add_argument('suites', nargs='*',
+                        help=f"suites to run (default: all of {', '.join(SUITES)})")
+    parser.add_argument('--clients', type=int, default=4, help="concurrent HTTP clients / BMC sessions")
+    parser.add_argument('--requests', type=int, default=50, help="HTTP requests per client per endpoint")
+    parser.add_argument('--commands', type=int, default=2000, help="IPMI commands per measurement")
+    parser.add_argument('--bmcs', type=int, default=200, help="simulated BMCs in the fleet suite")
+    parser.add_argument('--latency', type=float, default=5, help="simulated BMC latency in ms (fleet)")
+    parser.add_argument('--uf2-mb', type=int, default=4, help="firmware image size for the UF2 suite")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per suite; medians are reported")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="where to write the results JSON")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed fraction worse than the baseline (default: %(default)s)")
+    parser.add_argument('--noisy-threshold', type=float, default=NOISY_THRESHOLD,
+                        help="allowed fraction for noisy metrics: HTTP, p99 latency, UF2 "
+                             "(default: %(default)s)")
+    parser.add_argument('--verbose', action='store_true', help="show firmware log output")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    suites = args.suites or SUITES
+    unknown = [suite for suite in suites if suite not in SUITES]
+    if unknown:
+        print(f"Error: unknown suite(s) {', '.join(unknown)}; available: {', '.join(SUITES)}")
+        sys.exit(1)
+
+    # Paths are resolved before runs change the working directory
+    args.output = os.path.abspath(args.output)
+    args.baseline = os.path.abspath(args.baseline)
+
+    results = Results()
+    for run in range(args.repeat):
+        print(f"Run {run + 1}/{args.repeat}: {', '.join(suites)}")
+        # The firmware logs every connect; keep that out of the report
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output, scratch_directory():
+            calibrate(results)
+            if "http" in suites:
+                asyncio.run(bench_http(results, args.clients, args.requests))
+            if "ipmi" in suites:
+                asyncio.run(bench_ipmi(results, args.commands, args.clients))
+            if "fleet" in suites:
+                asyncio.run(bench_fleet(results, args.bmcs, args.latency))
+            if "uf2" in suites:
+                bench_uf2(results, args.uf2_mb)
+    print()
+    results.print()
+    metrics = results.metrics()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {"clients": args.clients, "requests": args.requests,
+                     "commands": args.commands, "bmcs": args.bmcs, "latency": args.latency,
+                     "uf2_mb": args.uf2_mb, "repeat": args.repeat},
+        },
+        "metrics": metrics,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("No baseline yet; store one with --save-baseline")
+        return
+    regressions = compare(metrics, baseline, args.threshold, args.noisy_threshold)
+    limits = f"{args.threshold:.0%} ({args.noisy_threshold:.0%} for noisy metrics)"
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {limits}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {limits}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+BMC Simulator for iRackPilot
+Simulated BMCs that speak the firmware's RMCP/IPMI framing over TCP, with
+configurable latency, jitter, loss and partial replies, and answer RMCP ASF
+Presence Pings over UDP; one asyncio process hosts hundreds of them on
+consecutive ports or consecutive loopback addresses
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import math
+import random
+import struct
+import time
+
+# Request: RMCP header (4), session header (auth type, session ID, sequence,
+# 16-byte auth code), then rsAddr, netFn, rqSeq, rqAddr, cmd and data
+REQUEST_SESSION_ID = slice(5, 9)
+REQUEST_SEQUENCE = slice(9, 13)
+REQUEST_NETFN = 30
+REQUEST_CMD = 33
+REQUEST_DATA = 34
+
+# Response: 20 header bytes, then rsAddr, netFn, cmd, completion code, data
+RESPONSE_HEADER_SIZE = 20
+
+# RMCP ASF Presence Ping/Pong (UDP, same port as the IPMI stream)
+RMCP_ASF_HEADER = b"\x06\x00\xff\x06"
+ASF_IANA = 4542
+ASF_PRESENCE_PING = 0x80
+ASF_PRESENCE_PONG = 0x40
+
+CC_OK = 0x00
+CC_PARAMETER_NOT_SUPPORTED = 0x80
+CC_INVALID_COMMAND = 0xC1
+CC_INVALID_RESERVATION = 0xC5
+CC_REQUEST_LENGTH = 0xC7
+CC_OUT_OF_RANGE = 0xC9
+CC_CANT_RETURN = 0xCA
+CC_NOT_PRESENT = 0xCB
+
+# Vendor identities: IANA manufacturer ID, product ID and FRU strings
+VENDORS = {
+    "Dell": {"manufacturer_id": 674, "product_id": 0x0100, "manufacturer": "Dell Inc.",
+             "product": "PowerEdge R740", "board": "0WRPXK"},
+    "HP": {"manufacturer_id": 11, "product_id": 0x2000, "manufacturer": "HPE",
+           "product": "ProLiant DL380 Gen10", "board": "ProLiant System Board"},
+    "Supermicro": {"manufacturer_id": 10876, "product_id": 0x0907, "manufacturer": "Supermicro",
+                   "product": "SYS-1029P-WTR", "board": "X11DPU"},
+    "Intel": {"manufacturer_id": 343, "product_id": 0x0BA2, "manufacturer": "Intel Corporation",
+              "product": "S2600WFT", "board": "S2600WFT"},
+}
+
+# Threshold sensors: number, name, sensor type, unit, M, R exponent,
+# typical reading, swing, upper critical, whether it needs chassis power
+SENSORS = (
+    (0x01, "Inlet Temp", 0x01, 1, 1, 0, 24, 2, 42, False),
+    (0x02, "CPU1 Temp", 0x01, 1, 1, 0, 55, 12, 95, True),
+    (0x03, "CPU2 Temp", 0x01, 1, 1, 0, 52, 12, 95, True),
+    (0x10, "FAN1", 0x04, 18, 60, 0, 120, 15, 250, True),
+    (0x11, "FAN2", 0x04, 18, 60, 0, 118, 15, 250, True),
+    (0x20, "12V", 0x02, 4, 6, -2, 200, 2, 220, False),
+    (0x30, "System Power", 0x0B, 6, 4, 0, 70, 20, 200, True),
+)
+
+# Event types the SEL is filled with: sensor type, sensor number, event data
+SEL_EVENTS = (
+    (0x01, 0x02, (0x57, 0x5f, 0x5a)),  # CPU1 over upper non-critical
+    (0x04, 0x10, (0x52, 0x00, 0x05)),  # FAN1 below lower critical
+    (0x08, 0x30, (0x01, 0xff, 0xff)),  # power supply failure
+    (0x0C, 0x40, (0xa0, 0x00, 0x01)),  # correctable ECC
+    (0x10, 0x50, (0x02, 0xff, 0xff)),  # event log cleared
+)
+SEL_CAPACITY = 512
+SEL_RECORD_SIZE = 16
+
+SOL_PAYLOAD = 0x01
+MAX_READ = 32
+
+
+class Faults:
+    """
+    Misbehaviour of one simulated BMC
+
+    Args:
+        latency_ms: Delay before every reply
+        jitter_ms: Uniform extra delay of up to this much either way
+        loss: Probability a reply is dropped
+        partial: Probability a reply is cut short
+        slow: Probability a reply is trickled out in small pieces
+        trickle_ms: Delay between pieces of a slow reply
+        refuse: Accept connections and close them straight away
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, loss=0.0, partial=0.0, slow=0.0,
+                 trickle_ms=20, refuse=False):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.partial = partial
+        self.slow = slow
+        self.trickle_ms = trickle_ms
+        self.refuse = refuse
+
+
+def type_length(text):
+    """FRU type/length byte and 8-bit ASCII data"""
+    data = text.encode()[:63]
+    return bytes((0xC0 | len(data),)) + data
+
+
+def fru_area(content):
+    """Close a FRU area: end marker, padding to 8 bytes and a zero checksum"""
+    area = bytearray(content) + b"\xc1"
+    area += bytes(-(len(area) + 1) % 8)
+    area[1] = (len(area) + 1) // 8
+    area.append(-sum(area) & 0xFF)
+    return bytes(area)
+
+
+def checksum(data):
+    return -sum(data) & 0xFF
+
+
+class PresenceResponder(asyncio.DatagramProtocol):
+    """Answers Presence Pings for one BMC, dropping them like replies under --loss"""
+
+    def __init__(self, bmc):
+        self.bmc = bmc
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        if (len(data) < 12 or data[:4] != RMCP_ASF_HEADER
+                or data[4:8] != struct.pack(">I", ASF_IANA) or data[8] != ASF_PRESENCE_PING):
+            return
+        self.bmc.pings += 1
+        if self.bmc.rng.random() < self.bmc.faults.loss:
+            self.bmc.dropped += 1
+            return
+        # Pong data: IANA and OEM numbers, IPMI supported + ASF 1.0, no interactions
+        pong = (RMCP_ASF_HEADER + struct.pack(">IBBBB", ASF_IANA, ASF_PRESENCE_PONG, data[9], 0, 16)
+                + struct.pack(">IIBB", ASF_IANA, 0, 0x81, 0x00) + bytes(6))
+        self.transport.sendto(pong, address)
+
+
+class SimulatedBMC:
+    """One BMC: device identity, chassis, sensors with SDRs, SEL, FRU and SOL"""
+
+    def __init__(self, index=0, vendor="Dell", faults=None, seed=0, sel_interval=0,
+                 max_read=MAX_READ):
+        self.index = index
+        self.vendor = VENDORS[vendor]
+        self.faults = faults or Faults()
+        self.rng = random.Random(seed * 100003 + index)
+        self.sel_interval = sel_interval
+        self.max_read = max_read
+        self.server = None
+        self.presence = None
+        self.host = None
+        self.port = None
+        self.started = time.time()
+        self.power_on = True
+        self.last_power_event = 0
+        self.sol_active = False
+        self.sdr_reservation = 0
+        self.sel_reservation = 0
+        self.guid = bytes(self.rng.getrandbits(8) for _ in range(16))
+        self.serial = f"SIM{seed:02d}{index:05d}"
+        self.sdrs = self.build_sdrs()
+        self.sel = []
+        self.sel_next_id = 1
+        self.sel_logged = 0
+        self.sel_erased = int(self.started)
+        history = sorted(int(self.started) - self.rng.randint(60, 86400 * 30)
+                         for _ in range(self.rng.randint(5, 20)))
+        for timestamp in history:
+            self.add_sel_event(timestamp)
+        self.fru = self.build_fru()
+        self.requests = 0
+        self.pings = 0
+        self.dropped = 0
+        self.cut = 0
+        self.connections = 0
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.host = host
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.presence, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: PresenceResponder(self), local_addr=(host, self.port))
+        return self.port
+
+    async def stop(self):
+        if self.presence:
+            self.presence.close()
+            self.presence = None
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def stats(self):
+        return {"port": self.port, "connections": self.connections, "requests": self.requests,
+                "pings": self.pings, "dropped": self.dropped, "cut": self.cut}
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            if self.faults.refuse:
+                return
+            while True:
+                # The framing has no length field; the client sends one
+                # request and waits for its reply, so one read is one request
+                packet = await reader.read(1024)
+                if not packet:
+                    break
+                self.requests += 1
+                reply = self.respond(packet)
+                if reply is not None:
+                    await self.send(writer, reply)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, reply):
+        faults = self.faults
+        delay = faults.latency_ms
+        if faults.jitter_ms:
+            delay += self.rng.uniform(-faults.jitter_ms, faults.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if faults.loss and self.rng.random() < faults.loss:
+            self.dropped += 1
+            return
+        if faults.partial and self.rng.random() < faults.partial:
+            self.cut += 1
+            reply = reply[:self.rng.randint(1, len(reply) - 1)]
+        if faults.slow and self.rng.random() < faults.slow:
+            for start in range(0, len(reply), 8):
+                writer.write(reply[start:start + 8])
+                await writer.drain()
+                await asyncio.sleep(faults.trickle_ms / 1000)
+            return
+        writer.write(reply)
+        await writer.drain()
+
+    def respond(self, packet):
+        """Reply packet for a request packet (None for garbage)"""
+        if len(packet) <= REQUEST_CMD:
+            return None
+        netfn, cmd = packet[REQUEST_NETFN], packet[REQUEST_CMD]
+        handler = self.COMMANDS.get((netfn, cmd))
+        if handler is None:
+            cc, data = CC_INVALID_COMMAND, b""
+        else:
+            cc, data = handler(self, packet[REQUEST_DATA:])
+        return (bytes((0x06, 0x00, 0xff, 0x07, 0x00)) + packet[REQUEST_SESSION_ID]
+                + packet[REQUEST_SEQUENCE] + bytes(RESPONSE_HEADER_SIZE - 13)
+                + bytes((0x81, netfn + 1, cmd, cc)) + data)
+
+    # App commands
+
+    def get_device_id(self, data):
+        vendor = self.vendor
+        manufacturer = vendor["manufacturer_id"]
+        return CC_OK, bytes((
+            0x20, 0x81, 0x02, 0x25, 0x02, 0xbf,
+            manufacturer & 0xFF, manufacturer >> 8 & 0xFF, manufacturer >> 16 & 0x0F,
+            vendor["product_id"] & 0xFF, vendor["product_id"] >> 8,
+            0x00, 0x00, 0x00, 0x00))
+
+    def get_system_guid(self, data):
+        return CC_OK, self.guid
+
+    def activate_payload(self, data):
+        if len(data) < 2:
+            return CC_REQUEST_LENGTH, b""
+        if data[0] != SOL_PAYLOAD:
+            return CC_PARAMETER_NOT_SUPPORTED, b""
+        if self.sol_active:
+            return CC_PARAMETER_NOT_SUPPORTED, b""
+        self.sol_active = True
+        # Aux data, inbound and outbound payload sizes, UDP port, VLAN
+        return CC_OK, struct.pack("<IHHHH", 0, 252, 252, 623, 0xFFFF)
+
+    def deactivate_payload(self, data):
+        if len(data) < 2 or data[0] != SOL_PAYLOAD:
+            return CC_PARAMETER_NOT_SUPPORTED, b""
+        if not self.sol_active:
+            return CC_PARAMETER_NOT_SUPPORTED, b""
+        self.sol_active = False
+        return CC_OK, b""
+
+    def get_payload_status(self, data):
+        if not data or data[0] != SOL_PAYLOAD:
+            return CC_PARAMETER_NOT_SUPPORTED, b""
+        return CC_OK, bytes((1, 1 if self.sol_active else 0, 0))
+
+    def get_sol_config(self, data):
+        if len(data) < 4:
+            return CC_REQUEST_LENGTH, b""
+        values = {
+            0x00: b"\x00",          # set in progress
+            0x01: b"\x01",          # SOL enabled
+            0x02: b"\x02",          # privilege: user
+            0x05: b"\x0a",          # non-volatile bit rate 115.2 kbps
+            0x06: b"\x0a",          # volatile bit rate
+            0x08: b"\x6f\x02",      # payload port 623
+        }
+        value = values.get(data[1])
+        if value is None:
+            return CC_PARAMETER_NOT_SUPPORTED, b""
+        return CC_OK, b"\x11" + value
+
+    # Chassis commands
+
+    def get_chassis_status(self, data):
+        state = (0x01 if self.power_on else 0x00) | 0x40  # restore policy: previous
+        return CC_OK, bytes((state, self.last_power_event, 0x00, 0x00))
+
+    def chassis_control(self, data):
+        if not data:
+            return CC_REQUEST_LENGTH, b""
+        action = data[0]
+        if action == 0x00 or action == 0x05:
+            self.power_on = False
+        elif action in (0x01, 0x02, 0x03):
+            self.power_on = True
+        else:
+            return CC_OUT_OF_RANGE, b""
+        self.last_power_event = 0x10  # last state change by IPMI command
+        return CC_OK, b""
+
+    # Sensors and SDR repository
+
+    def sensor_value(self, sensor):
+        """Raw reading: slow sine drift plus noise around the typical value"""
+        number, _, _, _, _, _, typical, swing, critical, powered = sensor
+        if powered and not self.power_on:
+            return None
+        phase = (time.time() - self.started) / 60 + self.index
+        value = typical + swing * math.sin(phase + number) + self.rng.uniform(-1, 1)
+        return max(0, min(255, int(value)))
+
+    def get_sensor_reading(self, data):
+        if not data:
+            return CC_REQUEST_LENGTH, b""
+        sensor = self.sensor(data[0])
+        if sensor is None:
+            return CC_NOT_PRESENT, b""
+        value = self.sensor_value(sensor)
+        if value is None:
+            # Reading unavailable while the host is off
+            return CC_OK, bytes((0x00, 0xe0, 0x00))
+        critical = sensor[8]
+        state = 0x00
+        if value >= critical:
+            state = 0x18  # upper critical and non-critical
+        elif value >= critical * 9 // 10:
+            state = 0x08  # upper non-critical
+        return CC_OK, bytes((value, 0xc0, state))
+
+    def sensor(self, number):
+        for sensor in SENSORS:
+            if sensor[0] == number:
+                return sensor
+        return None
+
+    def build_sdrs(self):
+        """Full Sensor Records (type 0x01), one per sensor"""
+        records = []
+        for record_id, sensor in enumerate(SENSORS, 1):
+            number, name, sensor_type, unit, m, r_exp, typical, _, critical, _ = sensor
+            body = bytes((
+                0x20, 0x00, number,                 # owner, LUN, sensor number
+                0x07, 0x01, 0x7f, 0x68,             # entity, instance, init, capabilities
+                sensor_type, 0x01,                  # sensor type, threshold event type
+                0x80, 0x0a, 0x80, 0x0a, 0x3f, 0x3f,  # assertion/deassertion/reading masks
+                0x00, unit, 0x00, 0x00,             # units 1-3, linear
+                m & 0xFF, (m >> 8 & 0x03) << 6, 0x00, 0x00, 0x00,  # M, tolerance, B, accuracy
+                (r_exp & 0x0F) << 4,                # R and B exponents
+                0x07, typical, critical - 1, 0x00, 0xff, 0x00,  # analog flags, nominal, ranges
+                critical + 5, critical, critical * 9 // 10,     # upper thresholds
+                0x00, 0x00, 0x00,                   # lower thresholds
+                0x02, 0x02, 0x00, 0x00, 0x00,       # hysteresis, reserved, OEM
+            )) + type_length(name)
+            records.append(struct.pack("<HBBB", record_id, 0x51, 0x01, len(body)) + body)
+        return records
+
+    def get_sdr_info(self, data):
+        return CC_OK, struct.pack("<BHHIIB", 0x51, len(self.sdrs), 0xFFFF,
+                                  int(self.started), 0, 0x02)
+
+    def reserve_sdr(self, data):
+        self.sdr_reservation = (self.sdr_reservation + 1) & 0xFFFF or 1
+        return CC_OK, struct.pack("<H", self.sdr_reservation)
+
+    def get_sdr(self, data):
+        if len(data) < 6:
+            return CC_REQUEST_LENGTH, b""
+        reservation, record_id, offset, count = struct.unpack("<HHBB", data[:6])
+        if offset and reservation != self.sdr_reservation:
+            return CC_INVALID_RESERVATION, b""
+        index = 0 if record_id == 0 else record_id - 1
+        if record_id == 0xFFFF:
+            index = len(self.sdrs) - 1
+        if not 0 <= index < len(self.sdrs):
+            return CC_NOT_PRESENT, b""
+        record = self.sdrs[index]
+        next_id = index + 2 if index + 1 < len(self.sdrs) else 0xFFFF
+        if count == 0xFF:
+            count = len(record)
+        if count > self.max_read:
+            return CC_CANT_RETURN, b""
+        return CC_OK, struct.pack("<H", next_id) + record[offset:offset + count]
+
+    # System event log
+
+    def add_sel_event(self, timestamp):
+        if len(self.sel) >= SEL_CAPACITY:
+            return
+        sensor_type, number, event_data = SEL_EVENTS[self.rng.randrange(len(SEL_EVENTS))]
+        self.sel.append(struct.pack("<HBIHBBBB3s", self.sel_next_id, 0x02, timestamp,
+                                    0x0020, 0x04, sensor_type, number, 0x01, bytes(event_data)))
+        self.sel_next_id += 1
+
+    def update_sel(self):
+        """Log the events that were due since the last access"""
+        if not self.sel_interval:
+            return
+        now = time.time()
+        due = int((now - self.started) / self.sel_interval)
+        while self.sel_logged < due:
+            self.add_sel_event(int(now))
+            self.sel_logged += 1
+
+    def sel_timestamps(self):
+        added = struct.unpack("<I", self.sel[-1][3:7])[0] if self.sel else 0
+        return added, self.sel_erased
+
+    def get_sel_info(self, data):
+        self.update_sel()
+        added, erased = self.sel_timestamps()
+        free = (SEL_CAPACITY - len(self.sel)) * SEL_RECORD_SIZE
+        return CC_OK, struct.pack("<BHHIIB", 0x51, len(self.sel), min(free, 0xFFFF),
+                                  added, erased, 0x0a)
+
+    def reserve_sel(self, data):
+        self.sel_reservation = (self.sel_reservation + 1) & 0xFFFF or 1
+        return CC_OK, struct.pack("<H", self.sel_reservation)
+
+    def clear_sel(self, data):
+        """Clear SEL: reservation, "CLR", then 0xAA to erase or 0x00 for status"""
+        if len(data) < 6:
+            return CC_REQUEST_LENGTH, b""
+        if data[2:5] != b"CLR" or struct.unpack("<H", data[:2])[0] != self.sel_reservation:
+            return CC_INVALID_RESERVATION, b""
+        if data[5] == 0xAA:
+            self.sel = []
+            self.sel_erased = int(time.time())
+        return CC_OK, b"\x01"
+
+    def get_sel_entry(self, data):
+        if len(data) < 6:
+            return CC_REQUEST_LENGTH, b""
+        self.update_sel()
+        reservation, record_id, offset, count = struct.unpack("<HHBB", data[:6])
+        if offset and reservation != self.sel_reservation:
+            return CC_INVALID_RESERVATION, b""
+        if not self.sel:
+            return CC_NOT_PRESENT, b""
+        if record_id == 0x0000:
+            index = 0
+        elif record_id == 0xFFFF:
+            index = len(self.sel) - 1
+        else:
+            index = next((i for i, record in enumerate(self.sel)
+                          if struct.unpack("<H", record[:2])[0] == record_id), None)
+            if index is None:
+                return CC_NOT_PRESENT, b""
+        record = self.sel[index]
+        next_id = (struct.unpack("<H", self.sel[index + 1][:2])[0]
+                   if index + 1 < len(self.sel) else 0xFFFF)
+        if count == 0xFF:
+            count = SEL_RECORD_SIZE
+        return CC_OK, struct.pack("<H", next_id) + record[offset:offset + count]
+
+    # FRU inventory
+
+    def build_fru(self):
+        vendor = self.vendor
+        chassis = fru_area(bytes((0x01, 0x00, 0x17)) + type_length(f"CH-{vendor['product_id']:04X}")
+                           + type_length(f"{self.serial}C"))
+        minutes = int((self.started - 820454400) / 60) - self.rng.randint(0, 525600)
+        board = fru_area(bytes((0x01, 0x00, 0x00)) + struct.pack("<I", minutes)[:3]
+                         + type_length(vendor["manufacturer"]) + type_length(vendor["board"])
+                         + type_length(f"{self.serial}B") + type_length("PN-0042")
+                         + type_length(""))
+        product = fru_area(bytes((0x01, 0x00, 0x00)) + type_length(vendor["manufacturer"])
+                           + type_length(vendor["product"]) + type_length("SKU-1")
+                           + type_length("A01") + type_length(self.serial)
+                           + type_length(f"ASSET-{self.index:05d}") + type_length(""))
+        offsets = (1, 1 + len(chassis) // 8, 1 + (len(chassis) + len(board)) // 8)
+        header = bytes((0x01, 0x00, offsets[0], offsets[1], offsets[2], 0x00, 0x00))
+        return header + bytes((checksum(header),)) + chassis + board + product
+
+    def get_fru_info(self, data):
+        if not data:
+            return CC_REQUEST_LENGTH, b""
+        if data[0] != 0:
+            return CC_NOT_PRESENT, b""
+        return CC_OK, struct.pack("<HB", len(self.fru), 0x00)
+
+    def read_fru(self, data):
+        if len(data) < 4:
+            return CC_REQUEST_LENGTH, b""
+        device, offset, count = struct.unpack("<BHB", data[:4])
+        if device != 0:
+            return CC_NOT_PRESENT, b""
+        if count > self.max_read:
+            return CC_CANT_RETURN, b""
+        if offset >= len(self.fru):
+            return CC_OUT_OF_RANGE, b""
+        chunk = self.fru[offset:offset + count]
+        return CC_OK, bytes((len(chunk),)) + chunk
+
+    COMMANDS = {
+        (0x06, 0x01): get_device_id,
+        (0x06, 0x37): get_system_guid,
+        (0x06, 0x48): activate_payload,
+        (0x06, 0x49): deactivate_payload,
+        (0x06, 0x4A): get_payload_status,
+        (0x00, 0x01): get_chassis_status,
+        (0x00, 0x02): chassis_control,
+        (0x04, 0x2D): get_sensor_reading,
+        (0x0A, 0x10): get_fru_info,
+        (0x0A, 0x11): read_fru,
+        (0x0A, 0x20): get_sdr_info,
+        (0x0A, 0x22): reserve_sdr,
+        (0x0A, 0x23): get_sdr,
+        (0x0A, 0x40): get_sel_info,
+        (0x0A, 0x42): reserve_sel,
+        (0x0A, 0x43): get_sel_entry,
+        (0x0A, 0x47): clear_sel,
+        (0x0C, 0x22): get_sol_config,
+    }
+
+
+class Rack:
+    """
+    Many simulated BMCs in one event loop, vendors assigned round-robin
+
+    BMCs get consecutive ports on one address, or with spread=True
+    consecutive addresses from host on one port (like a real subnet; on
+    Linux all of 127.0.0.0/8 is loopback).
+    """
+
+    def __init__(self, count, host="127.0.0.1", base_port=0, vendors=None, seed=0,
+                 faults=None, sel_interval=0, max_read=MAX_READ, spread=False):
+        self.host = host
+        self.base_port = base_port
+        self.spread = spread
+        vendors = vendors or sorted(VENDORS)
+        self.bmcs = [SimulatedBMC(index, vendors[index % len(vendors)], faults, seed,
+                                  sel_interval, max_read)
+                     for index in range(count)]
+
+    async def start(self):
+        """Listen on base_port + index (any free port when base_port is 0)"""
+        port = self.base_port
+        for bmc in self.bmcs:
+            if self.spread:
+                # Every address shares the first BMC's port
+                port = await bmc.start(str(ipaddress.ip_address(self.host) + bmc.index), port)
+            else:
+                await bmc.start(self.host, self.base_port + bmc.index if self.base_port else 0)
+        return self.hosts()
+
+    async def stop(self):
+        for bmc in self.bmcs:
+            await bmc.stop()
+
+    def hosts(self):
+        """Host entries in the form Fleet.map() accepts"""
+        return [{"host": bmc.host, "port": bmc.port, "vendor": bmc.vendor["manufacturer"]}
+                for bmc in self.bmcs]
+
+    def stats(self):
+        totals = {"bmcs": len(self.bmcs)}
+        for bmc in self.bmcs:
+            for key, value in bmc.stats().items():
+                if key != "port":
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+async def serve(args):
+    faults = Faults(args.latency, args.jitter, args.loss, args.partial, args.slow)
+    vendors = [args.vendor] if args.vendor else None
+    rack = Rack(args.count, args.host, args.base_port, vendors, args.seed, faults,
+                args.sel_interval, args.max_read, args.spread)
+    hosts = await rack.start()
+    ports = [host["port"] for host in hosts]
+    if args.spread:
+        print(f"{len(hosts)} simulated BMC(s) on {hosts[0]['host']}-{hosts[-1]['host']}, "
+              f"port {ports[0]}")
+    elif args.base_port:
+        print(f"{len(hosts)} simulated BMC(s) on {args.host}, ports {ports[0]}-{ports[-1]}")
+    else:
+        print(f"{len(hosts)} simulated BMC(s) on {args.host}, ports {', '.join(map(str, ports))}")
+    try:
+        while True:
+            await asyncio.sleep(args.report or 3600)
+            if args.report:
+                print(rack.stats())
+    finally:
+        await rack.stop()
+        print(rack.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated BMCs for load and fault testing")
+    parser.add_argument('--count', type=int, default=1, help="number of BMCs")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--base-port', type=int, default=16230,
+                        help="first port, the rest follow consecutively (0: any free ports)")
+    parser.add_argument('--spread', action='store_true',
+                        help="one address per BMC from --host up, all on --base-port")
+    parser.add_argument('--vendor', choices=sorted(VENDORS), help="default: all, round-robin")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0, help="reply delay in ms")
+    parser.add_argument('--jitter', type=float, default=0, help="random extra delay, +/- ms")
+    parser.add_argument('--loss', type=float, default=0, help="probability a reply is dropped")
+    parser.add_argument('--partial', type=float, default=0, help="probability a reply is cut short")
+    parser.add_argument('--slow', type=float, default=0,
+                        help="probability a reply is trickled out in 8-byte pieces")
+    parser.add_argument('--sel-interval', type=float, default=0,
+                        help="seconds between new SEL events (0: static log)")
+    parser.add_argument('--max-read', type=int, default=MAX_READ,
+                        help="largest FRU/SDR read accepted in one request")
+    parser.add_argument('--report', type=float, default=0, help="print counters every N seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+MicroPython Shims for iRackPilot Benchmarks
+Stand-ins for machine, network, uasyncio and the time.ticks_* functions so
+the firmware modules import and run unchanged on desktop CPython
+"""
+
+import asyncio
+import os
+import sys
+import time
+import traceback
+import types
+
+FIRMWARE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pico-w")
+
+
+class Pin:
+    OUT = 1
+    IN = 0
+
+    def __init__(self, pin, mode=OUT):
+        self.pin = pin
+        self.state = 0
+
+    def value(self, state=None):
+        if state is None:
+            return self.state
+        self.state = int(bool(state))
+
+    def on(self):
+        self.state = 1
+
+    def off(self):
+        self.state = 0
+
+
+class WLAN:
+    """Station that is always connected, AP that is never started"""
+
+    def __init__(self, interface=0):
+        self.interface = interface
+        self.up = False
+
+    def active(self, state=None):
+        if state is None:
+            return self.up
+        self.up = state
+
+    def isconnected(self):
+        return self.interface == 0
+
+    def connect(self, ssid, password):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def status(self, param=None):
+        return -50 if param == 'rssi' else 3
+
+    def ifconfig(self):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+    def config(self, *args, **kwargs):
+        if args == ('mac',):
+            return b"\x28\xcd\xc1\x00\x00\x01"
+
+
+def install():
+    """Register the shims and put the firmware directory on sys.path"""
+    start = time.perf_counter()
+    time.ticks_ms = lambda: int((time.perf_counter() - start) * 1000)
+    time.ticks_us = lambda: int((time.perf_counter() - start) * 1000000)
+    time.ticks_diff = lambda new, old: new - old
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    sys.print_exception = traceback.print_exception
+
+    machine = types.ModuleType("machine")
+    machine.Pin = Pin
+    machine.reset = lambda: None
+    machine.freq = lambda: 133000000
+    machine.unique_id = lambda: b"\x00\x01\x02\x03\x04\x05\x06\x07"
+
+    network = types.ModuleType("network")
+    network.STA_IF = 0
+    network.AP_IF = 1
+    network.STAT_GOT_IP = 3
+    network.WLAN = WLAN
+
+    # CPython streams recv up to 256 KB at a time and trim the result, which
+    # would swamp the allocation numbers; MicroPython reads what is asked for
+    from asyncio import selector_events
+    transport = getattr(selector_events, "_SelectorSocketTransport", None)
+    if transport is not None and hasattr(transport, "max_size"):
+        transport.max_size = 4096
+
+    sys.modules.setdefault("machine", machine)
+    sys.modules.setdefault("network", network)
+    sys.modules.setdefault("uasyncio", asyncio)
+    if FIRMWARE_DIR not in sys.path:
+        sys.path.insert(0, FIRMWARE_DIR)
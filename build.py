@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Build Driver for iRackPilot Firmware
+Builds every board target concurrently; each step's output is cached
+under the hash of its inputs, so unchanged steps are skipped
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import bundle
+from create_uf2 import convert_to_uf2
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+VERSION = "1.0.0"
+
+# Board target -> firmware source directory. Both boards run the same
+# firmware (board.py picks the limits at runtime), so module steps are
+# shared between targets through the cache
+FIRMWARE_DIR = os.path.join(SCRIPT_DIR, "pico-w")
+TARGETS = {
+    "pico-w": FIRMWARE_DIR,
+    "pico-2-w": FIRMWARE_DIR,
+}
+
+# Tools whose code affects every artifact; editing them invalidates the cache
+TOOL_FILES = ("build.py", "bundle.py", "create_uf2.py")
+
+README_TEMPLATE = """iRackPilot Firmware for {model}
+Version {version}
+
+INSTALLATION:
+1. Flash MicroPython to your Pico:
+   - Download from: https://micropython.org/download/rp2-pico-w/
+   - Hold BOOTSEL, connect USB, copy .uf2 to RPI-RP2 drive
+
+2. Upload these files to your Pico:
+   - Use Thonny: File > Save As > Raspberry Pi Pico
+   - Or use rshell/ampy
+   - Or: python3 bundle.py upload <this directory>  (only changed files)
+   - Or flash {package}_fs.uf2 after MicroPython (replaces the filesystem)
+   - Already running iRackPilot: python3 bundle.py ota {package}.ota <device IP>...
+
+3. Configure WiFi in main.py:
+   - Edit WIFI_SSID and WIFI_PASSWORD
+
+4. Restart Pico and check serial output for IP address
+
+FILES:
+{files}
+
+For more information, see BUILD_UF2.md
+"""
+
+def hash_parts(*parts):
+    """Stable hash of strings/bytes used as a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+def hash_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class Cache:
+    """Content-addressed store: one directory per step output, keyed by input hash"""
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key, build):
+        """
+        Return the entry directory for key, running build(tmp_dir) on a miss
+
+        Entries are built in a temporary directory and renamed into place,
+        so a crashed or concurrent build never leaves a partial entry.
+        """
+        entry = self.path(key)
+        if os.path.isdir(entry):
+            with self.lock:
+                self.hits += 1
+            return entry
+
+        tmp = f"{entry}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            build(tmp)
+            os.replace(tmp, entry)
+        except OSError:
+            # Another worker stored the same entry first
+            if not os.path.isdir(entry):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        with self.lock:
+            self.misses += 1
+        return entry
+
+class Builder:
+    """Builds board targets through the cache"""
+
+    def __init__(self, output_dir, cache, jobs, mpy_cross):
+        self.output_dir = output_dir
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=jobs)
+        self.mpy_cross = mpy_cross
+        self.tool_hash = hash_parts(*[hash_file(os.path.join(SCRIPT_DIR, name))
+                                      for name in TOOL_FILES])
+        # Precompiled output depends on the exact mpy-cross binary
+        self.mpy_id = ""
+        if mpy_cross:
+            st = os.stat(mpy_cross)
+            self.mpy_id = f"{os.path.realpath(mpy_cross)}:{st.st_size}:{st.st_mtime_ns}"
+
+    def module(self, src_path):
+        """Step 1: strip or precompile one source module"""
+        with open(src_path, 'rb') as f:
+            source = f.read()
+        key = hash_parts("module", self.tool_hash, self.mpy_id, os.path.basename(src_path), source)
+
+        def build(tmp):
+            out_name, mode = bundle.process_module(src_path, tmp, self.mpy_cross)
+            entry = bundle.file_entry(tmp, out_name, src_path, mode)
+            with open(os.path.join(tmp, "meta.json"), 'w') as f:
+                json.dump({"name": out_name, "entry": entry}, f)
+
+        entry_dir = self.cache.get(key, build)
+        with open(os.path.join(entry_dir, "meta.json")) as f:
+            meta = json.load(f)
+        return entry_dir, meta["name"], meta["entry"]
+
+    def package(self, model, modules):
+        """Step 2: manifest, README, filesystem image, UF2 and zip for a target"""
+        package = f"irackpilot_{model}_v{VERSION}"
+        files = {name: entry for _, name, entry in modules}
+        key = hash_parts("package", self.tool_hash, model, VERSION,
+                         json.dumps(files, sort_keys=True),
+                         "littlefs" if bundle.littlefs else "")
+
+        def build(tmp):
+            staging = os.path.join(tmp, package)
+            os.makedirs(staging)
+            for entry_dir, name, _ in modules:
+                shutil.copy2(os.path.join(entry_dir, name), os.path.join(staging, name))
+            manifest = bundle.write_manifest(staging, model, VERSION, files)
+            bundle.pack_ota(staging, manifest, os.path.join(tmp, f"{package}.ota"))
+
+            board = bundle.BOARDS[model]
+            image = os.path.join(tmp, f"{package}_fs.img")
+            if bundle.build_fs_image(staging, manifest, image, board["fs_size"]):
+                convert_to_uf2([(image, board["fs_base"])], os.path.join(tmp, f"{package}_fs.uf2"),
+                               board["family_id"], sparse=True)
+
+            listing = '\n'.join(sorted(os.listdir(staging)) + ["README.txt"])
+            with open(os.path.join(staging, "README.txt"), 'w') as f:
+                f.write(README_TEMPLATE.format(model=model, version=VERSION,
+                                               package=package, files=listing))
+
+            with zipfile.ZipFile(os.path.join(tmp, f"{package}.zip"), 'w',
+                                 zipfile.ZIP_DEFLATED) as archive:
+                for name in sorted(os.listdir(staging)):
+                    archive.write(os.path.join(staging, name), f"{package}/{name}")
+
+        return package, self.cache.get(key, build)
+
+    def build_target(self, model):
+        """Build one board target, returns (package name, artifacts)"""
+        src_dir = TARGETS[model]
+        sources = sorted(os.path.join(src_dir, name) for name in os.listdir(src_dir)
+                         if name.endswith(".py"))
+        modules = list(self.pool.map(self.module, sources))
+        package, entry_dir = self.package(model, modules)
+        return package, sync_tree(entry_dir, self.output_dir)
+
+def sync_tree(src, dst):
+    """
+    Mirror a cache entry into the output directory
+
+    Files whose content already matches are left alone, and stale files
+    in mirrored package directories are removed.
+
+    Returns:
+        List of top-level artifact names
+    """
+    os.makedirs(dst, exist_ok=True)
+    artifacts = sorted(os.listdir(src))
+    for name in artifacts:
+        src_path = os.path.join(src, name)
+        dst_path = os.path.join(dst, name)
+        if os.path.isdir(src_path):
+            sync_tree(src_path, dst_path)
+            wanted = set(os.listdir(src_path))
+            for stale in set(os.listdir(dst_path)) - wanted:
+                os.remove(os.path.join(dst_path, stale))
+        elif not same_file(src_path, dst_path):
+            shutil.copy2(src_path, dst_path)
+    return artifacts
+
+def same_file(a, b):
+    """Cheap equality check: size and mtime (copy2 preserves mtime)"""
+    try:
+        sa, sb = os.stat(a), os.stat(b)
+    except OSError:
+        return False
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+def main():
+    parser = argparse.ArgumentParser(description="Build iRackPilot firmware for all boards")
+    parser.add_argument('targets', nargs='*', help=f"board targets (default: all of "
+                                                   f"{', '.join(sorted(TARGETS))})")
+    parser.add_argument('--output', default=os.path.join(SCRIPT_DIR, "build"))
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--no-mpy', action='store_true', help="don't precompile with mpy-cross")
+    parser.add_argument('--clean-cache', action='store_true', help="drop cached artifacts first")
+    args = parser.parse_args()
+
+    targets = args.targets or sorted(TARGETS)
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        print(f"Error: unknown target(s) {', '.join(unknown)}; "
+              f"available: {', '.join(sorted(TARGETS))}")
+        sys.exit(1)
+
+    start = time.time()
+    cache_dir = os.path.join(args.output, ".cache")
+    if args.clean_cache:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    mpy_cross = None if args.no_mpy else bundle.find_mpy_cross()
+    builder = Builder(args.output, Cache(cache_dir), args.jobs, mpy_cross)
+
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        results = list(pool.map(builder.build_target, targets))
+    builder.pool.shutdown()
+
+    for target, (package, artifacts) in zip(targets, results):
+        print(f"✓ {target}: {', '.join(artifacts)}")
+    cache = builder.cache
+    print(f"Built {len(targets)} target(s) in {time.time() - start:.2f}s "
+          f"({cache.misses} steps run, {cache.hits} cached)")
+    if not mpy_cross:
+        print("Note: mpy-cross not found, bundles contain stripped source")
+    if not bundle.littlefs:
+        print("Note: littlefs-python not installed, no filesystem images")
+
+if __name__ == '__main__':
+    main()
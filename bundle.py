@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Firmware Bundler for iRackPilot Firmware
+Strips and precompiles firmware modules, writes a content-hash manifest
+and packs everything into a filesystem image that create_uf2.py can wrap
+"""
+
+import argparse
+import ast
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tokenize
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+try:
+    import littlefs
+except ImportError:
+    littlefs = None
+
+from create_uf2 import FAMILY_ID_RP2040, FAMILY_ID_RP2350_ARM_S, convert_to_uf2
+
+# MicroPython only runs these as source, so they are never precompiled
+SOURCE_ONLY = ("boot.py", "main.py")
+
+MANIFEST_NAME = "manifest.json"
+
+# OTA archive read by ota.py on the device: magic, then (name_len, size)
+# headers each followed by name and data, manifest first, name_len 0 ends it
+OTA_MAGIC = b"IRPOTA1\x00"
+OTA_ENTRY = struct.Struct("<HI")
+
+# Filesystem layout of the MicroPython builds (must match the firmware)
+FS_BLOCK_SIZE = 4096
+FS_PROG_SIZE = 256
+FS_READ_SIZE = 32
+BOARDS = {
+    "pico-w": {
+        "family_id": FAMILY_ID_RP2040,
+        "fs_base": 0x10000000 + 2048 * 1024 - 848 * 1024,
+        "fs_size": 848 * 1024,
+    },
+    "pico-2-w": {
+        "family_id": FAMILY_ID_RP2350_ARM_S,
+        "fs_base": 0x10000000 + 1536 * 1024,
+        "fs_size": 4096 * 1024 - 1536 * 1024,
+    },
+}
+
+def sha256_file(path):
+    """SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def docstring_lines(tree):
+    """Map the first line of every docstring to whether it is its body's only statement"""
+    lines = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if (body and isinstance(body[0], ast.Expr)
+                    and isinstance(body[0].value, ast.Constant)
+                    and isinstance(body[0].value.value, str)):
+                lines[body[0].lineno] = len(body) == 1
+    return lines
+
+def strip_source(source):
+    """
+    Remove comments, docstrings and blank lines from Python source
+
+    Docstrings that are the only statement of a body become "pass".
+    Multi-line string literals are left untouched. If the result does
+    not compile, the original source is returned.
+    """
+    try:
+        docstrings = docstring_lines(ast.parse(source))
+        tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    except (SyntaxError, tokenize.TokenError):
+        return source
+
+    lines = source.splitlines(keepends=True)
+    edits = []
+    protected = set()
+    line_start = True
+
+    for tok in tokens:
+        if tok.type == tokenize.COMMENT:
+            edits.append((tok.start, tok.end, ""))
+        elif tok.type == tokenize.STRING:
+            if line_start and tok.start[0] in docstrings:
+                edits.append((tok.start, tok.end, "pass" if docstrings[tok.start[0]] else ""))
+            elif tok.end[0] > tok.start[0]:
+                protected.update(range(tok.start[0], tok.end[0] + 1))
+        if tok.type not in (tokenize.INDENT, tokenize.DEDENT, tokenize.NL, tokenize.COMMENT):
+            line_start = tok.type in (tokenize.NEWLINE, tokenize.ENCODING)
+
+    # Apply edits back to front; lines swallowed by an edit become None
+    for (start_line, start_col), (end_line, end_col), text in reversed(edits):
+        first = lines[start_line - 1]
+        last = lines[end_line - 1]
+        lines[start_line - 1] = first[:start_col] + text + last[end_col:]
+        for i in range(start_line, end_line):
+            lines[i] = None
+
+    out = []
+    for number, line in enumerate(lines, 1):
+        if line is None:
+            continue
+        if number in protected:
+            out.append(line)
+        elif line.strip():
+            out.append(line.rstrip() + "\n")
+
+    stripped = ''.join(out)
+    try:
+        compile(stripped, "<bundle>", "exec")
+    except SyntaxError:
+        return source
+    return stripped
+
+def find_mpy_cross():
+    """Locate mpy-cross ($MPY_CROSS or PATH), or None"""
+    path = os.environ.get("MPY_CROSS") or shutil.which("mpy-cross")
+    return path if path and os.path.exists(path) else None
+
+def process_module(src_path, out_dir, mpy_cross):
+    """
+    Precompile or strip one module into out_dir
+
+    Returns:
+        (output file name, mode) where mode is "mpy", "stripped" or "copied"
+    """
+    name = os.path.basename(src_path)
+
+    if mpy_cross and name not in SOURCE_ONLY:
+        out_name = name[:-3] + ".mpy"
+        result = subprocess.run([mpy_cross, "-s", name, "-o", os.path.join(out_dir, out_name),
+                                 src_path], capture_output=True, text=True)
+        if result.returncode == 0:
+            return out_name, "mpy"
+        print(f"Warning: mpy-cross failed for {name}, using source: {result.stderr.strip()}")
+
+    with open(src_path, encoding='utf-8') as f:
+        source = f.read()
+    stripped = strip_source(source)
+    with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+        f.write(stripped)
+    return name, "stripped" if stripped is not source else "copied"
+
+def file_entry(out_dir, out_name, src_path, mode):
+    """Manifest entry for one processed file"""
+    out_path = os.path.join(out_dir, out_name)
+    return {
+        "sha256": sha256_file(out_path),
+        "size": os.path.getsize(out_path),
+        "source": os.path.basename(src_path),
+        "source_sha256": sha256_file(src_path),
+        "mode": mode,
+    }
+
+def write_manifest(out_dir, model, version, files):
+    """Write manifest.json for a bundle and return it"""
+    manifest = {"model": model, "version": version, "files": files}
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+def bundle(src_dir, out_dir, model, version, mpy_cross=None):
+    """
+    Process every firmware module and write the manifest
+
+    Returns:
+        Manifest dict
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+
+    for name in sorted(os.listdir(src_dir)):
+        if not name.endswith(".py"):
+            continue
+        src_path = os.path.join(src_dir, name)
+        out_name, mode = process_module(src_path, out_dir, mpy_cross)
+        files[out_name] = file_entry(out_dir, out_name, src_path, mode)
+
+    return write_manifest(out_dir, model, version, files)
+
+def build_fs_image(out_dir, manifest, image_path, fs_size):
+    """
+    Pack the bundle into a LittleFS v2 image matching the MicroPython filesystem
+
+    Returns:
+        True if the image was written, False if littlefs-python is missing
+    """
+    if littlefs is None:
+        return False
+
+    fs = littlefs.LittleFS(block_size=FS_BLOCK_SIZE, block_count=fs_size // FS_BLOCK_SIZE,
+                           prog_size=FS_PROG_SIZE, read_size=FS_READ_SIZE)
+    for name in sorted(manifest["files"]) + [MANIFEST_NAME]:
+        with open(os.path.join(out_dir, name), 'rb') as src, fs.open(name, 'wb') as dst:
+            dst.write(src.read())
+
+    with open(image_path, 'wb') as f:
+        f.write(fs.context.buffer)
+    return True
+
+def pack_ota(out_dir, manifest, ota_path):
+    """
+    Write the bundle as an OTA archive for POST /ota
+
+    Returns:
+        SHA-256 hex digest of the archive
+    """
+    with open(ota_path, 'wb') as dst:
+        dst.write(OTA_MAGIC)
+        for name in [MANIFEST_NAME] + sorted(manifest["files"]):
+            path = os.path.join(out_dir, name)
+            encoded = name.encode()
+            dst.write(OTA_ENTRY.pack(len(encoded), os.path.getsize(path)))
+            dst.write(encoded)
+            with open(path, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+        dst.write(OTA_ENTRY.pack(0, 0))
+    return sha256_file(ota_path)
+
+def push_ota(ota_path, host, port=8080, reboot=True, timeout=60):
+    """
+    Stream an OTA archive to one device
+
+    Returns:
+        (ok, message)
+    """
+    size = os.path.getsize(ota_path)
+    query = "?reboot=1" if reboot else ""
+    conn = HTTPConnection(host, port, timeout=timeout)
+    try:
+        with open(ota_path, 'rb') as f:
+            conn.request("POST", "/ota" + query, body=f, headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(size),
+                "X-OTA-SHA256": sha256_file(ota_path),
+            })
+        response = conn.getresponse()
+        reply = json.loads(response.read() or b"{}")
+    except (OSError, ValueError) as e:
+        return False, str(e)
+    finally:
+        conn.close()
+    if response.status != 200 or not reply.get("success"):
+        return False, reply.get("error", f"HTTP {response.status}")
+    return True, f"slot {reply['ota']['active']} v{reply['ota']['version']}"
+
+def push_all(ota_path, hosts, port=8080, reboot=True, jobs=8):
+    """Push an OTA archive to many devices concurrently, returns the failure count"""
+    def push(host):
+        ok, message = push_ota(ota_path, host, port, reboot)
+        print(f"{'✓' if ok else '✗'} {host}: {message}")
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        results = list(pool.map(push, hosts))
+    return results.count(False)
+
+def changed_files(local, remote):
+    """
+    Compare two manifests
+
+    Returns:
+        (files to upload, files to delete from the device)
+    """
+    remote_files = remote.get("files", {}) if remote else {}
+    upload = [name for name, info in sorted(local["files"].items())
+              if remote_files.get(name, {}).get("sha256") != info["sha256"]]
+    delete = [name for name in sorted(remote_files) if name not in local["files"]]
+    return upload, delete
+
+def mpremote(*args, capture=False):
+    """Run an mpremote command"""
+    return subprocess.run(["mpremote", *args], capture_output=capture, text=True)
+
+def upload(out_dir, device="auto"):
+    """Push only the files whose hash differs from the device's manifest"""
+    if not shutil.which("mpremote"):
+        print("Error: mpremote not found (pip install mpremote)")
+        return False
+
+    with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+        local = json.load(f)
+
+    result = mpremote("connect", device, "cat", ":" + MANIFEST_NAME, capture=True)
+    try:
+        remote = json.loads(result.stdout) if result.returncode == 0 else None
+    except ValueError:
+        remote = None
+
+    to_upload, to_delete = changed_files(local, remote)
+    if not to_upload and not to_delete:
+        print("Device is up to date")
+        return True
+
+    # A stale .py would shadow a newly uploaded .mpy, so delete first
+    for name in to_delete:
+        print(f"Removing {name}")
+        mpremote("connect", device, "rm", ":" + name)
+    for name in to_upload + [MANIFEST_NAME]:
+        print(f"Uploading {name}")
+        if mpremote("connect", device, "cp", os.path.join(out_dir, name), ":" + name).returncode:
+            print(f"Error: upload of {name} failed")
+            return False
+
+    print(f"Uploaded {len(to_upload)} changed files, removed {len(to_delete)}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle iRackPilot firmware for a board")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="strip/precompile modules and write the manifest")
+    build.add_argument('src_dir')
+    build.add_argument('out_dir')
+    build.add_argument('--model', required=True, choices=sorted(BOARDS))
+    build.add_argument('--version', default="1.0.0")
+    build.add_argument('--image', help="also write a LittleFS filesystem image here")
+    build.add_argument('--uf2', help="wrap the filesystem image into this UF2 file")
+    build.add_argument('--ota', help="also write an OTA archive for POST /ota here")
+    build.add_argument('--no-mpy', action='store_true', help="don't precompile with mpy-cross")
+
+    push = sub.add_parser('upload', help="upload changed files to a device with mpremote")
+    push.add_argument('out_dir')
+    push.add_argument('--device', default="auto")
+
+    ota = sub.add_parser('ota', help="stream an OTA archive to devices over the network")
+    ota.add_argument('archive')
+    ota.add_argument('hosts', nargs='+')
+    ota.add_argument('--port', type=int, default=8080)
+    ota.add_argument('--jobs', type=int, default=8, help="devices updated at once")
+    ota.add_argument('--no-reboot', action='store_true', help="install without restarting")
+
+    args = parser.parse_args()
+
+    if args.command == 'upload':
+        sys.exit(0 if upload(args.out_dir, args.device) else 1)
+
+    if args.command == 'ota':
+        failed = push_all(args.archive, args.hosts, args.port, not args.no_reboot, args.jobs)
+        print(f"Updated {len(args.hosts) - failed}/{len(args.hosts)} devices")
+        sys.exit(1 if failed else 0)
+
+    mpy_cross = None if args.no_mpy else find_mpy_cross()
+    if mpy_cross:
+        print(f"Precompiling with {mpy_cross} (must match the device's MicroPython version)")
+    else:
+        print("mpy-cross not found, bundling stripped source")
+
+    manifest = bundle(args.src_dir, args.out_dir, args.model, args.version, mpy_cross)
+    for name, info in sorted(manifest["files"].items()):
+        print(f"  {name:<24} {info['size']:>7} bytes  ({info['mode']})")
+
+    if args.ota:
+        digest = pack_ota(args.out_dir, manifest, args.ota)
+        print(f"OTA archive: {args.ota} (sha256 {digest})")
+
+    if args.image:
+        board = BOARDS[args.model]
+        if build_fs_image(args.out_dir, manifest, args.image, board["fs_size"]):
+            print(f"Filesystem image: {args.image} "
+                  f"(base=0x{board['fs_base']:08x}, family_id=0x{board['family_id']:08x})")
+            if args.uf2:
+                # LittleFS never reads unused blocks before erasing them, so
+                # sparse output is safe here even where a sector keeps old data
+                _, size, _ = convert_to_uf2([(args.image, board["fs_base"])], args.uf2,
+                                            board["family_id"], sparse=True)
+                print(f"Filesystem UF2: {args.uf2} ({size} bytes)")
+        else:
+            print("littlefs-python not installed, skipping filesystem image "
+                  "(pip install littlefs-python)")
+
+if __name__ == '__main__':
+    main()
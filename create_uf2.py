@@ -4,17 +4,166 @@ UF2 File Creator for iRackPilot Firmware
 Converts binary files to UF2 format for Raspberry Pi Pico
 """
 
+import argparse
+import mmap
 import struct
 import sys
 import os
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # UF2 Magic Numbers
 UF2_MAGIC_START0 = 0x0A324655  # "UF2\n"
 UF2_MAGIC_START1 = 0x9E5D5157  # Random number
 UF2_MAGIC_END = 0x0AB16F30     # "UF2\n" reversed
 
+# UF2 Flags
+UF2_FLAG_FAMILY_ID_PRESENT = 0x00002000
+
+# Block layout: 32-byte header, 476-byte data area (256 used), 4-byte footer
+UF2_BLOCK_SIZE = 512
+UF2_PAYLOAD_SIZE = 256
+UF2_HEADER = struct.Struct('<IIIIIIII')
+UF2_FOOTER = struct.Struct('<I')
+UF2_FOOTER_OFFSET = UF2_BLOCK_SIZE - UF2_FOOTER.size
+UF2_MAX_PAYLOAD = UF2_FOOTER_OFFSET - UF2_HEADER.size
+
+# Whole-block view used by the verifier: header fields and magic end only
+UF2_BLOCK = struct.Struct('<IIIIIIII476xI')
+UF2_FIELDS = ('magic0', 'magic1', 'flags', 'target_addr', 'payload_size',
+              'block_no', 'num_blocks', 'family_id', 'magic_end')
+if np is not None:
+    UF2_DTYPE = np.dtype({
+        'names': UF2_FIELDS,
+        'formats': ['<u4'] * len(UF2_FIELDS),
+        'offsets': [0, 4, 8, 12, 16, 20, 24, 28, UF2_FOOTER_OFFSET],
+        'itemsize': UF2_BLOCK_SIZE,
+    })
+
 # Family IDs
-FAMILY_ID_RP2040 = 0xe48bff56  # Raspberry Pi Pico W and Pico 2 W
+FAMILY_ID_RP2040 = 0xe48bff56        # Raspberry Pi Pico W
+FAMILY_ID_RP2350_ARM_S = 0xe48bff59  # Raspberry Pi Pico 2 W (Arm, secure)
+
+# Input is streamed to the output file in batches of this many blocks
+WRITE_BATCH_BLOCKS = 256
+
+# Pages matching erased flash are omitted in sparse mode. Zero-filled pages are
+# always written: the bootrom erases only sectors it writes, so a skipped page
+# reads back as 0xFF or stale data, never as zeros.
+ERASED_PAGE = b'\xff' * UF2_PAYLOAD_SIZE
+
+# ELF program header type for loadable segments
+ELF_PT_LOAD = 1
+
+class Segment:
+    """A contiguous run of data at a target address"""
+    
+    def __init__(self, address, data, source):
+        self.address = address
+        self.data = memoryview(data)
+        self.source = source
+    
+    @property
+    def end(self):
+        return self.address + len(self.data)
+
+def fill_uf2_block(buf, offset, payload, target_addr, block_num, num_blocks, family_id):
+    """
+    Write one 512-byte UF2 block into buf at offset
+
+    payload may be shorter than 256 bytes; the rest of the block
+    (padding and unused data area) is zero-filled.
+    """
+    UF2_HEADER.pack_into(buf, offset,
+        UF2_MAGIC_START0,            # Magic Start 0
+        UF2_MAGIC_START1,            # Magic Start 1
+        UF2_FLAG_FAMILY_ID_PRESENT,  # Flags
+        target_addr,                 # Target Address
+        UF2_PAYLOAD_SIZE,            # Payload Size
+        block_num,                   # Block Number
+        num_blocks,                  # Total Blocks
+        family_id                    # Family ID
+    )
+    start = offset + UF2_HEADER.size
+    end = start + len(payload)
+    buf[start:end] = payload
+    # Zero padding up to the footer (the buffer may be reused)
+    buf[end:offset + UF2_FOOTER_OFFSET] = bytes(offset + UF2_FOOTER_OFFSET - end)
+    UF2_FOOTER.pack_into(buf, offset + UF2_FOOTER_OFFSET, UF2_MAGIC_END)
+
+def iter_pages(data, base_address):
+    """Split contiguous data into (address, payload) pages"""
+    view = memoryview(data)
+    for start in range(0, len(view), UF2_PAYLOAD_SIZE):
+        yield base_address + start, view[start:start + UF2_PAYLOAD_SIZE]
+
+def collect_pages(segments):
+    """
+    Map one or more segments onto 256-byte aligned flash pages
+
+    Full aligned pages reference the input without copying; pages shared
+    by two segments or only partly covered are assembled in a buffer.
+
+    Returns:
+        List of (address, payload) sorted by address
+    """
+    segments = sorted(segments, key=lambda seg: seg.address)
+    for prev, seg in zip(segments, segments[1:]):
+        if seg.address < prev.end:
+            raise ValueError(f"{seg.source} overlaps {prev.source} at 0x{seg.address:08x}")
+    
+    pages = {}
+    for seg in segments:
+        view = seg.data
+        offset = 0
+        while offset < len(view):
+            addr = seg.address + offset
+            page = addr - addr % UF2_PAYLOAD_SIZE
+            start = addr - page
+            count = min(UF2_PAYLOAD_SIZE - start, len(view) - offset)
+            chunk = view[offset:offset + count]
+            if count == UF2_PAYLOAD_SIZE:
+                pages[page] = chunk
+            else:
+                buf = pages.get(page)
+                if buf is None:
+                    buf = pages[page] = bytearray(UF2_PAYLOAD_SIZE)
+                buf[start:start + count] = chunk
+            offset += count
+    
+    return sorted(pages.items())
+
+def is_empty_page(payload):
+    """Check whether a page is all 0xFF (erased)"""
+    return payload == ERASED_PAGE
+
+def uf2_page_blocks(pages, family_id=FAMILY_ID_RP2040, batch_blocks=WRITE_BATCH_BLOCKS):
+    """
+    Generate UF2 output for a list of (address, payload) pages
+
+    Yields memoryviews into a single reused buffer, so each one must be
+    consumed (e.g. written to a file) before asking for the next.
+    """
+    num_blocks = len(pages)
+    buf = bytearray(batch_blocks * UF2_BLOCK_SIZE)
+    out = memoryview(buf)
+    
+    for first in range(0, num_blocks, batch_blocks):
+        count = min(batch_blocks, num_blocks - first)
+        for i in range(count):
+            block_num = first + i
+            target_addr, payload = pages[block_num]
+            fill_uf2_block(buf, i * UF2_BLOCK_SIZE, payload,
+                           target_addr, block_num, num_blocks, family_id)
+        yield out[:count * UF2_BLOCK_SIZE]
+
+def uf2_blocks(data, family_id=FAMILY_ID_RP2040, base_address=0x10000000,
+               batch_blocks=WRITE_BATCH_BLOCKS):
+    """Generate UF2 output for contiguous data in batches of blocks"""
+    return uf2_page_blocks(list(iter_pages(data, base_address)), family_id, batch_blocks)
 
 def create_uf2(data, family_id=FAMILY_ID_RP2040, base_address=0x10000000):
     """
@@ -28,111 +177,439 @@ def create_uf2(data, family_id=FAMILY_ID_RP2040, base_address=0x10000000):
     Returns:
         UF2 formatted binary data
     """
-    num_blocks = (len(data) + 255) // 256
-    uf2_data = b''
+    view = memoryview(data)
+    num_blocks = (len(view) + UF2_PAYLOAD_SIZE - 1) // UF2_PAYLOAD_SIZE
+    uf2_data = bytearray(num_blocks * UF2_BLOCK_SIZE)
     
     for block_num in range(num_blocks):
-        block_data = data[block_num * 256:(block_num + 1) * 256]
-        block_data = block_data.ljust(256, b'\x00')
-        
-        # Calculate target address
-        target_addr = base_address + (block_num * 256)
-        
-        # UF2 Block Header (32 bytes)
-        header = struct.pack('<IIIIIIII',
-            UF2_MAGIC_START0,      # Magic Start 0
-            UF2_MAGIC_START1,      # Magic Start 1
-            0x00002000,            # Flags (file container)
-            target_addr,           # Target Address
-            256,                   # Payload Size
-            block_num,             # Block Number
-            num_blocks,            # Total Blocks
-            family_id              # Family ID
-        )
-        
-        # Block Data (256 bytes)
-        # Magic End (4 bytes)
-        footer = struct.pack('<I', UF2_MAGIC_END)
-        
-        uf2_data += header + block_data + footer
+        start = block_num * UF2_PAYLOAD_SIZE
+        fill_uf2_block(uf2_data, block_num * UF2_BLOCK_SIZE,
+                       view[start:start + UF2_PAYLOAD_SIZE],
+                       base_address + start, block_num, num_blocks, family_id)
     
     return uf2_data
 
-def verify_uf2(filename):
-    """Verify a UF2 file is valid"""
-    with open(filename, 'rb') as f:
-        data = f.read()
+def map_input(f):
+    """Memory-map an open file read-only (empty files map to b'')"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def load_elf(data, source):
+    """Extract PT_LOAD segments (at their physical load address) from an ELF image"""
+    if data[4] not in (1, 2) or data[5] not in (1, 2):
+        raise ValueError(f"{source}: unsupported ELF class or encoding")
+    is64 = data[4] == 2
+    order = '<' if data[5] == 1 else '>'
     
-    if len(data) % 512 != 0:
-        return False, "File size must be multiple of 512 bytes"
+    if is64:
+        phoff, = struct.unpack_from(order + 'Q', data, 0x20)
+        phentsize, phnum = struct.unpack_from(order + 'HH', data, 0x36)
+        phdr = struct.Struct(order + 'IIQQQQQQ')
+    else:
+        phoff, = struct.unpack_from(order + 'I', data, 0x1C)
+        phentsize, phnum = struct.unpack_from(order + 'HH', data, 0x2A)
+        phdr = struct.Struct(order + 'IIIIIIII')
     
-    num_blocks = len(data) // 512
+    view = memoryview(data)
+    segments = []
+    for i in range(phnum):
+        fields = phdr.unpack_from(data, phoff + i * phentsize)
+        if is64:
+            p_type, _, p_offset, _, p_paddr, p_filesz = fields[:6]
+        else:
+            p_type, p_offset, _, p_paddr, p_filesz = fields[:5]
+        if p_type == ELF_PT_LOAD and p_filesz:
+            segments.append(Segment(p_paddr, view[p_offset:p_offset + p_filesz],
+                                    f"{source}[{len(segments)}]"))
     
-    for i in range(num_blocks):
-        block = data[i * 512:(i + 1) * 512]
-        
-        # Check magic numbers
-        magic0 = struct.unpack('<I', block[0:4])[0]
-        magic1 = struct.unpack('<I', block[4:8])[0]
-        magic_end = struct.unpack('<I', block[508:512])[0]
+    if not segments:
+        raise ValueError(f"{source}: no loadable segments")
+    return segments
+
+def load_hex(data, source):
+    """Parse an Intel HEX image into contiguous segments"""
+    segments = []
+    current = None
+    upper = 0
+    
+    for line_num, line in enumerate(bytes(data).decode('ascii').splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith(':'):
+            raise ValueError(f"{source}:{line_num}: missing record mark")
+        record = bytes.fromhex(line[1:])
+        if len(record) < 5 or len(record) != record[0] + 5 or sum(record) & 0xFF:
+            raise ValueError(f"{source}:{line_num}: bad record length or checksum")
         
+        record_type = record[3]
+        payload = record[4:-1]
+        if record_type == 0x00:
+            addr = upper + (record[1] << 8 | record[2])
+            if current is None or addr != current[0] + len(current[1]):
+                current = [addr, bytearray()]
+                segments.append(current)
+            current[1] += payload
+        elif record_type == 0x01:
+            break
+        elif record_type == 0x02:
+            upper = (payload[0] << 8 | payload[1]) << 4
+        elif record_type == 0x04:
+            upper = (payload[0] << 8 | payload[1]) << 16
+        # 0x03/0x05 (start address) records don't map to flash
+    
+    if not segments:
+        raise ValueError(f"{source}: no data records")
+    return [Segment(addr, data, f"{source}[{i}]") for i, (addr, data) in enumerate(segments)]
+
+def parse_input_spec(spec):
+    """Split "file[@address]" into (path, address or None)"""
+    path, sep, address = spec.rpartition('@')
+    if sep and path and not os.path.exists(spec):
+        return path, int(address, 0)
+    return spec, None
+
+def load_segments(path, address, maps):
+    """
+    Load an input file as a list of segments
+
+    ELF files (by magic) and Intel HEX files (by .hex/.ihex extension)
+    carry their own addresses; anything else is treated as a flat binary
+    at address, even if its first byte happens to be ':'. Memory maps
+    opened here are appended to maps for the caller to close.
+    """
+    with open(path, 'rb') as f:
+        data = map_input(f)
+    if isinstance(data, mmap.mmap):
+        maps.append(data)
+    
+    if data[:4] == b'\x7fELF':
+        return load_elf(data, path)
+    if path.lower().endswith(('.hex', '.ihex')):
+        return load_hex(data, path)
+    return [Segment(address, data, path)]
+
+def write_uf2_pages(pages, output_file, family_id=FAMILY_ID_RP2040):
+    """Stream (address, payload) pages into a UF2 file, returns bytes written"""
+    written = 0
+    with open(output_file, 'wb') as dst:
+        for chunk in uf2_page_blocks(pages, family_id):
+            dst.write(chunk)
+            written += len(chunk)
+    return written
+
+def segment_report(segments, pages, skipped):
+    """Per-segment sizes and page counts for the size report"""
+    report = []
+    for seg in segments:
+        first = seg.address - seg.address % UF2_PAYLOAD_SIZE
+        total = len(range(first, seg.end, UF2_PAYLOAD_SIZE))
+        omitted = sum(1 for addr in range(first, seg.end, UF2_PAYLOAD_SIZE) if addr in skipped)
+        report.append({
+            "source": seg.source,
+            "start": seg.address,
+            "end": seg.end,
+            "size": len(seg.data),
+            "pages": total,
+            "skipped": omitted,
+        })
+    return report
+
+def _convert(inputs, output_file, family_id, base_address, sparse, maps):
+    segments = []
+    for path, address in inputs:
+        segments.extend(load_segments(path, base_address if address is None else address, maps))
+    
+    pages = collect_pages(segments)
+    skipped = set()
+    if sparse:
+        skipped = {addr for addr, payload in pages if is_empty_page(payload)}
+        pages = [page for page in pages if page[0] not in skipped]
+    
+    input_size = sum(len(seg.data) for seg in segments)
+    written = write_uf2_pages(pages, output_file, family_id)
+    return input_size, written, segment_report(segments, pages, skipped)
+
+def convert_to_uf2(inputs, output_file, family_id=FAMILY_ID_RP2040, base_address=0x10000000,
+                   sparse=False):
+    """
+    Convert and merge binary, ELF and Intel HEX inputs into one UF2 file
+
+    Args:
+        inputs: List of (path, address) for ELF, Intel HEX or binary files;
+            address only applies to binaries (None for base_address)
+        output_file: UF2 file to write
+        family_id: UF2 family ID
+        base_address: Address for flat binaries without "@address"
+        sparse: Omit pages that are entirely 0xFF
+
+    Returns:
+        (input_size, output_size, per-segment report)
+    """
+    maps = []
+    try:
+        return _convert(inputs, output_file, family_id, base_address, sparse, maps)
+    finally:
+        for data in maps:
+            try:
+                data.close()
+            except BufferError:
+                # Still referenced by a traceback; freed with it
+                pass
+
+def write_uf2_file(input_file, output_file, family_id=FAMILY_ID_RP2040, base_address=0x10000000):
+    """
+    Stream a binary file into a UF2 file
+
+    The input is memory-mapped and the output written block batch by
+    block batch, so neither is held in memory as a whole.
+
+    Returns:
+        (input_size, output_size) in bytes
+    """
+    input_size, output_size, _ = convert_to_uf2([(input_file, base_address)], output_file,
+                                                family_id, base_address)
+    return input_size, output_size
+
+def print_segment_report(report):
+    """Print the per-segment size report"""
+    print(f"{'Segment':<32} {'Start':>10} {'End':>10} {'Size':>9} {'Pages':>6} {'Skipped':>7}")
+    for seg in report:
+        print(f"{seg['source']:<32} 0x{seg['start']:08x} 0x{seg['end']:08x} "
+              f"{seg['size']:>9} {seg['pages']:>6} {seg['skipped']:>7}")
+
+# Verifier checks, in report order
+UF2_CHECKS = (
+    ('magic0', "Invalid magic start0"),
+    ('magic1', "Invalid magic start1"),
+    ('magic_end', "Invalid magic end"),
+    ('payload_size', "Bad payload size"),
+    ('block_no', "Wrong block number"),
+    ('num_blocks', "Total block count mismatch"),
+    ('family_id', "Wrong family ID"),
+    ('overlap', "Overlapping or out-of-order target address"),
+    ('gap', "Non-contiguous target address"),
+)
+
+def _bad_blocks_python(data, num_blocks, family_id, payload_size):
+    """Run all header checks in one struct.iter_unpack pass"""
+    bad = {key: [] for key, _ in UF2_CHECKS}
+    prev_end = None
+    
+    for i, (magic0, magic1, flags, addr, size, block_no, total, family,
+            magic_end) in enumerate(UF2_BLOCK.iter_unpack(data)):
         if magic0 != UF2_MAGIC_START0:
-            return False, f"Invalid magic start0 in block {i}"
+            bad['magic0'].append(i)
         if magic1 != UF2_MAGIC_START1:
-            return False, f"Invalid magic start1 in block {i}"
+            bad['magic1'].append(i)
         if magic_end != UF2_MAGIC_END:
-            return False, f"Invalid magic end in block {i}"
+            bad['magic_end'].append(i)
+        if size == 0 or size > UF2_MAX_PAYLOAD or (payload_size and size != payload_size):
+            bad['payload_size'].append(i)
+        if block_no != i:
+            bad['block_no'].append(i)
+        if total != num_blocks:
+            bad['num_blocks'].append(i)
+        if flags & UF2_FLAG_FAMILY_ID_PRESENT and family != family_id:
+            bad['family_id'].append(i)
+        if prev_end is not None:
+            if addr < prev_end:
+                bad['overlap'].append(i)
+            elif addr > prev_end:
+                bad['gap'].append(i)
+        prev_end = addr + size
     
-    return True, "UF2 file is valid"
+    return bad
 
-def main():
-    if len(sys.argv) < 3:
-        print("Usage: python3 create_uf2.py <input.bin> <output.uf2> [family_id] [base_address]")
-        print("\nFamily IDs:")
-        print(f"  RP2040 (Pico W/Pico 2 W): 0x{FAMILY_ID_RP2040:08x}")
-        print("\nExample:")
-        print("  python3 create_uf2.py firmware.bin firmware.uf2")
-        sys.exit(1)
+def _bad_blocks_numpy(data, num_blocks, family_id, payload_size):
+    """Run all header checks as vectorized comparisons over a structured array"""
+    blocks = np.frombuffer(data, dtype=UF2_DTYPE, count=num_blocks)
+    size = blocks['payload_size']
+    addr = blocks['target_addr'].astype(np.int64)
+    prev_end = addr[:-1] + size[:-1]
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    size_bad = (size == 0) | (size > UF2_MAX_PAYLOAD)
+    if payload_size:
+        size_bad |= size != payload_size
     
-    # Parse optional arguments
-    family_id = FAMILY_ID_RP2040
-    base_address = 0x10000000
+    masks = {
+        'magic0': blocks['magic0'] != UF2_MAGIC_START0,
+        'magic1': blocks['magic1'] != UF2_MAGIC_START1,
+        'magic_end': blocks['magic_end'] != UF2_MAGIC_END,
+        'payload_size': size_bad,
+        'block_no': blocks['block_no'] != np.arange(num_blocks),
+        'num_blocks': blocks['num_blocks'] != num_blocks,
+        'family_id': ((blocks['flags'] & UF2_FLAG_FAMILY_ID_PRESENT) != 0)
+                     & (blocks['family_id'] != family_id),
+    }
+    bad = {key: np.flatnonzero(mask).tolist() for key, mask in masks.items()}
+    # Address checks compare each block with its predecessor
+    bad['overlap'] = (np.flatnonzero(addr[1:] < prev_end) + 1).tolist()
+    bad['gap'] = (np.flatnonzero(addr[1:] > prev_end) + 1).tolist()
+    return bad
+
+def uf2_problems(data, family_id=None, contiguous=True, payload_size=UF2_PAYLOAD_SIZE,
+                 use_numpy=True):
+    """
+    Check every UF2 block header and return a list of problems
+
+    Args:
+        data: UF2 file contents (bytes, bytearray or mmap)
+        family_id: Expected family ID (default: that of the first block)
+        contiguous: Report gaps between consecutive target addresses
+        payload_size: Required payload size (None allows any valid size)
+        use_numpy: Use NumPy for the checks when it is installed
+
+    Returns:
+        List of human-readable problem descriptions (empty if valid)
+    """
+    if len(data) == 0:
+        return ["File is empty"]
+    if len(data) % UF2_BLOCK_SIZE != 0:
+        return ["File size must be multiple of 512 bytes"]
     
-    if len(sys.argv) > 3:
-        family_id = int(sys.argv[3], 0)  # Allow hex (0x...) or decimal
+    num_blocks = len(data) // UF2_BLOCK_SIZE
+    if family_id is None:
+        family_id = UF2_HEADER.unpack_from(data, 0)[7]
     
-    if len(sys.argv) > 4:
-        base_address = int(sys.argv[4], 0)
+    if use_numpy and np is not None:
+        bad = _bad_blocks_numpy(data, num_blocks, family_id, payload_size)
+    else:
+        bad = _bad_blocks_python(data, num_blocks, family_id, payload_size)
     
-    # Check input file exists
-    if not os.path.exists(input_file):
-        print(f"Error: Input file '{input_file}' not found")
+    problems = []
+    for key, message in UF2_CHECKS:
+        blocks = bad[key]
+        if not blocks or (key == 'gap' and not contiguous):
+            continue
+        shown = ', '.join(str(i) for i in blocks[:8])
+        more = f", ... ({len(blocks)} blocks)" if len(blocks) > 8 else ""
+        problems.append(f"{message} in block {shown}{more}")
+    return problems
+
+def verify_uf2(filename, family_id=None, contiguous=True, payload_size=UF2_PAYLOAD_SIZE):
+    """Verify a UF2 file is valid, returns (valid, message)"""
+    with open(filename, 'rb') as f:
+        data = map_input(f)
+        try:
+            problems = uf2_problems(data, family_id, contiguous, payload_size)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    
+    if problems:
+        return False, '; '.join(problems)
+    return True, "UF2 file is valid"
+
+def find_uf2_files(paths):
+    """Expand files and directories into a sorted list of .uf2 files"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.extend(os.path.join(root, name) for name in names
+                             if name.lower().endswith('.uf2'))
+        else:
+            found.append(path)
+    return sorted(found)
+
+def verify_main(args):
+    """--verify mode: check UF2 files and directories of artifacts"""
+    files = find_uf2_files(args.paths)
+    if not files:
+        print("No UF2 files found")
         sys.exit(1)
     
-    # Read input binary
-    print(f"Reading {input_file}...")
-    with open(input_file, 'rb') as f:
-        data = f.read()
+    failed = 0
+    for filename in files:
+        valid, message = verify_uf2(filename, args.family, not args.allow_gaps)
+        if valid:
+            print(f"✓ {filename}")
+        else:
+            failed += 1
+            print(f"✗ {filename}: {message}")
     
-    print(f"Input size: {len(data)} bytes")
+    print(f"{len(files) - failed}/{len(files)} UF2 files valid")
+    if failed:
+        sys.exit(1)
+
+def parse_int(value):
+    """Parse decimal or 0x-prefixed integers"""
+    return int(value, 0)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert binary, ELF and Intel HEX files to UF2 format, or verify UF2 files",
+        epilog=f"Family IDs: RP2040 (Pico W) = 0x{FAMILY_ID_RP2040:08x}, "
+               f"RP2350 Arm (Pico 2 W) = 0x{FAMILY_ID_RP2350_ARM_S:08x}. "
+               "Examples: python3 create_uf2.py firmware.bin firmware.uf2; "
+               "python3 create_uf2.py --sparse -o rack.uf2 firmware.elf fs.img@0x10100000")
+    parser.add_argument('--verify', action='store_true',
+                        help="only verify the given UF2 files or directories")
+    parser.add_argument('-o', '--output',
+                        help="output UF2 file; every path is then an input "
+                             "(file.elf, file.hex or file.bin[@address])")
+    parser.add_argument('--family', type=parse_int, default=None,
+                        help="family ID (expected family ID when verifying)")
+    parser.add_argument('--base', type=parse_int, default=None,
+                        help="base address for binary inputs without @address")
+    parser.add_argument('--sparse', action='store_true',
+                        help="omit 256-byte pages that are entirely 0xFF (erased)")
+    parser.add_argument('--allow-gaps', action='store_true',
+                        help="accept non-contiguous target addresses when verifying")
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help="<input> <output.uf2> [family_id] [base_address], "
+                             "inputs with -o, or UF2 files/directories with --verify")
+    args = parser.parse_args()
+    
+    if args.verify:
+        verify_main(args)
+        return
+    
+    # Parse optional arguments
+    family_id = FAMILY_ID_RP2040 if args.family is None else args.family
+    base_address = 0x10000000 if args.base is None else args.base
+    
+    if args.output:
+        output_file = args.output
+        inputs = [parse_input_spec(spec) for spec in args.paths]
+    else:
+        if not 2 <= len(args.paths) <= 4:
+            parser.error("expected <input> <output.uf2> [family_id] [base_address]")
+        output_file = args.paths[1]
+        if len(args.paths) > 2:
+            family_id = parse_int(args.paths[2])  # Allow hex (0x...) or decimal
+        if len(args.paths) > 3:
+            base_address = parse_int(args.paths[3])
+        inputs = [parse_input_spec(args.paths[0])]
+    
+    # Check input files exist
+    for input_file, _ in inputs:
+        if not os.path.exists(input_file):
+            print(f"Error: Input file '{input_file}' not found")
+            sys.exit(1)
     
     # Create UF2
     print(f"Creating UF2 file (family_id=0x{family_id:08x}, base=0x{base_address:08x})...")
-    uf2_data = create_uf2(data, family_id, base_address)
-    
-    # Write output
-    print(f"Writing {output_file}...")
-    with open(output_file, 'wb') as f:
-        f.write(uf2_data)
+    try:
+        input_size, output_size, report = convert_to_uf2(inputs, output_file, family_id,
+                                                         base_address, args.sparse)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     
-    print(f"Created {output_file} ({len(uf2_data)} bytes, {len(uf2_data) // 512} blocks)")
+    print(f"Input size: {input_size} bytes")
+    print_segment_report(report)
+    skipped = sum(seg['skipped'] for seg in report)
+    if skipped:
+        print(f"Skipped {skipped} empty pages ({skipped * UF2_PAYLOAD_SIZE} bytes)")
+    print(f"Created {output_file} ({output_size} bytes, {output_size // UF2_BLOCK_SIZE} blocks)")
     
-    # Verify
+    # Verify (sparse and multi-segment images legitimately have gaps)
     print("Verifying UF2 file...")
-    valid, message = verify_uf2(output_file)
+    contiguous = not args.sparse and len(report) == 1
+    valid, message = verify_uf2(output_file, family_id, contiguous)
     if valid:
         print("✓ UF2 file is valid")
     else:
@@ -141,4 +618,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
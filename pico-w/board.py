@@ -0,0 +1,77 @@
+"""
+Board Profiles for iRackPilot Pico W
+Detects the board at runtime and sizes buffers, pools and caches to its RAM
+"""
+
+import os
+
+# Per-model limits; the Pico 2 W has twice the RAM and a faster core
+PROFILES = {
+    "pico-w": {
+        "name": "Pico W",
+        "rx_buffer": 1024,        # IPMI receive buffer per client
+        "recv_size": 1024,        # HTTP socket read size
+        "send_chunk": 512,        # payload of one streamed response chunk
+        "max_body": 16 * 1024,    # largest request body buffered in RAM
+        "http_connections": 4,    # HTTP clients handled at once
+        "bmc_sessions": 8,        # BMC sessions open at once (fleet operations)
+        "sensor_history": 32,     # samples kept per sensor
+        "cache_entries": 16,      # sensors with history, cached BMC records
+        "sel_entries": 1024,      # SEL entries kept on flash per BMC (16 B each)
+        "code_cache": 8,          # compiled scripts kept
+        "script_heap": 32 * 1024, # heap one script may allocate
+        "min_free_heap": 32 * 1024,
+    },
+    "pico-2-w": {
+        "name": "Pico 2 W",
+        "rx_buffer": 2048,
+        "recv_size": 2048,
+        "send_chunk": 1024,
+        "max_body": 64 * 1024,
+        "http_connections": 12,
+        "bmc_sessions": 32,
+        "sensor_history": 128,
+        "cache_entries": 64,
+        "sel_entries": 4096,
+        "code_cache": 32,
+        "script_heap": 96 * 1024,
+        "min_free_heap": 64 * 1024,
+    },
+}
+
+# Used when the board can't be identified (e.g. CPython); the smallest limits
+DEFAULT_MODEL = "pico-w"
+
+
+class BoardProfile:
+    """Limits for one board model, read as attributes (board.max_body)"""
+
+    def __init__(self, model):
+        self.model = model
+        for key, value in PROFILES[model].items():
+            setattr(self, key, value)
+
+    def status(self):
+        info = {"model": self.model}
+        info.update(PROFILES[self.model])
+        return info
+
+
+def detect_model(machine=None):
+    """
+    Board model from the MicroPython machine string
+
+    e.g. "Raspberry Pi Pico 2 W with RP2350" -> "pico-2-w"
+    """
+    if machine is None:
+        try:
+            machine = os.uname().machine
+        except AttributeError:
+            machine = ""
+    if "RP2350" in machine or "Pico 2" in machine:
+        return "pico-2-w"
+    return DEFAULT_MODEL
+
+
+# Shared by every subsystem
+board = BoardProfile(detect_model())
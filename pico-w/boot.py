@@ -4,20 +4,13 @@ Runs on startup before main.py
 """
 
 import machine
-import time
 
-# Configure LED (if available)
+# Light the LED (if available) to indicate boot; nothing here may block,
+# main.py brings up the network in the background
 try:
     led = machine.Pin("LED", machine.Pin.OUT)
-    # Blink LED to indicate boot
-    for _ in range(3):
-        led.on()
-        time.sleep(0.1)
-        led.off()
-        time.sleep(0.1)
+    led.on()
 except:
     pass
 
 print("iRackPilot Firmware Booting...")
-time.sleep(1)
-
@@ -0,0 +1,216 @@
+"""
+BMC Discovery for iRackPilot Pico W
+Finds BMCs on a subnet with RMCP ASF Presence Pings, then identifies them
+"""
+
+import socket
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+from fleet import Fleet
+from ipmi_protocol import MANUFACTURERS
+
+# RMCP header (version 6, no RMCP ACK, class ASF) and the ASF IANA number
+RMCP_ASF_HEADER = b"\x06\x00\xff\x06"
+ASF_IANA = b"\x00\x00\x11\xbe"
+ASF_PRESENCE_PING = 0x80
+ASF_PRESENCE_PONG = 0x40
+PONG_SIZE = 28
+
+# Largest range scanned in one request (a /22)
+MAX_HOSTS = 1024
+TICK_MS = 10
+SEND_RETRIES = 3
+
+
+def parse_ip(text):
+    """Dotted quad to a 32-bit int"""
+    parts = text.split(".")
+    if len(parts) != 4:
+        raise ValueError(f"Invalid address: {text}")
+    value = 0
+    for part in parts:
+        octet = int(part)
+        if not 0 <= octet <= 255:
+            raise ValueError(f"Invalid address: {text}")
+        value = value << 8 | octet
+    return value
+
+
+def format_ip(value):
+    return f"{value >> 24 & 0xFF}.{value >> 16 & 0xFF}.{value >> 8 & 0xFF}.{value & 0xFF}"
+
+
+def parse_cidr(cidr):
+    """
+    (network, first, count): the normalized range and its host addresses
+
+    Network and broadcast addresses are skipped except in /31 and /32.
+    """
+    address, _, prefix = cidr.partition("/")
+    prefix = int(prefix) if prefix else 32
+    if not 0 <= prefix <= 32:
+        raise ValueError(f"Invalid prefix: /{prefix}")
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    first = parse_ip(address) & mask
+    network = f"{format_ip(first)}/{prefix}"
+    count = 1 << (32 - prefix)
+    if prefix < 31:
+        first += 1
+        count -= 2
+    if count > MAX_HOSTS:
+        raise ValueError(f"Range too large: {count} hosts (at most {MAX_HOSTS})")
+    return network, first, count
+
+
+def presence_ping(tag):
+    """RMCP ASF Presence Ping with the given message tag"""
+    return RMCP_ASF_HEADER + ASF_IANA + bytes((ASF_PRESENCE_PING, tag, 0, 0))
+
+
+def parse_pong(data, tag):
+    """Decode a Presence Pong for our tag into a dict, None for anything else"""
+    if (len(data) < PONG_SIZE or data[:4] != RMCP_ASF_HEADER or data[4:8] != ASF_IANA
+            or data[8] != ASF_PRESENCE_PONG or data[9] != tag):
+        return None
+    entities = data[20]
+    return {
+        "enterprise": data[12] << 24 | data[13] << 16 | data[14] << 8 | data[15],
+        "ipmi": bool(entities & 0x80),
+        "asf_version": entities & 0x0F,
+        "rmcp_security": bool(data[21] & 0x80),
+    }
+
+
+class Discovery:
+    """Pings a CIDR range from one paced UDP socket and identifies the responders"""
+
+    def __init__(self, fleet=None):
+        self.fleet = fleet or Fleet()
+        self.running = False
+        self.tag = 0
+
+    async def discover(self, cidr, port=623, rate=300, wait=1.0, attempts=1,
+                       identify=True, timeout=3, **credentials):
+        """
+        Find the BMCs in a CIDR range
+
+        Args:
+            cidr: Range to scan, e.g. "192.168.1.0/24"
+            port: RMCP port pinged and connected to
+            rate: Pings sent per second (lwIP's ARP table is small, so
+                bursts to unresolved addresses get dropped)
+            wait: Seconds to keep listening after the last ping
+            attempts: Ping passes; later passes only ping silent hosts
+            identify: Fetch Get Device ID from each responder
+            timeout: Per-host timeout for identification
+            credentials: username/password for identification
+
+        Returns:
+            Dict with one record per responder, sorted by address
+        """
+        if self.running:
+            raise RuntimeError("Discovery already running")
+        network, first, count = parse_cidr(cidr)
+        self.running = True
+        start = ticks_ms()
+        try:
+            responders = {}
+            for _ in range(max(1, attempts)):
+                await self.ping_range(first, count, port, max(1, rate), wait, responders)
+                if len(responders) == count:
+                    break
+            hosts = [dict(host=address, **pong) for address, pong in responders.items()]
+            hosts.sort(key=lambda host: parse_ip(host["host"]))
+            if identify:
+                await self.identify(hosts, port, timeout, credentials)
+        finally:
+            self.running = False
+        return {
+            "network": network,
+            "scanned": count,
+            "found": len(hosts),
+            "hosts": hosts,
+            "elapsed_ms": ticks_diff(ticks_ms(), start),
+        }
+
+    async def ping_range(self, first, count, port, rate, wait, responders):
+        """One ping pass over the range, skipping hosts that already answered"""
+        self.tag = (self.tag + 1) & 0xFF
+        ping = presence_ping(self.tag)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            start = ticks_ms()
+            sent = 0
+            failures = 0
+            while sent < count:
+                due = min(count, rate * ticks_diff(ticks_ms(), start) // 1000 + 1)
+                while sent < due:
+                    address = format_ip(first + sent)
+                    if address not in responders:
+                        try:
+                            sock.sendto(ping, (address, port))
+                        except OSError:
+                            # Out of buffers: retry this address next tick
+                            failures += 1
+                            if failures < SEND_RETRIES:
+                                break
+                    failures = 0
+                    sent += 1
+                self.collect(sock, responders)
+                await asyncio.sleep(TICK_MS / 1000)
+
+            deadline = ticks_add(ticks_ms(), int(wait * 1000))
+            while ticks_diff(deadline, ticks_ms()) > 0:
+                self.collect(sock, responders)
+                await asyncio.sleep(TICK_MS / 1000)
+            self.collect(sock, responders)
+        finally:
+            sock.close()
+
+    def collect(self, sock, responders):
+        """Read every pong waiting on the socket"""
+        while True:
+            try:
+                data, address = sock.recvfrom(64)
+            except OSError:
+                return
+            pong = parse_pong(data, self.tag)
+            if pong is not None:
+                responders[address[0]] = pong
+
+    async def identify(self, hosts, port, timeout, credentials):
+        """Add vendor and firmware details from Get Device ID, concurrently"""
+        targets = {host["host"]: host for host in hosts if host["ipmi"]}
+        if not targets:
+            return
+        summary = await self.fleet.map(list(targets), lambda client: client.get_device_info(),
+                                       timeout=timeout, port=port, **credentials)
+        for record in summary["results"]:
+            host = targets[record["host"]]
+            device = record.get("result")
+            if not device:
+                host["error"] = record.get("error", "No Device ID")
+                continue
+            host["manufacturer"] = MANUFACTURERS.get(device["manufacturer_id"], "Unknown")
+            host["manufacturer_id"] = device["manufacturer_id"]
+            host["product_id"] = device["product_id"]
+            host["firmware_version"] = f"{device['firmware_major']}.{device['firmware_minor']:02d}"
+            host["ipmi_version"] = device["ipmi_version"]
@@ -0,0 +1,135 @@
+"""
+Fleet Operations for iRackPilot Pico W
+Runs IPMI operations across many BMCs concurrently
+"""
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+from ipmi_client import IPMIClient
+from board import board
+
+
+class Fleet:
+    """Maps an IPMI operation over a list of BMC hosts"""
+
+    def __init__(self, client_factory=IPMIClient, concurrency=board.bmc_sessions, timeout=10):
+        self.client_factory = client_factory
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def normalize_host(self, host, defaults):
+        """Turn a host string or dict into a full connection spec"""
+        if isinstance(host, str):
+            host = {"host": host}
+        spec = {
+            "host": host.get("host"),
+            "port": host.get("port", defaults.get("port", 623)),
+            "username": host.get("username", defaults.get("username")),
+            "password": host.get("password", defaults.get("password")),
+            "vendor": host.get("vendor", defaults.get("vendor", "Generic")),
+        }
+        if not spec["host"]:
+            raise ValueError("Host entry without 'host'")
+        return spec
+
+    async def map(self, hosts, operation, concurrency=None, timeout=None,
+                  on_result=None, deadline=None, **defaults):
+        """
+        Run operation(client) against every host with bounded concurrency
+
+        Args:
+            hosts: List of host strings or connection dicts
+            operation: Async callable receiving a connected IPMIClient
+            concurrency: Maximum hosts in flight at once (at most the
+                fleet's own concurrency, which bounds open BMC sessions)
+            timeout: Per-host timeout in seconds (connect + operation)
+            on_result: Optional callback invoked as each host completes
+            deadline: Optional ticks_ms by which every host must be done;
+                per-host timeouts are cut short to meet it and hosts not
+                started by then are skipped
+            defaults: Default port/username/password/vendor for hosts
+
+        Returns:
+            Summary dict with per-host records in completion order
+        """
+        specs = [self.normalize_host(host, defaults) for host in hosts]
+        concurrency = max(1, min(concurrency or self.concurrency, self.concurrency, len(specs) or 1))
+        timeout = timeout or self.timeout
+
+        results = []
+        state = {"next": 0}
+        start = ticks_ms()
+
+        async def worker():
+            while state["next"] < len(specs):
+                spec = specs[state["next"]]
+                state["next"] += 1
+                record = await self.run_host(spec, operation, timeout, deadline)
+                results.append(record)
+                if on_result:
+                    on_result(record)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+        succeeded = sum(1 for record in results if record["ok"])
+        return {
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "elapsed_ms": ticks_diff(ticks_ms(), start),
+        }
+
+    async def run_host(self, spec, operation, timeout, deadline=None):
+        """Connect to one host, run the operation and record the outcome"""
+        start = ticks_ms()
+        limit = timeout
+        if deadline is not None:
+            left = ticks_diff(deadline, start)
+            if left <= 0:
+                return {"host": spec["host"], "ok": False,
+                        "error": "Skipped: deadline passed", "elapsed_ms": 0}
+            timeout = min(timeout, left / 1000)
+        client = self.client_factory()
+        # The per-host timeout bounds the whole attempt, so don't retry inside it
+        client.retry_count = 1
+        client.connection_timeout = timeout
+        state = {"connected": False}
+
+        async def attempt():
+            connected = await client.connect(spec["host"], spec["port"], spec["username"],
+                                             spec["password"], spec["vendor"], fetch_info=False)
+            state["connected"] = connected
+            if not connected:
+                raise Exception(client.error or "Connection failed")
+            return await operation(client)
+
+        record = {"host": spec["host"], "ok": False}
+        try:
+            record["result"] = await asyncio.wait_for(attempt(), timeout)
+            record["ok"] = True
+        except asyncio.TimeoutError:
+            record["error"] = f"Timed out after {timeout:g}s"
+            if not state["connected"] and timeout == limit:
+                # Cancelled mid-connect by the full timeout (not a deadline cut):
+                # open the breaker so the next map skips this host
+                client.connect_failed(record["error"])
+        except Exception as e:
+            record["error"] = str(e)
+        finally:
+            client.disconnect()
+        record["elapsed_ms"] = ticks_diff(ticks_ms(), start)
+        return record
@@ -0,0 +1,224 @@
+"""
+FRU Inventory for iRackPilot Pico W
+Reads and parses the BMC's FRU data (chassis, board, product) and caches it on flash
+"""
+
+import json
+import os
+
+from board import board
+
+FRU_DIR = "fru"
+
+# Read FRU Data count is one byte; start large and halve on size errors
+MAX_CHUNK = 240
+MIN_CHUNK = 8
+SIZE_ERRORS = (0xC7, 0xC8, 0xCA)
+
+FIELD_END = 0xC1
+BCD_PLUS = "0123456789 -.:,_"
+# Board manufacturing dates count minutes from 1996-01-01 00:00 UTC
+FRU_EPOCH = 820454400
+
+CHASSIS_FIELDS = ("part_number", "serial_number")
+BOARD_FIELDS = ("manufacturer", "product_name", "serial_number", "part_number", "fru_file_id")
+PRODUCT_FIELDS = ("manufacturer", "product_name", "part_number", "version", "serial_number",
+                  "asset_tag", "fru_file_id")
+
+
+def decode_field(data, pos):
+    """(value, next position) of the type/length field at pos"""
+    type_length = data[pos]
+    kind = type_length >> 6
+    raw = data[pos + 1:pos + 1 + (type_length & 0x3F)]
+    if kind == 3:
+        # 8-bit ASCII + Latin-1
+        value = "".join(chr(byte) for byte in raw)
+    elif kind == 2:
+        # 6-bit packed ASCII, least significant bits first
+        chars = []
+        bits = 0
+        count = 0
+        for byte in raw:
+            bits |= byte << count
+            count += 8
+            while count >= 6:
+                chars.append(chr((bits & 0x3F) + 0x20))
+                bits >>= 6
+                count -= 6
+        value = "".join(chars)
+    elif kind == 1:
+        value = "".join(BCD_PLUS[byte >> 4] + BCD_PLUS[byte & 0x0F] for byte in raw)
+    else:
+        value = "".join(f"{byte:02x}" for byte in raw)
+    return value.rstrip(" \x00"), pos + 1 + len(raw)
+
+
+def decode_area(data, offset, start, names):
+    """
+    Named fields of the area at offset (fields begin at offset + start)
+
+    Returns None when the area is missing, truncated or fails its checksum.
+    """
+    if not offset or offset + 2 > len(data):
+        return None
+    end = offset + data[offset + 1] * 8
+    if end > len(data) or sum(data[offset:end]) & 0xFF:
+        return None
+    area = {}
+    extra = []
+    pos = offset + start
+    while pos < end - 1 and data[pos] != FIELD_END:
+        value, pos = decode_field(data, pos)
+        if len(area) < len(names):
+            area[names[len(area)]] = value or None
+        elif value:
+            extra.append(value)
+    if extra:
+        area["extra"] = extra
+    return area
+
+
+def parse_fru(data):
+    """Parse FRU data into chassis, board and product dicts (absent areas are None)"""
+    if len(data) < 8 or data[0] & 0x0F != 1 or sum(data[:8]) & 0xFF:
+        raise ValueError("Invalid FRU common header")
+    chassis = decode_area(data, data[2] * 8, 3, CHASSIS_FIELDS)
+    if chassis is not None:
+        chassis["type"] = data[data[2] * 8 + 2]
+    board_area = decode_area(data, data[3] * 8, 6, BOARD_FIELDS)
+    if board_area is not None:
+        offset = data[3] * 8
+        minutes = data[offset + 3] | data[offset + 4] << 8 | data[offset + 5] << 16
+        board_area["manufactured"] = FRU_EPOCH + minutes * 60 if minutes else None
+    return {
+        "chassis": chassis,
+        "board": board_area,
+        "product": decode_area(data, data[4] * 8, 3, PRODUCT_FIELDS),
+    }
+
+
+def fru_extent(data, size):
+    """Bytes needed for the chassis, board and product areas (size until all are known)"""
+    if len(data) < 8:
+        return size
+    end = 8
+    for offset in (data[2] * 8, data[3] * 8, data[4] * 8):
+        if not offset:
+            continue
+        if offset + 1 >= len(data):
+            return size
+        end = max(end, offset + data[offset + 1] * 8)
+    return min(end, size)
+
+
+class FRUCache:
+    """Parsed inventories on flash, one file per system GUID; the oldest go beyond max_entries"""
+
+    def __init__(self, directory=FRU_DIR, max_entries=board.cache_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.order = None
+
+    def path(self, name):
+        return f"{self.directory}/{name}.json"
+
+    def load_order(self):
+        if self.order is None:
+            try:
+                with open(self.path("index")) as f:
+                    self.order = json.load(f)
+            except (OSError, ValueError):
+                self.order = []
+        return self.order
+
+    def get(self, guid):
+        if guid not in self.load_order():
+            return None
+        try:
+            with open(self.path(guid)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, guid, inventory):
+        order = self.load_order()
+        try:
+            os.mkdir(self.directory)
+        except OSError:
+            pass
+        with open(self.path(guid), "w") as f:
+            json.dump(inventory, f)
+        if guid in order:
+            order.remove(guid)
+        order.append(guid)
+        while len(order) > self.max_entries:
+            try:
+                os.remove(self.path(order.pop(0)))
+            except OSError:
+                pass
+        tmp = self.path("index") + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(order, f)
+        os.rename(tmp, self.path("index"))
+
+
+class FRUReader:
+    """FRU inventory of a connected BMC, read once and then served from the flash cache"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or FRUCache()
+
+    async def read(self, client, refresh=False):
+        """
+        Parsed FRU inventory (dict with "guid", "chassis", "board", "product")
+
+        Served from the cache when the BMC's GUID is known, unless refresh.
+        Returns None if the BMC has no readable FRU data.
+        """
+        guid = await client.get_system_guid()
+        if guid and not refresh:
+            inventory = self.cache.get(guid)
+            if inventory is not None:
+                return inventory
+        data = await self.read_data(client)
+        if not data:
+            return None
+        try:
+            inventory = parse_fru(data)
+        except ValueError as e:
+            print(f"FRU parse error: {e}")
+            return None
+        inventory["guid"] = guid
+        if guid:
+            self.cache.put(guid, inventory)
+        return inventory
+
+    async def read_data(self, client):
+        """Read the FRU areas in the largest chunks the BMC accepts"""
+        info = await client.get_fru_info()
+        if not info:
+            return None
+        size, by_words = info
+        unit = 2 if by_words else 1
+        chunk = MAX_CHUNK
+        data = bytearray()
+        end = size
+        while len(data) < end:
+            count = min(chunk, end - len(data))
+            result = await client.read_fru(len(data) // unit, count // unit or 1)
+            if result is None:
+                return None
+            completion_code, part = result
+            if completion_code in SIZE_ERRORS and chunk > MIN_CHUNK:
+                chunk = max(MIN_CHUNK, chunk // 2)
+                continue
+            if completion_code or not part:
+                return None
+            data += part
+            end = fru_extent(data, size)
+        return data
+
+
+# Shared by the IPMI client, scripts and the HTTP server
+fru_reader = FRUReader()
@@ -0,0 +1,174 @@
+"""
+BMC Health for iRackPilot Pico W
+Circuit breaker per BMC: fails fast while a BMC is down and probes it in the background until it answers
+"""
+
+import random
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+from metrics import metrics
+from board import board
+
+# First probe after about 2 s, doubling up to 5 minutes
+BASE_BACKOFF_MS = 2000
+MAX_BACKOFF_MS = 5 * 60 * 1000
+# Probes connecting at once; the rest wait their turn
+MAX_PROBES = 2
+
+
+class Breaker:
+    """Open breaker of one BMC: the cached error and the probe schedule"""
+    __slots__ = ("host", "port", "credentials", "error", "failures", "opened", "backoff",
+                 "retry_at", "probe", "task")
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.credentials = None
+        self.error = None
+        self.failures = 0
+        self.opened = ticks_ms()
+        self.backoff = BASE_BACKOFF_MS
+        self.retry_at = self.opened
+        self.probe = None
+        self.task = None
+
+    def to_dict(self):
+        return {
+            "host": self.host,
+            "port": self.port,
+            "state": "open",
+            "error": self.error,
+            "failures": self.failures,
+            "open_ms": ticks_diff(ticks_ms(), self.opened),
+            "retry_in_ms": max(0, ticks_diff(self.retry_at, ticks_ms())),
+        }
+
+
+class BMCHealth:
+    """
+    Circuit breakers for the BMCs this Pico talks to
+
+    A failed connect opens the BMC's breaker. Until a background probe
+    gets through, connects with the same credentials fail at once with
+    the cached error. Only open breakers are kept; a BMC without one is
+    healthy.
+    """
+
+    def __init__(self, max_entries=board.cache_entries):
+        self.max_entries = max_entries
+        self.breakers = {}
+        self.probing = 0
+
+    def allow(self, host, port, credentials=None):
+        """Whether a connect may go to the BMC (new credentials get a trial)"""
+        breaker = self.breakers.get((host, port))
+        return breaker is None or breaker.credentials != credentials
+
+    def error(self, host, port):
+        """Cached error of an open breaker, with the time to its next probe"""
+        breaker = self.breakers.get((host, port))
+        if breaker is None:
+            return None
+        retry = (max(0, ticks_diff(breaker.retry_at, ticks_ms())) + 999) // 1000
+        return f"BMC unavailable: {breaker.error} (next probe in {retry}s)"
+
+    def success(self, host, port):
+        """Close the BMC's breaker"""
+        breaker = self.breakers.pop((host, port), None)
+        if breaker is None:
+            return
+        if breaker.task is not None:
+            breaker.task.cancel()
+        metrics.ipmi_breakers_open = len(self.breakers)
+        print(f"IPMI server {host}:{port} reachable again, breaker closed")
+
+    def failure(self, host, port, error, probe, credentials=None):
+        """
+        Record a failed connect and open the BMC's breaker
+
+        probe is an async callable returning True once the BMC answers;
+        it runs in the background with exponential backoff and jitter.
+        """
+        key = (host, port)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            if len(self.breakers) >= self.max_entries:
+                self.evict()
+            breaker = self.breakers[key] = Breaker(host, port)
+            metrics.ipmi_breakers_open = len(self.breakers)
+            print(f"IPMI server {host}:{port} unavailable, breaker open: {error}")
+        breaker.error = error
+        breaker.failures += 1
+        breaker.probe = probe
+        breaker.credentials = credentials
+        if breaker.task is None:
+            self.schedule(breaker)
+            breaker.task = asyncio.create_task(self.run_probe(breaker))
+
+    def evict(self):
+        """Forget the longest-open breaker to make room"""
+        oldest = None
+        for breaker in self.breakers.values():
+            if oldest is None or ticks_diff(breaker.opened, oldest.opened) < 0:
+                oldest = breaker
+        del self.breakers[(oldest.host, oldest.port)]
+        if oldest.task is not None:
+            oldest.task.cancel()
+
+    def schedule(self, breaker):
+        """Set the next probe time: backoff with equal jitter, then double the backoff"""
+        delay = random.randint(breaker.backoff // 2, breaker.backoff)
+        breaker.retry_at = ticks_add(ticks_ms(), delay)
+        breaker.backoff = min(breaker.backoff * 2, MAX_BACKOFF_MS)
+
+    async def run_probe(self, breaker):
+        """Probe until the BMC answers or its breaker is closed elsewhere"""
+        key = (breaker.host, breaker.port)
+        while self.breakers.get(key) is breaker:
+            wait = ticks_diff(breaker.retry_at, ticks_ms())
+            if wait > 0:
+                await asyncio.sleep(wait / 1000)
+                continue
+            if self.probing >= MAX_PROBES:
+                await asyncio.sleep(0.1)
+                continue
+            self.probing += 1
+            try:
+                ok = await breaker.probe()
+            except Exception as e:
+                ok = False
+                breaker.error = str(e) or "Probe failed"
+            finally:
+                self.probing -= 1
+            if ok:
+                breaker.task = None
+                self.success(breaker.host, breaker.port)
+                return
+            breaker.failures += 1
+            self.schedule(breaker)
+
+    def status(self):
+        """Open breakers as dicts"""
+        return [breaker.to_dict() for breaker in self.breakers.values()]
+
+
+# Shared by every IPMI client (the main connection, fleet operations and probes)
+bmc_health = BMCHealth()
@@ -7,6 +7,103 @@ import socket
 import json
 import time
 import uasyncio as asyncio
+import jsonstream
+from ota import OTAError
+from memstats import stats
+from metrics import metrics
+from board import board
+from health import bmc_health
+
+# Largest request body buffered in RAM (OTA uploads are streamed instead)
+MAX_BODY_SIZE = board.max_body
+
+# Sub-requests accepted in one POST /batch
+MAX_BATCH_REQUESTS = 16
+
+class BodyReader:
+    """Reads a request body from a non-blocking socket, bounded by Content-Length"""
+    
+    def __init__(self, client, buffered, length, timeout=10):
+        self.client = client
+        self.buffered = buffered
+        self.remaining = length
+        self.timeout = timeout
+    
+    async def read(self, size):
+        """Read up to size bytes of the body, b"" once it is exhausted"""
+        if self.remaining <= 0:
+            return b""
+        size = min(size, self.remaining)
+        
+        if self.buffered:
+            data = self.buffered[:size]
+            self.buffered = self.buffered[size:]
+        else:
+            data = None
+            start_time = time.ticks_ms()
+            while data is None:
+                try:
+                    data = self.client.recv(size)
+                except OSError:
+                    if time.ticks_diff(time.ticks_ms(), start_time) > self.timeout * 1000:
+                        raise OSError("Timed out reading request body")
+                    await asyncio.sleep(0.01)
+            if not data:
+                # Client closed the connection early
+                self.remaining = 0
+                return b""
+        
+        self.remaining -= len(data)
+        return data
+
+async def read_body(reader):
+    """Read the rest of a (size-checked) body into memory"""
+    body = b""
+    while True:
+        chunk = await reader.read(board.recv_size)
+        if not chunk:
+            return body
+        body += chunk
+
+async def send_all(client, data, timeout=10):
+    """Write all of data to a non-blocking socket, waiting while its send buffer is full"""
+    view = memoryview(data)
+    start_time = time.ticks_ms()
+    while len(view):
+        try:
+            sent = client.send(view)
+        except OSError:
+            sent = 0
+        if sent:
+            view = view[sent:]
+            continue
+        if time.ticks_diff(time.ticks_ms(), start_time) > timeout * 1000:
+            raise OSError("Timed out sending response")
+        await asyncio.sleep(0.01)
+
+class StreamResponse:
+    """A JSON response encoded while it is sent, in chunks (data may hold iterators)"""
+    
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+    
+    def head(self, length=None):
+        status_text = "OK" if self.status_code == 200 else "Error"
+        response = f"HTTP/1.1 {self.status_code} {status_text}\r\n"
+        response += "Content-Type: application/json\r\n"
+        if length is None:
+            response += "Transfer-Encoding: chunked\r\n"
+        else:
+            response += f"Content-Length: {length}\r\n"
+        response += "Access-Control-Allow-Origin: *\r\n"
+        response += "\r\n"
+        return response.encode()
+    
+    def encode(self):
+        """The whole response as bytes, for when it has to be held (batch sub-responses)"""
+        body = jsonstream.dumps(self.data)
+        return self.head(len(body)) + body
 
 class HTTPServer:
     def __init__(self, host, port):
@@ -16,13 +113,27 @@ class HTTPServer:
         self.ipmi_client = None
         self.script_engine = None
         self.get_status = None
+        self.scheduler = None
+        self.ota = None
+        self.discovery = None
+        self.sel = None
         self.console_active = False
+        # Clients beyond this wait in the listen backlog
+        self.max_connections = board.http_connections
+        self.connections = 0
+        # Count what responses cost to build
+        self.json_response = stats.wrap("json_response", self.json_response)
         
-    def setup_routes(self, ipmi_client, script_engine, get_status_func):
+    def setup_routes(self, ipmi_client, script_engine, get_status_func, scheduler=None, ota=None,
+                     discovery=None, sel=None):
         """Setup route handlers"""
         self.ipmi_client = ipmi_client
         self.script_engine = script_engine
         self.get_status = get_status_func
+        self.scheduler = scheduler
+        self.ota = ota
+        self.discovery = discovery
+        self.sel = sel
     
     async def start(self):
         """Start the HTTP server"""
@@ -35,49 +146,121 @@ class HTTPServer:
         print(f"HTTP server listening on {self.host}:{self.port}")
         
         while True:
+            if self.connections >= self.max_connections:
+                await asyncio.sleep(0.01)
+                continue
             try:
                 client, addr = self.socket.accept()
+                self.connections += 1
                 asyncio.create_task(self.handle_client(client, addr))
             except OSError:
                 await asyncio.sleep(0.1)
     
     async def handle_client(self, client, addr):
         """Handle incoming client connection"""
+        head = None
         try:
             client.setblocking(False)
-            request = await self.read_request(client)
+            head, buffered = await self.read_request(client)
             
-            if request:
-                response = await self.handle_request(request)
+            if head:
+                start_time = time.ticks_ms()
+                heap_before = stats.sample()
+                metrics.http_in_flight += 1
+                headers = self.parse_headers(head)
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = 0
+                reader = BodyReader(client, buffered, length)
+                
+                if self.is_ota_upload(head):
+                    # Streamed to flash; never buffered whole
+                    response = await self.handle_ota_upload(head, headers, reader, length)
+                elif length > MAX_BODY_SIZE:
+                    response = self.error_response(413, "Payload Too Large")
+                else:
+                    body = await read_body(reader)
+                    request = head + "\r\n\r\n" + body.decode('utf-8', errors='ignore')
+                    response = await self.handle_request(request)
                 await self.send_response(client, response)
+                
+                if isinstance(response, StreamResponse):
+                    status = response.status_code
+                else:
+                    status = int(response[9:12])
+                route = self.route_key(head, status)
+                metrics.http_requests.get(route).observe(
+                    time.ticks_diff(time.ticks_ms(), start_time))
+                if status >= 500:
+                    metrics.http_errors.inc(route)
+                stats.end_route(route, heap_before)
         except Exception as e:
             print(f"Error handling client {addr}: {e}")
         finally:
+            self.connections -= 1
+            if head:
+                metrics.http_in_flight -= 1
             try:
                 client.close()
             except:
                 pass
     
     async def read_request(self, client):
-        """Read HTTP request from client"""
+        """
+        Read the request line and headers from client
+        
+        Returns:
+            (head, body bytes already received), head is None on failure
+        """
         request = b""
         timeout = 5
         start_time = time.ticks_ms()
         
-        while True:
+        while b"\r\n\r\n" not in request:
+            if time.ticks_diff(time.ticks_ms(), start_time) > timeout * 1000:
+                return None, b""
             try:
-                chunk = client.recv(1024)
-                if chunk:
-                    request += chunk
-                    if b"\r\n\r\n" in request:
-                        break
-                elif time.ticks_diff(time.ticks_ms(), start_time) > timeout * 1000:
-                    break
-                await asyncio.sleep(0.01)
+                chunk = client.recv(board.recv_size)
             except OSError:
                 await asyncio.sleep(0.01)
+                continue
+            if not chunk:
+                return None, b""
+            request += chunk
         
-        return request.decode('utf-8', errors='ignore') if request else None
+        head, body = request.split(b"\r\n\r\n", 1)
+        return head.decode('utf-8', errors='ignore'), body
+    
+    def route_key(self, head, status):
+        """Memory counter key: method and path, numeric segments folded"""
+        if status == 404:
+            # Keep scanners from filling the fixed-size route table
+            return "unmatched"
+        parts = head.split(' ', 2)
+        if len(parts) < 2:
+            return "invalid"
+        segments = ["<id>" if segment.isdigit() else segment
+                    for segment in parts[1].split('?')[0].split('/')]
+        return parts[0] + " " + "/".join(segments)
+    
+    def parse_query(self, query):
+        """Parse a query string into a dict (values are not percent-decoded)"""
+        params = {}
+        for pair in query.split('&'):
+            if pair:
+                key, _, value = pair.partition('=')
+                params[key] = value
+        return params
+    
+    def parse_headers(self, head):
+        """Parse header lines into a dict with lowercase names"""
+        headers = {}
+        for line in head.split('\r\n')[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        return headers
     
     async def handle_request(self, request):
         """Handle HTTP request and return response"""
@@ -92,23 +275,18 @@ class HTTPServer:
                 return self.error_response(400, "Bad Request")
             
             method = parts[0]
-            path = parts[1].split('?')[0]
+            path, _, query = parts[1].partition('?')
             
             # Parse headers
-            headers = {}
             body = ""
             body_start = request.find('\r\n\r\n')
             if body_start != -1:
                 body = request[body_start + 4:]
-            
-            for line in lines[1:]:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    headers[key.strip().lower()] = value.strip()
+            headers = self.parse_headers(request[:body_start] if body_start != -1 else request)
             
             # Route handling
             if method == "GET":
-                return await self.handle_get(path, headers)
+                return await self.handle_get(path, headers, query)
             elif method == "POST":
                 return await self.handle_post(path, headers, body)
             else:
@@ -118,7 +296,7 @@ class HTTPServer:
             print(f"Error handling request: {e}")
             return self.error_response(500, "Internal Server Error")
     
-    async def handle_get(self, path, headers):
+    async def handle_get(self, path, headers, query=""):
         """Handle GET requests"""
         if path == "/status":
             status = self.get_status()
@@ -131,6 +309,18 @@ class HTTPServer:
             else:
                 return self.error_response(503, "Not connected to IPMI server")
         
+        elif path.startswith("/ipmi/sensors/") and path.endswith("/history"):
+            return self.handle_sensor_history(path)
+        
+        elif path == "/ipmi/health":
+            return self.json_response({"success": True, "open": bmc_health.status()})
+        
+        elif path == "/ipmi/fru":
+            return await self.handle_fru(self.parse_query(query))
+        
+        elif path == "/ipmi/sel":
+            return await self.handle_sel(self.parse_query(query))
+        
         elif path == "/ipmi/console/frame":
             if self.console_active and self.ipmi_client:
                 frame_data = self.ipmi_client.get_console_frame()
@@ -141,6 +331,20 @@ class HTTPServer:
             else:
                 return self.error_response(503, "Console not active")
         
+        elif path == "/schedule" or path.startswith("/schedule/"):
+            return self.handle_schedule_get(path)
+        
+        elif path == "/metrics":
+            return self.text_response(metrics.export(), "text/plain; version=0.0.4")
+        
+        elif path == "/debug/mem":
+            return self.json_response(stats.report())
+        
+        elif path == "/ota":
+            if not self.ota:
+                return self.error_response(503, "OTA not available")
+            return self.json_response({"success": True, "ota": self.ota.status()})
+        
         else:
             return self.error_response(404, "Not Found")
     
@@ -157,6 +361,9 @@ class HTTPServer:
         if path == "/ipmi/connect":
             return await self.handle_ipmi_connect(data)
         
+        elif path == "/batch":
+            return await self.handle_batch(data)
+        
         elif path == "/ipmi/disconnect":
             return await self.handle_ipmi_disconnect()
         
@@ -172,12 +379,137 @@ class HTTPServer:
         elif path == "/ipmi/command":
             return await self.handle_ipmi_command(data)
         
+        elif path == "/ipmi/discover":
+            return await self.handle_ipmi_discover(data)
+        
         elif path == "/scripts/execute":
             return await self.handle_script_execute(data)
         
+        elif path in ("/schedule/add", "/schedule/update", "/schedule/delete"):
+            return self.handle_schedule_post(path, data)
+        
+        elif path == "/ota/rollback":
+            return self.handle_ota_rollback(data)
+        
         else:
             return self.error_response(404, "Not Found")
     
+    def handle_sensor_history(self, path):
+        """Recent readings of one sensor, oldest first"""
+        try:
+            sensor = int(path.split('/')[3])
+        except ValueError:
+            return self.error_response(400, "Invalid sensor number")
+        samples = self.ipmi_client.sensor_history.samples(sensor) if self.ipmi_client else None
+        if samples is None:
+            return self.error_response(404, "No history for this sensor")
+        return self.stream_response({"success": True, "sensor": sensor, "samples": samples})
+    
+    async def handle_fru(self, params):
+        """FRU inventory of the connected BMC (cached on flash; ?refresh=1 re-reads it)"""
+        if not self.ipmi_client or not self.ipmi_client.is_connected():
+            return self.error_response(503, "Not connected to IPMI server")
+        refresh = params.get("refresh") in ("1", "true")
+        try:
+            inventory = await self.ipmi_client.get_fru(refresh)
+        except (OSError, asyncio.TimeoutError) as e:
+            return self.error_response(502, f"FRU read failed: {e}")
+        if inventory is None:
+            return self.error_response(404, "No FRU data")
+        return self.stream_response({"success": True, "fru": inventory})
+    
+    async def handle_sel(self, params):
+        """SEL entries after a local entry ID, fetching any new ones from the BMC first"""
+        if not self.sel:
+            return self.error_response(503, "SEL not available")
+        try:
+            after = int(params.get("after", 0))
+            limit = int(params.get("limit", 50))
+        except ValueError:
+            return self.error_response(400, "after and limit must be integers")
+        
+        added = None
+        error = None
+        if self.ipmi_client and self.ipmi_client.is_connected():
+            try:
+                added = await self.sel.sync()
+            except (OSError, asyncio.TimeoutError) as e:
+                error = str(e)
+        elif not self.sel.is_open():
+            return self.error_response(503, "Not connected to IPMI server")
+        
+        # Without a fresh sync the cached log is served, marked stale
+        page = self.sel.page(after, limit)
+        page["success"] = True
+        page["added"] = added
+        page["stale"] = added is None
+        if error:
+            page["error"] = error
+        return self.stream_response(page)
+    
+    async def handle_batch(self, data):
+        """
+        Run several sub-requests and return their results in one response
+        
+        Body: {"requests": [{"method", "path", "body", "id"}, ...]} or the
+        bare list. GETs run concurrently; a POST waits for everything before
+        it and runs before anything after it, so writes keep their order.
+        """
+        if isinstance(data, list):
+            requests = data
+        elif isinstance(data, dict):
+            requests = data.get("requests")
+        else:
+            return self.error_response(400, "Batch body must be a list or an object")
+        if not isinstance(requests, list) or not requests:
+            return self.error_response(400, "requests must be a non-empty list")
+        if len(requests) > MAX_BATCH_REQUESTS:
+            return self.error_response(413, f"At most {MAX_BATCH_REQUESTS} requests per batch")
+        
+        responses = [None] * len(requests)
+        group = []
+        for index, sub in enumerate(requests):
+            if isinstance(sub, dict) and str(sub.get("method", "GET")).upper() == "GET":
+                group.append(index)
+                continue
+            await self.run_batch_group(requests, group, responses)
+            group = []
+            responses[index] = await self.run_sub_request(sub)
+        await self.run_batch_group(requests, group, responses)
+        return self.batch_response(requests, responses)
+    
+    async def run_batch_group(self, requests, group, responses):
+        """Run independent sub-requests concurrently"""
+        if group:
+            results = await asyncio.gather(*[self.run_sub_request(requests[i]) for i in group])
+            for index, response in zip(group, results):
+                responses[index] = response
+    
+    async def run_sub_request(self, sub):
+        """Dispatch one sub-request through the normal routing"""
+        if not isinstance(sub, dict) or not isinstance(sub.get("path"), str):
+            return self.error_response(400, "Sub-request needs a path")
+        method = str(sub.get("method", "GET")).upper()
+        path, _, query = sub["path"].partition('?')
+        if path == "/batch":
+            return self.error_response(400, "Batches can't be nested")
+        body = sub.get("body")
+        if body is not None and not isinstance(body, str):
+            body = json.dumps(body)
+        try:
+            if method == "GET":
+                response = await self.handle_get(path, {}, query)
+            elif method == "POST":
+                response = await self.handle_post(path, {}, body or "")
+            else:
+                return self.error_response(405, "Method Not Allowed")
+            if isinstance(response, StreamResponse):
+                response = response.encode()
+            return response
+        except Exception as e:
+            print(f"Error handling batch request {path}: {e}")
+            return self.error_response(500, "Internal Server Error")
+    
     async def handle_ipmi_connect(self, data):
         """Handle IPMI connection request"""
         try:
@@ -195,7 +527,8 @@ class HTTPServer:
             if success:
                 return self.json_response({"success": True})
             else:
-                return self.json_response({"success": False, "error": "Connection failed"})
+                return self.json_response({"success": False,
+                                           "error": self.ipmi_client.error or "Connection failed"})
         except Exception as e:
             return self.json_response({"success": False, "error": str(e)})
     
@@ -242,6 +575,28 @@ class HTTPServer:
         else:
             return self.error_response(503, "Not connected to IPMI server")
     
+    async def handle_ipmi_discover(self, data):
+        """Find BMCs in a CIDR range (RMCP presence ping, then Get Device ID)"""
+        cidr = data.get("cidr")
+        if not cidr:
+            return self.error_response(400, "cidr required")
+        if not self.discovery:
+            return self.error_response(503, "Discovery not available")
+        
+        options = {}
+        for key in ("port", "rate", "wait", "attempts", "identify", "timeout",
+                    "username", "password"):
+            if key in data:
+                options[key] = data[key]
+        try:
+            result = await self.discovery.discover(cidr, **options)
+        except (ValueError, TypeError) as e:
+            return self.error_response(400, str(e))
+        except RuntimeError as e:
+            return self.error_response(409, str(e))
+        result["success"] = True
+        return self.stream_response(result)
+    
     async def handle_script_execute(self, data):
         """Execute script"""
         language = data.get("language", "")
@@ -262,6 +617,85 @@ class HTTPServer:
                 "error": str(e)
             })
     
+    def handle_schedule_get(self, path):
+        """List scheduled jobs or get one by id (/schedule/<id>)"""
+        if not self.scheduler:
+            return self.error_response(503, "Scheduler not available")
+        
+        if path == "/schedule":
+            return self.json_response({"success": True, "jobs": self.scheduler.list_jobs()})
+        
+        try:
+            job_id = int(path[len("/schedule/"):])
+        except ValueError:
+            return self.error_response(404, "Not Found")
+        job = self.scheduler.get_job(job_id)
+        if job is None:
+            return self.error_response(404, "Job not found")
+        return self.json_response({"success": True, "job": job})
+    
+    def handle_schedule_post(self, path, data):
+        """Create, update or delete a scheduled job"""
+        if not self.scheduler:
+            return self.error_response(503, "Scheduler not available")
+        
+        try:
+            if path == "/schedule/add":
+                job = self.scheduler.add_job(data)
+                return self.json_response({"success": True, "job": job})
+            
+            job_id = data.get("id")
+            if job_id is None:
+                return self.error_response(400, "Job id required")
+            
+            if path == "/schedule/update":
+                job = self.scheduler.update_job(job_id, data.get("job", {}))
+                if job is None:
+                    return self.error_response(404, "Job not found")
+                return self.json_response({"success": True, "job": job})
+            
+            if not self.scheduler.delete_job(job_id):
+                return self.error_response(404, "Job not found")
+            return self.json_response({"success": True})
+        except ValueError as e:
+            return self.error_response(400, str(e))
+    
+    def is_ota_upload(self, head):
+        """Check for POST /ota, which streams its body"""
+        parts = head.split(' ', 2)
+        return len(parts) > 1 and parts[0] == "POST" and parts[1].split('?')[0] == "/ota"
+    
+    async def handle_ota_upload(self, head, headers, reader, length):
+        """Stream a firmware bundle into the inactive slot (?reboot=1 restarts into it)"""
+        if not self.ota:
+            return self.error_response(503, "OTA not available")
+        if not length:
+            return self.error_response(411, "Content-Length required")
+        
+        query = head.split(' ', 2)[1].partition('?')[2]
+        try:
+            state = await self.ota.receive(reader, headers.get("x-ota-sha256"))
+        except OTAError as e:
+            return self.error_response(400, str(e))
+        except Exception as e:
+            return self.error_response(500, f"Update failed: {e}")
+        
+        reboot = "reboot=1" in query.split('&')
+        if reboot:
+            asyncio.create_task(self.ota.reboot())
+        return self.json_response({"success": True, "ota": state, "rebooting": reboot})
+    
+    def handle_ota_rollback(self, data):
+        """Switch back to the previous slot on the next restart"""
+        if not self.ota:
+            return self.error_response(503, "OTA not available")
+        if not self.ota.active_slot():
+            return self.error_response(400, "No update installed")
+        self.ota.rollback(str(data.get("reason", "requested"))[:100])
+        if data.get("reboot"):
+            asyncio.create_task(self.ota.reboot())
+        return self.json_response({"success": True, "ota": self.ota.status()})
+    
     def json_response(self, data, status_code=200):
         """Create JSON response"""
         json_str = json.dumps(data)
@@ -276,6 +710,43 @@ class HTTPServer:
         
         return response.encode()
     
+    def stream_response(self, data, status_code=200):
+        """JSON response streamed in chunks; lists in data may be generators"""
+        return StreamResponse(data, status_code)
+    
+    def batch_response(self, requests, responses):
+        """Combine sub-responses; JSON bodies are embedded as sent, not decoded again"""
+        parts = []
+        for sub, response in zip(requests, responses):
+            head, _, body = response.partition(b"\r\n\r\n")
+            if b"image/" in head:
+                body = b"null"
+            elif b"application/json" not in head:
+                body = json.dumps(body.decode()).encode()
+            part = b'{"status": ' + response[9:12] + b', "body": ' + body
+            if isinstance(sub, dict) and "id" in sub:
+                part += b', "id": ' + json.dumps(sub["id"]).encode()
+            parts.append(part + b"}")
+        body = b'{"success": true, "responses": [' + b", ".join(parts) + b"]}"
+        
+        response = "HTTP/1.1 200 OK\r\n"
+        response += "Content-Type: application/json\r\n"
+        response += f"Content-Length: {len(body)}\r\n"
+        response += "Access-Control-Allow-Origin: *\r\n"
+        response += "\r\n"
+        
+        return response.encode() + body
+    
+    def text_response(self, text, content_type="text/plain"):
+        """Create plain text response"""
+        body = text.encode()
+        response = "HTTP/1.1 200 OK\r\n"
+        response += f"Content-Type: {content_type}\r\n"
+        response += f"Content-Length: {len(body)}\r\n"
+        response += "\r\n"
+        
+        return response.encode() + body
+    
     def image_response(self, image_data):
         """Create image response"""
         response = "HTTP/1.1 200 OK\r\n"
@@ -293,7 +764,12 @@ class HTTPServer:
     async def send_response(self, client, response):
         """Send HTTP response to client"""
         try:
-            if isinstance(response, bytes):
+            if isinstance(response, StreamResponse):
+                # One chunk in memory at a time, however large the document
+                await send_all(client, response.head())
+                for chunk in jsonstream.chunked(response.data):
+                    await send_all(client, chunk)
+            elif isinstance(response, bytes):
                 await asyncio.sleep(0)
                 client.sendall(response)
             else:
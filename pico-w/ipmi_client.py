@@ -3,15 +3,102 @@ IPMI Client for iRackPilot Pico W
 Handles IPMI protocol communication with full IPMI 2.0 support
 """
 
-import socket
-import struct
+import binascii
+from array import array
 import time
-import uasyncio as asyncio
-from ipmi_protocol import IPMIProtocol
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from ipmi_protocol import (IPMIProtocol, IPMIResponse, DeviceID, ChassisStatus, SensorReading,
+                           SELInfo, SEL_RECORD_SIZE, MANUFACTURERS)
+from fru import fru_reader
+from health import bmc_health
+from memstats import stats
+from metrics import metrics, ipmi_key, ticks_ms, ticks_diff
+from board import board
+
+# Offsets of netfn and cmd in a request packet (after the RMCP and session headers)
+REQUEST_NETFN_OFFSET = 30
+REQUEST_CMD_OFFSET = 33
+
+# Replies are received into one preallocated buffer per client
+RX_BUFFER_SIZE = board.rx_buffer
+
+# Coalescing keys for read-only operations (sensor reads add the sensor number)
+DEVICE_ID_KEY = ipmi_key(0x06, 0x01)
+SYSTEM_GUID_KEY = ipmi_key(0x06, 0x37)
+CHASSIS_STATUS_KEY = ipmi_key(0x00, 0x01)
+SENSOR_KEY = ipmi_key(0x04, 0x2D) << 8
+SEL_INFO_KEY = ipmi_key(0x0A, 0x40)
+SEL_ENTRY_KEY = ipmi_key(0x0A, 0x43) << 16
+FRU_INFO_KEY = ipmi_key(0x0A, 0x10)
+# FRU data reads add the 16-bit offset and 8-bit count: reads at one offset
+# but of different lengths must not share a result
+FRU_DATA_KEY = ipmi_key(0x0A, 0x11) << 24
+
+# Bound on one background reachability probe of a BMC whose breaker is open
+PROBE_TIMEOUT = 5
+
+class Job:
+    """One queued BMC operation, shared by every caller waiting for its result"""
+    __slots__ = ('key', 'func', 'args', 'done', 'result', 'error')
+    
+    def __init__(self, key, func, args):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.done = asyncio.Event()
+        self.result = None
+        self.error = None
+
+class SensorRing:
+    """Preallocated ring of (ticks_ms, raw reading) samples for one sensor"""
+    __slots__ = ('times', 'readings', 'next', 'count')
+    
+    def __init__(self, length):
+        self.times = array('I', [0] * length)
+        self.readings = bytearray(length)
+        self.next = 0
+        self.count = 0
+
+class SensorHistory:
+    """Recent readings of up to max_sensors sensors, length samples each"""
+    
+    def __init__(self, length=board.sensor_history, max_sensors=board.cache_entries):
+        self.length = length
+        self.max_sensors = max_sensors
+        self.rings = {}
+    
+    def add(self, sensor, reading):
+        ring = self.rings.get(sensor)
+        if ring is None:
+            if len(self.rings) >= self.max_sensors:
+                return
+            ring = self.rings[sensor] = SensorRing(self.length)
+        ring.times[ring.next] = ticks_ms() & 0xFFFFFFFF
+        ring.readings[ring.next] = reading
+        ring.next = (ring.next + 1) % self.length
+        if ring.count < self.length:
+            ring.count += 1
+    
+    def samples(self, sensor):
+        """Iterator of [age_ms, reading] pairs oldest first, None if the sensor has no history"""
+        ring = self.rings.get(sensor)
+        if ring is None:
+            return None
+        return self.iter_samples(ring, ticks_ms() & 0xFFFFFFFF)
+    
+    def iter_samples(self, ring, now):
+        start = (ring.next - ring.count) % self.length
+        for i in range(ring.count):
+            index = (start + i) % self.length
+            yield [ticks_diff(now, ring.times[index]), ring.readings[index]]
 
 class IPMIClient:
     def __init__(self):
-        self.socket = None
+        self.reader = None
+        self.writer = None
         self.connected = False
         self.host = None
         self.port = None
@@ -22,165 +109,414 @@ class IPMIClient:
         self.console_active = False
         self.server_info = {}
         self.ipmi_protocol = IPMIProtocol()
+        self.ipmi_protocol.parse_ipmi_response = stats.wrap(
+            "parse_ipmi_response", self.ipmi_protocol.parse_ipmi_response)
         self.connection_timeout = 10
+        self.response_timeout = 5
         self.retry_count = 3
+        self.error = None  # why the last connect failed
+        # Reused for every reply: valid until the next request on this client
+        self.rx_buffer = bytearray(RX_BUFFER_SIZE)
+        self.rx_view = memoryview(self.rx_buffer)
+        self.response = IPMIResponse()
+        self.device = DeviceID()
+        self.chassis = ChassisStatus()
+        self.sensor = SensorReading()
+        self.sel_info = SELInfo()
+        self.sensor_history = SensorHistory()
+        # Every BMC round trip runs on one actor task, so replies can't interleave
+        self.queue = []
+        self.inflight = {}
+        self.actor = None
+        self.wakeup = asyncio.Event()
         
-    async def connect(self, host, port, username, password, vendor):
-        """Connect to IPMI server with full IPMI 2.0 protocol"""
+    async def connect(self, host, port, username, password, vendor, fetch_info=True):
+        """
+        Connect to IPMI server with full IPMI 2.0 protocol
+        
+        Fails at once with the cached error (in self.error) while the
+        BMC's circuit breaker is open; a failed connect opens it.
+        """
+        # A client reused for another connect must not leak its old socket
+        self.close_stream()
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.vendor = vendor
+        self.error = None
+        
+        if not bmc_health.allow(host, port, (username, password)):
+            self.connected = False
+            self.error = bmc_health.error(host, port)
+            metrics.ipmi_fast_fails += 1
+            print(f"Not connecting to {host}:{port}: {self.error}")
+            return False
+        
+        if await self.attempt_connect(fetch_info):
+            bmc_health.success(host, port)
+            return True
+        self.connect_failed(self.error or "Connection failed")
+        return False
+    
+    def connect_failed(self, error):
+        """Open this BMC's breaker; a background probe with the same credentials closes it"""
+        self.error = error
+        host, port, username, password, vendor = (self.host, self.port, self.username,
+                                                  self.password, self.vendor)
+        bmc_health.failure(host, port, error,
+                           lambda: probe_bmc(host, port, username, password, vendor),
+                           (username, password))
+    
+    async def attempt_connect(self, fetch_info=True):
+        """Connect to the BMC set in connect(), with retries (no breaker check)"""
+        host = self.host
+        port = self.port
+        username = self.username
+        password = self.password
         
         # Try connection with retries
         for attempt in range(self.retry_count):
             try:
-                # Create socket
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.settimeout(self.connection_timeout)
-                
-                # Connect to IPMI server
+                # Connect to IPMI server without blocking the event loop
                 print(f"Connecting to IPMI server {host}:{port} (attempt {attempt + 1})...")
-                self.socket.connect((host, port))
+                if attempt:
+                    metrics.ipmi_connect_retries += 1
+                start = ticks_ms()
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), self.connection_timeout)
+                metrics.ipmi_connect.observe(ticks_diff(ticks_ms(), start))
                 
                 # Establish IPMI session
+                start = ticks_ms()
                 if self.ipmi_protocol.establish_session(username, password):
                     self.connected = True
                     self.session_id = self.ipmi_protocol.session_id
                     
                     # Verify connection by getting device ID
-                    if await self.verify_connection():
+                    verified = await self.verify_connection()
+                    metrics.ipmi_handshake.observe(ticks_diff(ticks_ms(), start))
+                    if verified:
                         # Get server info
-                        await self.fetch_server_info()
+                        if fetch_info:
+                            await self.fetch_server_info()
                         print(f"Successfully connected to IPMI server {host}:{port}")
                         return True
                     else:
                         print("Connection verification failed")
-                        self.socket.close()
-                        self.socket = None
+                        self.error = "Connection verification failed"
+                        self.close_stream()
                 else:
                     print("Session establishment failed")
-                    self.socket.close()
-                    self.socket = None
+                    self.error = "Session establishment failed"
+                    self.close_stream()
                     
-            except OSError as e:
+            except (OSError, asyncio.TimeoutError) as e:
                 print(f"Connection attempt {attempt + 1} failed: {e}")
-                if self.socket:
-                    try:
-                        self.socket.close()
-                    except:
-                        pass
-                    self.socket = None
+                self.error = str(e) or "Timed out"
+                self.close_stream()
                 
                 if attempt < self.retry_count - 1:
                     await asyncio.sleep(1)  # Wait before retry
             except Exception as e:
                 print(f"Unexpected error during connection: {e}")
-                if self.socket:
-                    try:
-                        self.socket.close()
-                    except:
-                        pass
-                    self.socket = None
+                self.error = str(e)
+                self.close_stream()
                 break
         
         self.connected = False
+        metrics.ipmi_connect_failures += 1
         print(f"Failed to connect to IPMI server after {self.retry_count} attempts")
         return False
     
+    def close_stream(self):
+        """Close the BMC stream, ignoring errors"""
+        if self.writer:
+            try:
+                self.writer.close()
+            except:
+                pass
+        self.reader = None
+        self.writer = None
+    
     async def verify_connection(self):
         """Verify IPMI connection by sending Get Device ID command"""
         try:
             # Send Get Device ID command
-            packet = self.ipmi_protocol.get_device_id()
-            self.socket.sendall(packet)
-            
-            # Wait for response
-            await asyncio.sleep(0.1)
-            response = self.socket.recv(1024)
-            
-            if response and len(response) > 0:
-                parsed = self.ipmi_protocol.parse_ipmi_response(response)
-                if parsed and parsed['completion_code'] == 0x00:
-                    return True
-            return False
+            return bool(await self.get_device_info())
         except Exception as e:
             print(f"Connection verification error: {e}")
             return False
+
+    async def call(self, key, func, *args):
+        """
+        Run func(*args) on the client's actor task and return its result
+        
+        Operations run one at a time in the order they were submitted. A
+        read-only operation (key not None) that is already queued or running
+        is not sent again: the caller shares that operation's result. Reads
+        submitted after a write never share a result from before it.
+        """
+        job = self.inflight.get(key) if key is not None else None
+        if job is None:
+            job = Job(key, func, args)
+            self.queue.append(job)
+            if key is None:
+                self.inflight.clear()
+            else:
+                self.inflight[key] = job
+            if self.actor is None:
+                self.actor = asyncio.create_task(self.run_actor())
+            else:
+                self.wakeup.set()
+        else:
+            metrics.ipmi_coalesced += 1
+        await job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    async def run_actor(self):
+        """Work through the command queue; idles while connected, exits after disconnect"""
+        try:
+            while True:
+                while self.queue:
+                    job = self.queue.pop(0)
+                    try:
+                        job.result = await job.func(*job.args)
+                    except Exception as e:
+                        job.error = e
+                    if job.key is not None and self.inflight.get(job.key) is job:
+                        del self.inflight[job.key]
+                    job.done.set()
+                if not self.connected:
+                    break
+                self.wakeup.clear()
+                await self.wakeup.wait()
+        finally:
+            self.actor = None
+
+    async def transact(self, packet):
+        """
+        Send a prepared IPMI packet and return the parsed response
+        
+        Only the actor may call this (through call()). The response is the
+        client's reused IPMIResponse and its data points into the receive
+        buffer, so copy anything needed before the caller's next await.
+        Replies to another netfn/cmd are dropped. After a timeout the
+        stream is reopened, so a late reply can't answer the next request.
+        """
+        if self.writer is None:
+            raise OSError("Not connected to IPMI server")
+        netfn = packet[REQUEST_NETFN_OFFSET]
+        cmd = packet[REQUEST_CMD_OFFSET]
+        key = ipmi_key(netfn, cmd)
+        start = ticks_ms()
+        self.writer.write(packet)
+        await self.writer.drain()
+
+        while True:
+            # Wait for response without blocking other tasks
+            remaining = max(0, self.response_timeout - ticks_diff(ticks_ms(), start) / 1000)
+            try:
+                if hasattr(self.reader, "readinto"):
+                    # MicroPython streams fill the preallocated buffer directly
+                    size = await asyncio.wait_for(self.reader.readinto(self.rx_buffer), remaining)
+                    response = self.rx_view[:size] if size else None
+                else:
+                    response = await asyncio.wait_for(self.reader.read(RX_BUFFER_SIZE), remaining)
+            except asyncio.TimeoutError:
+                metrics.ipmi_timeouts.inc(key)
+                await self.reopen_stream()
+                raise
+            if not response:
+                return None
+            parsed = self.ipmi_protocol.parse_ipmi_response(response, self.response)
+            if parsed is None or (parsed.netfn == netfn + 1 and parsed.cmd == cmd):
+                break
+            metrics.ipmi_stale_replies += 1
+            print(f"Dropped IPMI reply {parsed.netfn:#04x}/{parsed.cmd:#04x} "
+                  f"while waiting for {netfn + 1:#04x}/{cmd:#04x}")
+        metrics.ipmi_requests.get(key).observe(ticks_diff(ticks_ms(), start))
+        return parsed
     
+    async def reopen_stream(self):
+        """Replace the BMC stream with a fresh connection (disconnected if that fails)"""
+        self.close_stream()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.connection_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"Reconnect to IPMI server {self.host}:{self.port} failed: {e}")
+            self.close_stream()
+            self.connected = False
+
+    async def request(self, netfn, cmd, data=b''):
+        """Send a raw IPMI request and return the parsed response"""
+        return await self.call(None, self.send_request, netfn, cmd, data)
+
+    async def send_request(self, netfn, cmd, data):
+        return await self.transact(self.ipmi_protocol.send_command(netfn, cmd, data))
+
+    async def get_device_info(self):
+        """Get Device ID and decode it into a dict"""
+        return await self.call(DEVICE_ID_KEY, self.query_device_id)
+
+    async def query_device_id(self):
+        parsed = await self.transact(self.ipmi_protocol.get_device_id())
+        if self.device.decode(parsed):
+            return self.device.to_dict()
+        return {}
+
+    async def get_chassis_status(self):
+        """Get Chassis Status, decoded into the client's reused ChassisStatus (or None)"""
+        return await self.call(CHASSIS_STATUS_KEY, self.query_chassis_status)
+
+    async def query_chassis_status(self):
+        parsed = await self.transact(self.ipmi_protocol.get_chassis_status())
+        return self.chassis if self.chassis.decode(parsed) else None
+
+    async def get_power_state(self):
+        """Get chassis power state ("on", "off" or None if unknown)"""
+        status = await self.get_chassis_status()
+        return status.power_state() if status else None
+
+    async def chassis_control(self, command):
+        """Send a Chassis Control command, returns True on success"""
+        return await self.call(None, self.send_chassis_control, command)
+
+    async def send_chassis_control(self, command):
+        parsed = await self.transact(self.ipmi_protocol.chassis_control(command))
+        return bool(parsed and parsed.ok())
+
+    async def get_system_guid(self):
+        """Get the system GUID as a hex string (or None)"""
+        return await self.call(SYSTEM_GUID_KEY, self.query_system_guid)
+
+    async def query_system_guid(self):
+        parsed = await self.transact(self.ipmi_protocol.get_system_guid())
+        if parsed and parsed.ok() and len(parsed.data) >= 16:
+            return binascii.hexlify(parsed.data[:16]).decode()
+        return None
+
+    async def read_sensor(self, sensor_number):
+        """
+        Get a sensor reading into the client's reused SensorReading (or None)
+        
+        For polling loops: the reading object is reused, so the result is
+        overwritten by the next call. Available readings are also kept
+        in sensor_history.
+        """
+        return await self.call(SENSOR_KEY | sensor_number, self.query_sensor, sensor_number)
+
+    async def query_sensor(self, sensor_number):
+        parsed = await self.transact(self.ipmi_protocol.get_sensor_reading(sensor_number))
+        if not self.sensor.decode(parsed, sensor_number):
+            return None
+        if self.sensor.available:
+            self.sensor_history.add(sensor_number, self.sensor.reading)
+        return self.sensor
+
+    async def get_sensor_reading(self, sensor_number):
+        """Get a raw sensor reading as a dict (or None if unavailable)"""
+        reading = await self.read_sensor(sensor_number)
+        return reading.to_dict() if reading else None
+
+    async def get_fru_info(self):
+        """Get FRU Inventory Area Info: (size, accessed by words) or None"""
+        return await self.call(FRU_INFO_KEY, self.query_fru_info)
+
+    async def query_fru_info(self):
+        parsed = await self.transact(self.ipmi_protocol.get_fru_info())
+        if not parsed or not parsed.ok() or len(parsed.data) < 3:
+            return None
+        data = parsed.data
+        return data[0] | data[1] << 8, bool(data[2] & 0x01)
+
+    async def read_fru(self, offset, count):
+        """Read FRU Data: (completion code, bytes read) or None without a reply"""
+        return await self.call(FRU_DATA_KEY | offset << 8 | count, self.query_fru_data,
+                               offset, count)
+
+    async def query_fru_data(self, offset, count):
+        parsed = await self.transact(self.ipmi_protocol.read_fru_data(offset, count))
+        if not parsed:
+            return None
+        if not parsed.ok() or not len(parsed.data):
+            return parsed.completion_code, b''
+        data = parsed.data
+        return 0, bytes(data[1:1 + data[0]])
+
+    async def get_fru(self, refresh=False):
+        """FRU inventory (chassis, board, product), from the flash cache after the first read"""
+        return await fru_reader.read(self, refresh)
+
+    async def get_sel_info(self):
+        """Get SEL Info, decoded into the client's reused SELInfo (or None)"""
+        return await self.call(SEL_INFO_KEY, self.query_sel_info)
+
+    async def query_sel_info(self):
+        parsed = await self.transact(self.ipmi_protocol.get_sel_info())
+        return self.sel_info if self.sel_info.decode(parsed) else None
+
+    async def get_sel_entry(self, record_id):
+        """Read one SEL record: (next record ID, 16 record bytes), None if not present"""
+        return await self.call(SEL_ENTRY_KEY | record_id, self.query_sel_entry, record_id)
+
+    async def query_sel_entry(self, record_id):
+        parsed = await self.transact(self.ipmi_protocol.get_sel_entry(record_id))
+        if not parsed or not parsed.ok() or len(parsed.data) < 2 + SEL_RECORD_SIZE:
+            return None
+        data = parsed.data
+        return data[0] | data[1] << 8, bytes(data[2:2 + SEL_RECORD_SIZE])
+
     def disconnect(self):
         """Disconnect from IPMI server"""
-        if self.socket:
-            try:
-                self.socket.close()
-            except:
-                pass
-        self.socket = None
+        self.close_stream()
         self.connected = False
+        self.wakeup.set()
         self.console_active = False
         self.server_info = {}
     
     def is_connected(self):
         """Check if connected to IPMI server"""
-        return self.connected and self.socket is not None
+        return self.connected and self.writer is not None
     
     async def fetch_server_info(self):
         """Fetch server information via IPMI commands"""
         try:
             # Get Device ID
-            packet = self.ipmi_protocol.get_device_id()
-            self.socket.sendall(packet)
-            await asyncio.sleep(0.1)
-            response = self.socket.recv(1024)
-            
-            device_info = {}
-            if response:
-                parsed = self.ipmi_protocol.parse_ipmi_response(response)
-                if parsed and parsed['completion_code'] == 0x00:
-                    data = parsed['data']
-                    if len(data) >= 11:
-                        device_info['device_id'] = data[0]
-                        device_info['device_revision'] = data[1] & 0x0F
-                        device_info['firmware_major'] = data[2] & 0x7F
-                        device_info['firmware_minor'] = (data[2] >> 7) | ((data[3] & 0x0F) << 1)
-                        device_info['ipmi_version'] = data[3] >> 4
-                        device_info['manufacturer_id'] = struct.unpack('<I', data[4:7] + b'\x00')[0]
-                        device_info['product_id'] = struct.unpack('<H', data[7:9])[0]
+            device_info = await self.get_device_info()
             
             # Get Chassis Status
-            packet = self.ipmi_protocol.get_chassis_status()
-            self.socket.sendall(packet)
-            await asyncio.sleep(0.1)
-            response = self.socket.recv(1024)
+            power_state = await self.get_power_state() or "unknown"
             
-            power_state = "unknown"
-            if response:
-                parsed = self.ipmi_protocol.parse_ipmi_response(response)
-                if parsed and parsed['completion_code'] == 0x00:
-                    data = parsed['data']
-                    if len(data) > 0:
-                        power_state = "on" if (data[0] & 0x01) else "off"
-            
-            # Map manufacturer ID to name
-            manufacturer_map = {
-                0x0003A7: "HP",
-                0x0010DE: "Dell",
-                0x0000DC: "Intel",
-                0x0000E0: "Supermicro"
-            }
+            # Product name and serial number from the FRU inventory (cached by GUID)
+            product, board_info, chassis = {}, {}, {}
+            try:
+                inventory = await self.get_fru()
+                if inventory:
+                    product = inventory.get("product") or {}
+                    board_info = inventory.get("board") or {}
+                    chassis = inventory.get("chassis") or {}
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"FRU read failed: {e}")
             
             manufacturer_id = device_info.get('manufacturer_id', 0)
-            manufacturer = manufacturer_map.get(manufacturer_id, self.vendor or "Generic")
+            manufacturer = MANUFACTURERS.get(manufacturer_id, self.vendor or "Generic")
+            product_name = product.get("product_name") or board_info.get("product_name")
+            if not product_name:
+                product_name = f"{manufacturer} Server" if manufacturer != "Generic" else "IPMI Server"
             
             # Build server info
             self.server_info = {
                 "manufacturer": manufacturer,
-                "product_name": f"{manufacturer} Server" if manufacturer != "Generic" else "IPMI Server",
-                "serial_number": None,  # Would need additional command
-                "firmware_version": f"{device_info.get('firmware_major', 0)}.{device_info.get('firmware_minor', 0)}" if device_info.get('firmware_major') else None,
+                "product_name": product_name,
+                "serial_number": (product.get("serial_number") or chassis.get("serial_number")
+                                  or board_info.get("serial_number")),
+                "firmware_version": f"{device_info['firmware_major']}.{device_info['firmware_minor']:02d}" if device_info else None,
                 "power_state": power_state,
-                "ipmi_version": f"2.{device_info.get('ipmi_version', 0)}" if device_info.get('ipmi_version') else None
+                "ipmi_version": device_info.get('ipmi_version')
             }
             
         except Exception as e:
@@ -267,58 +603,34 @@ class IPMIClient:
             if "power" in cmd_lower:
                 if "status" in cmd_lower or "state" in cmd_lower:
                     # Get chassis status
-                    packet = self.ipmi_protocol.get_chassis_status()
-                    self.socket.sendall(packet)
-                    await asyncio.sleep(0.1)
-                    response = self.socket.recv(1024)
-                    
-                    if response:
-                        parsed = self.ipmi_protocol.parse_ipmi_response(response)
-                        if parsed and parsed['completion_code'] == 0x00:
-                            data = parsed['data']
-                            if len(data) > 0:
-                                power_state = "on" if (data[0] & 0x01) else "off"
-                                return f"Chassis Power is {power_state}"
+                    power_state = await self.get_power_state()
+                    if power_state:
+                        return f"Chassis Power is {power_state}"
                     return "Chassis Power status: unknown"
                 
                 elif "on" in cmd_lower:
                     # Power on
-                    packet = self.ipmi_protocol.chassis_control(0x01)
-                    self.socket.sendall(packet)
-                    await asyncio.sleep(0.1)
-                    response = self.socket.recv(1024)
+                    await self.chassis_control(0x01)
                     return "Power on command sent"
                 
                 elif "off" in cmd_lower:
                     # Power off
-                    packet = self.ipmi_protocol.chassis_control(0x00)
-                    self.socket.sendall(packet)
-                    await asyncio.sleep(0.1)
-                    response = self.socket.recv(1024)
+                    await self.chassis_control(0x00)
                     return "Power off command sent"
                 
                 elif "cycle" in cmd_lower or "reset" in cmd_lower:
                     # Power cycle
-                    packet = self.ipmi_protocol.chassis_control(0x02)
-                    self.socket.sendall(packet)
-                    await asyncio.sleep(0.1)
-                    response = self.socket.recv(1024)
+                    await self.chassis_control(0x02)
                     return "Power cycle command sent"
             
             # Get device ID
             elif "device" in cmd_lower and "id" in cmd_lower:
-                packet = self.ipmi_protocol.get_device_id()
-                self.socket.sendall(packet)
-                await asyncio.sleep(0.1)
-                response = self.socket.recv(1024)
+                await self.get_device_info()
                 return "Device ID retrieved"
             
             # Get system GUID
             elif "guid" in cmd_lower:
-                packet = self.ipmi_protocol.get_system_guid()
-                self.socket.sendall(packet)
-                await asyncio.sleep(0.1)
-                response = self.socket.recv(1024)
+                await self.get_system_guid()
                 return "System GUID retrieved"
             
             else:
@@ -327,3 +639,19 @@ class IPMIClient:
         except Exception as e:
             return f"Error executing command: {str(e)}"
 
+async def probe_bmc(host, port, username, password, vendor):
+    """One short connect to a BMC whose breaker is open; raises with the reason on failure"""
+    client = IPMIClient()
+    client.host = host
+    client.port = port
+    client.username = username
+    client.password = password
+    client.vendor = vendor
+    client.retry_count = 1
+    client.connection_timeout = PROBE_TIMEOUT
+    try:
+        if not await asyncio.wait_for(client.attempt_connect(fetch_info=False), PROBE_TIMEOUT * 2):
+            raise OSError(client.error or "Connection failed")
+        return True
+    finally:
+        client.disconnect()
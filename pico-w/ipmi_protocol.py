@@ -3,11 +3,230 @@ IPMI Protocol Implementation for iRackPilot
 Implements IPMI 2.0 protocol for connecting to IPMI servers
 """
 
+import binascii
 import struct
 import hashlib
 import os
 import time
 
+# Response layout: RMCP header (4) + session header, then the IPMI message
+RESPONSE_CC_OFFSET = 23
+RESPONSE_DATA_OFFSET = 24
+
+# IANA enterprise numbers reported in Get Device ID
+MANUFACTURERS = {
+    2: "IBM",
+    11: "HP",
+    343: "Intel",
+    674: "Dell",
+    7244: "Quanta",
+    10368: "Fujitsu",
+    10876: "Supermicro",
+    19046: "Lenovo",
+}
+
+# Get SEL Entry record IDs for the first and last entry, and the record size
+SEL_FIRST = 0x0000
+SEL_LAST = 0xFFFF
+SEL_RECORD_SIZE = 16
+
+# Sensor types named in decoded SEL entries
+SENSOR_TYPES = {
+    0x01: "temperature",
+    0x02: "voltage",
+    0x03: "current",
+    0x04: "fan",
+    0x05: "physical_security",
+    0x07: "processor",
+    0x08: "power_supply",
+    0x09: "power_unit",
+    0x0C: "memory",
+    0x0D: "drive_slot",
+    0x0F: "system_firmware",
+    0x10: "event_logging",
+    0x12: "system_event",
+    0x13: "critical_interrupt",
+    0x1D: "system_boot",
+    0x20: "os_stop",
+    0x23: "watchdog",
+}
+
+def bcd(value):
+    """Decode a packed BCD byte"""
+    return (value >> 4) * 10 + (value & 0x0F)
+
+class IPMIResponse:
+    """Parsed IPMI reply; data is a memoryview into the received packet"""
+    __slots__ = ('completion_code', 'netfn', 'cmd', 'session_id', 'data')
+    
+    def __init__(self):
+        self.completion_code = 0
+        self.netfn = 0
+        self.cmd = 0
+        self.session_id = 0
+        self.data = b''
+    
+    def ok(self):
+        return self.completion_code == 0x00
+
+class DeviceID:
+    """Get Device ID reply, decoded straight from the response buffer"""
+    __slots__ = ('device_id', 'device_revision', 'firmware_major', 'firmware_minor',
+                 'ipmi_version', 'manufacturer_id', 'product_id')
+    
+    def decode(self, response):
+        """Fill the fields from a response, False if it isn't a valid reply"""
+        if response is None or not response.ok() or len(response.data) < 11:
+            return False
+        data = response.data
+        self.device_id = data[0]
+        self.device_revision = data[1] & 0x0F
+        self.firmware_major = data[2] & 0x7F
+        self.firmware_minor = bcd(data[3])
+        # BCD with the major version in the low nibble (0x02 = 2.0, 0x51 = 1.5)
+        self.ipmi_version = data[4]
+        # 20-bit IANA enterprise number, least significant byte first
+        self.manufacturer_id = data[6] | data[7] << 8 | (data[8] & 0x0F) << 16
+        self.product_id = data[9] | data[10] << 8
+        return True
+    
+    def to_dict(self):
+        return {
+            'device_id': self.device_id,
+            'device_revision': self.device_revision,
+            'firmware_major': self.firmware_major,
+            'firmware_minor': self.firmware_minor,
+            'ipmi_version': f"{self.ipmi_version & 0x0F}.{self.ipmi_version >> 4}",
+            'manufacturer_id': self.manufacturer_id,
+            'product_id': self.product_id,
+        }
+
+class ChassisStatus:
+    """Get Chassis Status reply, decoded straight from the response buffer"""
+    __slots__ = ('power_on', 'power_overload', 'interlock', 'power_fault', 'control_fault',
+                 'restore_policy', 'last_event', 'intrusion', 'front_panel_lockout',
+                 'drive_fault', 'cooling_fault')
+    
+    RESTORE_POLICIES = ("always-off", "previous", "always-on", "unknown")
+    
+    def decode(self, response):
+        """Fill the fields from a response, False if it isn't a valid reply"""
+        if response is None or not response.ok() or not len(response.data):
+            return False
+        data = response.data
+        state = data[0]
+        self.power_on = bool(state & 0x01)
+        self.power_overload = bool(state & 0x02)
+        self.interlock = bool(state & 0x04)
+        self.power_fault = bool(state & 0x08)
+        self.control_fault = bool(state & 0x10)
+        self.restore_policy = (state >> 5) & 0x03
+        self.last_event = data[1] if len(data) > 1 else 0
+        misc = data[2] if len(data) > 2 else 0
+        self.intrusion = bool(misc & 0x01)
+        self.front_panel_lockout = bool(misc & 0x02)
+        self.drive_fault = bool(misc & 0x04)
+        self.cooling_fault = bool(misc & 0x08)
+        return True
+    
+    def power_state(self):
+        return "on" if self.power_on else "off"
+    
+    def to_dict(self):
+        return {
+            'power_state': self.power_state(),
+            'power_overload': self.power_overload,
+            'interlock': self.interlock,
+            'power_fault': self.power_fault,
+            'control_fault': self.control_fault,
+            'restore_policy': self.RESTORE_POLICIES[self.restore_policy],
+            'last_event': self.last_event,
+            'intrusion': self.intrusion,
+            'front_panel_lockout': self.front_panel_lockout,
+            'drive_fault': self.drive_fault,
+            'cooling_fault': self.cooling_fault,
+        }
+
+class SensorReading:
+    """Get Sensor Reading reply, decoded straight from the response buffer"""
+    __slots__ = ('sensor', 'reading', 'events_enabled', 'scanning', 'available', 'state')
+    
+    def decode(self, response, sensor=None):
+        """Fill the fields from a response, False if it isn't a valid reply"""
+        if response is None or not response.ok() or len(response.data) < 2:
+            return False
+        data = response.data
+        self.sensor = sensor
+        self.reading = data[0]
+        self.events_enabled = bool(data[1] & 0x80)
+        self.scanning = bool(data[1] & 0x40)
+        self.available = not (data[1] & 0x20)
+        # Threshold or discrete state bits, when the sensor reports them
+        self.state = data[2] if len(data) > 2 else 0
+        return True
+    
+    def to_dict(self):
+        return {
+            "sensor": self.sensor,
+            "reading": self.reading,
+            "scanning": self.scanning,
+            "available": self.available,
+            "events_enabled": self.events_enabled,
+            "state": self.state,
+        }
+
+class SELInfo:
+    """Get SEL Info reply, decoded straight from the response buffer"""
+    __slots__ = ('version', 'entries', 'free_space', 'last_add', 'last_erase', 'operations')
+    
+    def decode(self, response):
+        """Fill the fields from a response, False if it isn't a valid reply"""
+        if response is None or not response.ok() or len(response.data) < 14:
+            return False
+        data = response.data
+        self.version = data[0]
+        self.entries = data[1] | data[2] << 8
+        self.free_space = data[3] | data[4] << 8
+        self.last_add = data[5] | data[6] << 8 | data[7] << 16 | data[8] << 24
+        self.last_erase = data[9] | data[10] << 8 | data[11] << 16 | data[12] << 24
+        self.operations = data[13]
+        return True
+    
+    def to_dict(self):
+        return {
+            'version': f"{self.version & 0x0F}.{self.version >> 4}",
+            'entries': self.entries,
+            'free_space': self.free_space,
+            'last_add': self.last_add,
+            'last_erase': self.last_erase,
+            'overflow': bool(self.operations & 0x80),
+        }
+
+def decode_sel_record(record):
+    """Decode a 16-byte SEL record into a dict"""
+    record_type = record[2]
+    entry = {
+        'record_id': record[0] | record[1] << 8,
+        'record_type': record_type,
+    }
+    if record_type < 0xE0:
+        entry['timestamp'] = record[3] | record[4] << 8 | record[5] << 16 | record[6] << 24
+    if record_type == 0x02:
+        # System event: generator, sensor, event type and data
+        entry['generator_id'] = record[7] | record[8] << 8
+        entry['sensor_type'] = SENSOR_TYPES.get(record[10], record[10])
+        entry['sensor'] = record[11]
+        entry['event_type'] = record[12] & 0x7F
+        entry['assertion'] = not (record[12] & 0x80)
+        entry['event_data'] = [record[13], record[14], record[15]]
+    elif record_type < 0xE0:
+        # OEM timestamped: manufacturer ID and OEM data
+        entry['manufacturer_id'] = record[7] | record[8] << 8 | record[9] << 16
+        entry['oem_data'] = binascii.hexlify(record[10:16]).decode()
+    else:
+        entry['oem_data'] = binascii.hexlify(record[3:16]).decode()
+    return entry
+
 class IPMIProtocol:
     """IPMI 2.0 Protocol Handler"""
     
@@ -75,35 +294,29 @@ class IPMIProtocol:
         # For now, return placeholder
         return b'\x00' * 16
     
-    def parse_ipmi_response(self, data):
-        """Parse IPMI response message"""
-        if len(data) < 20:
-            return None
+    def parse_ipmi_response(self, data, response=None):
+        """
+        Parse IPMI response message
         
-        # Parse RMCP header (4 bytes)
-        rmcp_version = data[0]
-        rmcp_seq = data[2]
-        rmcp_class = data[3]
-        
-        # Parse IPMI session header (20 bytes)
-        auth_type = data[4]
-        session_id = struct.unpack('<I', data[5:9])[0]
-        sequence = struct.unpack('<I', data[9:13])[0]
+        Fills response in place when given (see IPMIResponse), so polling
+        doesn't allocate a new record for every reply.
+        """
+        if len(data) < RESPONSE_CC_OFFSET:
+            return None
+        if response is None:
+            response = IPMIResponse()
+        if not isinstance(data, memoryview):
+            data = memoryview(data)
         
-        # Parse IPMI message
-        rs_addr = data[20]
-        netfn = data[21]
-        cmd = data[22]
-        completion_code = data[23] if len(data) > 23 else 0
-        response_data = data[24:] if len(data) > 24 else b''
+        # IPMI session header follows the 4-byte RMCP header
+        response.session_id = data[5] | data[6] << 8 | data[7] << 16 | data[8] << 24
         
-        return {
-            'completion_code': completion_code,
-            'netfn': netfn,
-            'cmd': cmd,
-            'data': response_data,
-            'session_id': session_id
-        }
+        # IPMI message: rsAddr, netFn, cmd, completion code, data
+        response.netfn = data[21]
+        response.cmd = data[22]
+        response.completion_code = data[RESPONSE_CC_OFFSET] if len(data) > RESPONSE_CC_OFFSET else 0
+        response.data = data[RESPONSE_DATA_OFFSET:]
+        return response
     
     def establish_session(self, username, password):
         """Establish IPMI session (simplified)"""
@@ -152,4 +365,20 @@ class IPMIProtocol:
     def get_sensor_reading(self, sensor_number):
         """Get Sensor Reading command (NetFn 0x04, Cmd 0x2D)"""
         return self.send_command(0x04, 0x2D, struct.pack('B', sensor_number))
+    
+    def get_fru_info(self, device=0):
+        """Get FRU Inventory Area Info command (NetFn 0x0A, Cmd 0x10)"""
+        return self.send_command(0x0A, 0x10, struct.pack('B', device))
+    
+    def read_fru_data(self, offset, count, device=0):
+        """Read FRU Data command (NetFn 0x0A, Cmd 0x11)"""
+        return self.send_command(0x0A, 0x11, struct.pack('<BHB', device, offset, count))
+    
+    def get_sel_info(self):
+        """Get SEL Info command (NetFn 0x0A, Cmd 0x40)"""
+        return self.send_command(0x0A, 0x40)
+    
+    def get_sel_entry(self, record_id):
+        """Get SEL Entry command (NetFn 0x0A, Cmd 0x43), whole record, no reservation"""
+        return self.send_command(0x0A, 0x43, struct.pack('<HHBB', 0, record_id, 0, 0xFF))
 
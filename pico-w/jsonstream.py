@@ -0,0 +1,84 @@
+"""
+Streaming JSON for iRackPilot Pico W
+Encodes responses piece by piece into HTTP chunks so a large document is never held whole in RAM
+"""
+
+import json
+
+from board import board
+
+# Payload bytes per HTTP chunk
+CHUNK_SIZE = board.send_chunk
+# Fixed-width chunk size line ("01f4\r\n"); leading zeros are allowed
+SIZE_LINE = 6
+LAST_CHUNK = b"0\r\n\r\n"
+
+
+def encode(value):
+    """
+    Yield the JSON text of value in small str pieces
+
+    Lists, tuples and any other iterable (generators included) become
+    arrays, consumed one item at a time. Output matches json.dumps.
+    """
+    if isinstance(value, dict):
+        yield "{"
+        first = True
+        for key, item in value.items():
+            if first:
+                first = False
+            else:
+                yield ", "
+            yield json.dumps(str(key)) + ": "
+            yield from encode(item)
+        yield "}"
+    elif value is None or isinstance(value, (str, int, float, bytes, bytearray)):
+        # bool is an int; bytes raise TypeError just as json.dumps would
+        yield json.dumps(value)
+    else:
+        yield "["
+        first = True
+        for item in value:
+            if first:
+                first = False
+            else:
+                yield ", "
+            yield from encode(item)
+        yield "]"
+
+
+def chunked(value, size=CHUNK_SIZE):
+    """
+    Yield value's JSON as HTTP chunks (size line, data, CRLF), ending with the last chunk
+
+    Every chunk is a view of one reused buffer, valid until the next one
+    is requested.
+    """
+    buffer = bytearray(SIZE_LINE + size + 2)
+    view = memoryview(buffer)
+    used = 0
+    for piece in encode(value):
+        data = memoryview(piece.encode())
+        while len(data):
+            count = min(len(data), size - used)
+            buffer[SIZE_LINE + used:SIZE_LINE + used + count] = data[:count]
+            used += count
+            data = data[count:]
+            if used == size:
+                yield frame(buffer, view, used)
+                used = 0
+    if used:
+        yield frame(buffer, view, used)
+    yield LAST_CHUNK
+
+
+def frame(buffer, view, used):
+    """Fill in the size line and CRLF around used payload bytes"""
+    buffer[:SIZE_LINE] = f"{used:04x}\r\n".encode()
+    buffer[SIZE_LINE + used:SIZE_LINE + used + 2] = b"\r\n"
+    return view[:SIZE_LINE + used + 2]
+
+
+def dumps(value):
+    """The whole document as bytes, for callers that need it in one piece"""
+    return b"".join(piece.encode() for piece in encode(value))
@@ -1,17 +1,33 @@
 """
-iRackPilot Firmware for Raspberry Pi Pico W
-Main application entry point
+iRackPilot Firmware for Raspberry Pi Pico W and Pico 2 W
+Main application entry point (limits come from the detected board profile)
 """
 
-import network
+import os
 import socket
 import json
 import time
 from machine import Pin
-import uasyncio as asyncio
-from http_server import HTTPServer
-from ipmi_client import IPMIClient
-from script_engine import ScriptEngine
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from ota import OTAManager
+
+# Select the A/B slot before importing any module an update can replace
+ota_manager = OTAManager()
+ota_manager.boot()
+
+try:
+    from board import board
+    from services import Services
+except Exception as e:
+    # An update that can't even import is rolled back right away
+    ota_manager.boot_failed(e)
+    raise
+
+# Only accept updates built for this board
+ota_manager.model = board.model
 
 # WiFi Configuration
 WIFI_SSID = "YOUR_WIFI_SSID"
@@ -22,94 +38,78 @@ AP_MODE_PASSWORD = "iRackPilot123"
 # Server Configuration
 HTTP_PORT = 8080
 FIRMWARE_VERSION = "1.0.0"
+OTA_HEALTH_DELAY = 30  # seconds an update must run before it is kept
+MIN_FREE_HEAP = board.min_free_heap  # idle subsystems are unloaded below this
+SCHEDULE_FILE = "schedule.json"
 
-# Global instances
-wlan = None
-http_server = None
-ipmi_client = None
-script_engine = None
+def start_scheduler(module):
+    """Build the scheduler and start its loop"""
+    scheduler = module.Scheduler(ipmi_client, script_engine, SCHEDULE_FILE)
+    scheduler.load()
+    asyncio.create_task(scheduler.run())
+    return scheduler
 
-def setup_wifi():
-    """Setup WiFi connection"""
-    global wlan
-    
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-    
-    # Try to connect to WiFi
-    if WIFI_SSID and WIFI_PASSWORD:
-        print(f"Connecting to {WIFI_SSID}...")
-        wlan.connect(WIFI_SSID, WIFI_PASSWORD)
-        
-        # Wait for connection
-        max_wait = 20
-        while max_wait > 0:
-            if wlan.status() < 0 or wlan.status() >= 3:
-                break
-            max_wait -= 1
-            print('waiting for connection...')
-            time.sleep(1)
-        
-        if wlan.status() != 3:
-            print("Failed to connect to WiFi, starting AP mode...")
-            start_ap_mode()
-        else:
-            ip = wlan.ifconfig()[0]
-            print(f'Connected to WiFi. IP: {ip}')
-            return ip
-    else:
-        print("No WiFi credentials, starting AP mode...")
-        start_ap_mode()
-        return None
+# Subsystems are imported and built on first use; these are stand-ins
+services = Services()
+wifi = services.register("wifi", "wifi", lambda m: m.WiFiManager(
+    WIFI_SSID, WIFI_PASSWORD, AP_MODE_SSID, AP_MODE_PASSWORD))
+http_server = services.register("http_server", "http_server",
+                                lambda m: m.HTTPServer("0.0.0.0", HTTP_PORT))
+ipmi_client = services.register("ipmi_client", "ipmi_client", lambda m: m.IPMIClient())
+script_engine = services.register("script_engine", "script_engine",
+                                  lambda m: m.ScriptEngine(ipmi_client), unloadable=True,
+                                  requires=("ipmi_client",))
+scheduler = services.register("scheduler", "scheduler", start_scheduler)
+discovery = services.register("discovery", "discovery", lambda m: m.Discovery(),
+                              unloadable=True, requires=("ipmi_client",))
+sel = services.register("sel", "sel", lambda m: m.SELLog(ipmi_client), unloadable=True,
+                        requires=("ipmi_client",))
 
-def start_ap_mode():
-    """Start Access Point mode for configuration"""
-    global wlan
-    
-    ap = network.WLAN(network.AP_IF)
-    ap.active(True)
-    
-    # Generate unique SSID
-    import ubinascii
-    mac = ubinascii.hexlify(network.WLAN().config('mac'),':').decode()
-    ssid = AP_MODE_SSID.format(mac[-4:])
-    
-    ap.config(essid=ssid, password=AP_MODE_PASSWORD)
-    ap.config(authmode=3)  # WPA2
-    
-    ip = ap.ifconfig()[0]
-    print(f'AP Mode started. SSID: {ssid}, IP: {ip}')
-    return ip
+def has_scheduled_jobs():
+    """Check for persisted jobs without importing the scheduler"""
+    try:
+        os.stat(SCHEDULE_FILE)
+        return True
+    except OSError:
+        return False
 
 def get_status():
     """Get device status"""
-    wifi_connected = wlan and wlan.isconnected() if wlan else False
-    ip = wlan.ifconfig()[0] if wifi_connected else "192.168.4.1"
+    wifi_connected = wifi.is_connected()
+    ip = wifi.ip() or "192.168.4.1"
     
     return {
         "status": "ready" if wifi_connected else "ap_mode",
         "firmware_version": FIRMWARE_VERSION,
         "wifi_connected": wifi_connected,
         "ip_address": ip,
-        "model": "Pico W"
+        "wifi": wifi.status(),
+        "subsystems": services.status(),
+        "board": board.status(),
+        "model": board.name
     }
 
 async def main():
     """Main application loop"""
-    global http_server, ipmi_client, script_engine
-    
-    # Setup WiFi
-    ip = setup_wifi()
+    # Bring up WiFi in the background; it keeps reconnecting on its own
+    asyncio.create_task(wifi.run())
     
-    # Initialize components
-    ipmi_client = IPMIClient()
-    script_engine = ScriptEngine()
+    # Load the HTTP server while WiFi associates; the IPMI client, script
+    # engine, scheduler, discovery and SEL reader load on first use
+    http_server.setup_routes(ipmi_client, script_engine, get_status, scheduler, ota_manager,
+                             discovery, sel)
+    if has_scheduled_jobs():
+        services.get("scheduler")
+    asyncio.create_task(services.watch_memory(MIN_FREE_HEAP))
+    asyncio.create_task(ota_manager.confirm_after(
+        OTA_HEALTH_DELAY, lambda: http_server.socket is not None and not services.errors()))
     
-    # Start HTTP server
-    http_server = HTTPServer(ip or "192.168.4.1", HTTP_PORT)
-    http_server.setup_routes(ipmi_client, script_engine, get_status)
+    # Start HTTP server as soon as there is an address; listening on all
+    # interfaces keeps it serving across reconnects and STA/AP changes
+    await wifi.wait_ready()
     
-    print(f"iRackPilot firmware v{FIRMWARE_VERSION} started")
+    print(f"iRackPilot firmware v{FIRMWARE_VERSION} started on {board.name}")
+    services.print_profile()
     print(f"HTTP server running on port {HTTP_PORT}")
     
     # Run HTTP server
@@ -124,4 +124,5 @@ if __name__ == "__main__":
         print(f"Error: {e}")
         import sys
         sys.print_exception(e)
+        ota_manager.boot_failed(e)
 
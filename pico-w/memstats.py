@@ -0,0 +1,206 @@
+"""
+Memory Statistics for iRackPilot Pico W
+Tracks heap use, GC runs and per-route allocations in fixed-size tables
+"""
+
+import gc
+import time
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+# Table sizes; keys beyond these are counted under "other"
+MAX_ROUTES = 24
+MAX_SECTIONS = 8
+
+# Collect after a request whenever less heap than this is free, so
+# collections happen between requests instead of inside an allocation
+GC_HEADROOM = 24 * 1024
+
+# GC block size on MicroPython; the free block probe stops at this resolution
+GC_BLOCK = 16
+
+
+class Counters:
+    """Fixed-size table of allocation and GC counters, one slot per key"""
+
+    def __init__(self, size):
+        self.size = size
+        self.index = {}
+        self.keys = ["other"] + [None] * (size - 1)
+        self.calls = [0] * size
+        self.alloc_total = [0] * size
+        self.alloc_max = [0] * size
+        self.interrupted = [0] * size
+        self.gc_runs = [0] * size
+        self.gc_us_total = [0] * size
+        self.gc_us_max = [0] * size
+
+    def slot(self, key):
+        """Slot for key, slot 0 ("other") once the table is full"""
+        slot = self.index.get(key)
+        if slot is None:
+            if len(self.index) >= self.size - 1:
+                return 0
+            slot = len(self.index) + 1
+            self.index[key] = slot
+            self.keys[slot] = key
+        return slot
+
+    def add_alloc(self, slot, before, after):
+        self.calls[slot] += 1
+        if after < before:
+            # The heap shrank, so an automatic collection ran in between
+            # and the allocated size is unknown
+            self.interrupted[slot] += 1
+            return
+        size = after - before
+        self.alloc_total[slot] += size
+        if size > self.alloc_max[slot]:
+            self.alloc_max[slot] = size
+
+    def add_gc(self, slot, us):
+        self.gc_runs[slot] += 1
+        self.gc_us_total[slot] += us
+        if us > self.gc_us_max[slot]:
+            self.gc_us_max[slot] = us
+
+    def report(self):
+        rows = {}
+        for slot in range(self.size):
+            if self.keys[slot] is None or not self.calls[slot]:
+                continue
+            measured = self.calls[slot] - self.interrupted[slot]
+            rows[self.keys[slot]] = {
+                "calls": self.calls[slot],
+                "alloc_total": self.alloc_total[slot],
+                "alloc_avg": self.alloc_total[slot] // measured if measured else None,
+                "alloc_max": self.alloc_max[slot],
+                "auto_gc": self.interrupted[slot],
+                "gc_runs": self.gc_runs[slot],
+                "gc_pause_us_total": self.gc_us_total[slot],
+                "gc_pause_us_max": self.gc_us_max[slot],
+            }
+        return rows
+
+
+class MemStats:
+    """Heap high-water marks plus per-route and per-function allocation counters"""
+
+    def __init__(self, headroom=GC_HEADROOM):
+        # CPython has no heap counters; everything becomes a no-op there
+        self.available = hasattr(gc, "mem_alloc")
+        self.headroom = headroom
+        self.routes = Counters(MAX_ROUTES)
+        self.sections = Counters(MAX_SECTIONS)
+        self.peak_alloc = 0
+        self.min_free = None
+        self.gc_runs = 0
+        self.gc_us_total = 0
+        self.gc_us_max = 0
+
+    def sample(self):
+        """Update the high-water marks, returns the allocated byte count"""
+        if not self.available:
+            return 0
+        alloc = gc.mem_alloc()
+        free = gc.mem_free()
+        if alloc > self.peak_alloc:
+            self.peak_alloc = alloc
+        if self.min_free is None or free < self.min_free:
+            self.min_free = free
+        return alloc
+
+    def collect(self, table=None, slot=0):
+        """Run a timed collection, charged to a table slot if given"""
+        start = ticks_us()
+        gc.collect()
+        us = ticks_diff(ticks_us(), start)
+        self.gc_runs += 1
+        self.gc_us_total += us
+        if us > self.gc_us_max:
+            self.gc_us_max = us
+        if table:
+            table.add_gc(slot, us)
+        return us
+
+    def end_route(self, key, before):
+        """Account a finished request to its route; collect if the heap runs low"""
+        if not self.available:
+            return
+        slot = self.routes.slot(key)
+        self.routes.add_alloc(slot, before, self.sample())
+        if gc.mem_free() < self.headroom:
+            self.collect(self.routes, slot)
+
+    def wrap(self, name, func):
+        """Wrap func so the bytes each call allocates are counted under name"""
+        if not self.available:
+            return func
+        sections = self.sections
+        slot = sections.slot(name)
+
+        def wrapped(*args, **kwargs):
+            before = gc.mem_alloc()
+            result = func(*args, **kwargs)
+            sections.add_alloc(slot, before, gc.mem_alloc())
+            return result
+        return wrapped
+
+    def largest_free_block(self):
+        """
+        Largest single allocation that currently succeeds
+
+        Binary search with trial allocations and a collection after each,
+        so this is for the debug endpoint only.
+        """
+        if not self.available:
+            return None
+        gc.collect()
+        low, high = 0, gc.mem_free()
+        while high - low > GC_BLOCK:
+            mid = (low + high) // 2
+            try:
+                block = bytearray(mid)
+                del block
+                low = mid
+            except MemoryError:
+                high = mid
+            gc.collect()
+        return low
+
+    def report(self):
+        """Everything /debug/mem returns"""
+        info = {"available": self.available}
+        if self.available:
+            self.sample()
+            free = gc.mem_free()
+            alloc = gc.mem_alloc()
+            info.update({
+                "mem_free": free,
+                "mem_alloc": alloc,
+                "heap_size": free + alloc,
+                "peak_alloc": self.peak_alloc,
+                "min_free": self.min_free,
+                "largest_free_block": self.largest_free_block(),
+            })
+        info["gc"] = {
+            "runs": self.gc_runs,
+            "pause_us_total": self.gc_us_total,
+            "pause_us_max": self.gc_us_max,
+            "auto_detected": sum(self.routes.interrupted) + sum(self.sections.interrupted),
+            "headroom": self.headroom,
+        }
+        info["routes"] = self.routes.report()
+        info["sections"] = self.sections.report()
+        return info
+
+
+# Shared by the HTTP server and IPMI client
+stats = MemStats()
@@ -0,0 +1,197 @@
+"""
+Metrics for iRackPilot Pico W
+Fixed-bucket latency histograms and counters exported in Prometheus text format
+"""
+
+import gc
+import time
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+PREFIX = "irackpilot_"
+
+# Bucket i counts samples of at most 2**i ms (1 ms .. 8.2 s), the last one +Inf
+BUCKETS = 15
+INF_BUCKET = BUCKETS - 1
+LOG2_SIZE = 1024
+
+# Series per labelled family; later label values are counted under "other"
+MAX_SERIES = 32
+
+
+def build_log2_table(size):
+    """table[v] = ceil(log2(v)) for 1 <= v < size, table[0] = 0"""
+    table = bytearray(size)
+    for value in range(2, size):
+        table[value] = table[(value + 1) >> 1] + 1
+    return table
+
+
+LOG2 = build_log2_table(LOG2_SIZE)
+
+
+class Histogram:
+    """Latency histogram over preallocated power-of-two millisecond buckets"""
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.sum_ms = 0
+
+    def observe(self, ms):
+        """Record one sample: a table lookup and three additions"""
+        if ms < LOG2_SIZE:
+            bucket = LOG2[ms]
+        else:
+            bucket = 10 + LOG2[min((ms + 1023) >> 10, LOG2_SIZE - 1)]
+            if bucket > INF_BUCKET:
+                bucket = INF_BUCKET
+        self.counts[bucket] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+
+class Family:
+    """A labelled metric family with a bounded number of series"""
+
+    def __init__(self, name, kind, help_text, labels):
+        self.name = PREFIX + name
+        self.kind = kind
+        self.help = help_text
+        self.labels = labels
+        self.series = {}
+
+    def get(self, key):
+        """Series for a label key (a string or small int), created on first use"""
+        series = self.series.get(key)
+        if series is None:
+            if len(self.series) >= MAX_SERIES:
+                key = "other"
+                series = self.series.get(key)
+            if series is None:
+                series = Histogram() if self.kind == "histogram" else [0]
+                self.series[key] = series
+        return series
+
+    def inc(self, key, amount=1):
+        self.get(key)[0] += amount
+
+
+def ipmi_key(netfn, cmd):
+    """Label key for an IPMI command (an int, so lookups don't allocate)"""
+    return netfn << 8 | cmd
+
+
+def format_labels(names, key):
+    if isinstance(key, int) and names == ("netfn", "cmd"):
+        values = (f"0x{key >> 8:02x}", f"0x{key & 0xff:02x}")
+    else:
+        values = (key,)
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return ",".join(pairs)
+
+
+class Metrics:
+    """Registry of every firmware metric"""
+
+    def __init__(self):
+        self.http_requests = Family(
+            "http_request_duration_seconds", "histogram",
+            "HTTP request handling time", ("route",))
+        self.http_errors = Family(
+            "http_errors_total", "counter", "HTTP responses with a 5xx status", ("route",))
+        self.http_in_flight = 0
+        self.ipmi_requests = Family(
+            "ipmi_request_duration_seconds", "histogram",
+            "IPMI round trip time", ("netfn", "cmd"))
+        self.ipmi_timeouts = Family(
+            "ipmi_timeouts_total", "counter", "IPMI requests without a reply in time",
+            ("netfn", "cmd"))
+        self.ipmi_connect = Histogram()
+        self.ipmi_handshake = Histogram()
+        self.ipmi_connect_retries = 0
+        self.ipmi_connect_failures = 0
+        self.ipmi_coalesced = 0
+        self.ipmi_fast_fails = 0
+        self.ipmi_stale_replies = 0
+        self.ipmi_breakers_open = 0
+
+    def export(self):
+        """Render every metric in the Prometheus text format"""
+        lines = []
+        for family in (self.http_requests, self.http_errors,
+                       self.ipmi_requests, self.ipmi_timeouts):
+            self.export_family(lines, family)
+
+        self.export_histogram(lines, PREFIX + "ipmi_connect_duration_seconds",
+                              "TCP connect time to the BMC", self.ipmi_connect)
+        self.export_histogram(lines, PREFIX + "ipmi_handshake_duration_seconds",
+                              "IPMI session setup and verification time", self.ipmi_handshake)
+        self.export_value(lines, "ipmi_connect_retries_total", "counter",
+                          "Connection attempts after the first", self.ipmi_connect_retries)
+        self.export_value(lines, "ipmi_connect_failures_total", "counter",
+                          "Connects that failed after all retries", self.ipmi_connect_failures)
+        self.export_value(lines, "ipmi_coalesced_requests_total", "counter",
+                          "Read-only IPMI requests answered by one already in flight",
+                          self.ipmi_coalesced)
+        self.export_value(lines, "ipmi_fast_failures_total", "counter",
+                          "Connects refused at once because the BMC's breaker was open",
+                          self.ipmi_fast_fails)
+        self.export_value(lines, "ipmi_stale_replies_total", "counter",
+                          "BMC replies dropped for not answering the request sent",
+                          self.ipmi_stale_replies)
+        self.export_value(lines, "ipmi_breakers_open", "gauge",
+                          "BMCs known to be down and being probed", self.ipmi_breakers_open)
+        self.export_value(lines, "http_requests_in_flight", "gauge",
+                          "HTTP requests being handled", self.http_in_flight)
+        if hasattr(gc, "mem_free"):
+            self.export_value(lines, "heap_free_bytes", "gauge",
+                              "Free MicroPython heap", gc.mem_free())
+        lines.append("")
+        return "\n".join(lines)
+
+    def export_family(self, lines, family):
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for key, series in family.series.items():
+            labels = format_labels(family.labels, key)
+            if family.kind == "histogram":
+                self.export_buckets(lines, family.name, labels, series)
+            else:
+                lines.append(f"{family.name}{{{labels}}} {series[0]}")
+
+    def export_histogram(self, lines, name, help_text, histogram):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        self.export_buckets(lines, name, "", histogram)
+
+    def export_buckets(self, lines, name, labels, histogram):
+        prefix = labels + "," if labels else ""
+        cumulative = 0
+        for bucket in range(BUCKETS):
+            cumulative += histogram.counts[bucket]
+            le = "+Inf" if bucket == INF_BUCKET else str((1 << bucket) / 1000)
+            lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+        suffix = "{" + labels + "}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {histogram.sum_ms / 1000}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+
+    def export_value(self, lines, name, kind, help_text, value):
+        name = PREFIX + name
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+
+
+# Shared by the HTTP server and IPMI client
+metrics = Metrics()
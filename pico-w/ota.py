@@ -0,0 +1,387 @@
+"""
+OTA Updates for iRackPilot Pico W
+Streams firmware bundles into an inactive A/B slot and rolls back failed boots
+"""
+
+import os
+import sys
+import json
+import struct
+import hashlib
+import binascii
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# Bundle archive written by bundle.py: magic, then (name_len, size, name, data)
+# entries with manifest.json first, closed by an entry with name_len 0
+OTA_MAGIC = b"IRPOTA1\x00"
+OTA_ENTRY = "<HI"
+OTA_ENTRY_SIZE = struct.calcsize(OTA_ENTRY)
+
+MANIFEST_NAME = "manifest.json"
+STATE_FILE = "state.json"
+SLOTS = ("a", "b")
+
+CHUNK_SIZE = 2048
+MAX_MANIFEST_SIZE = 8192
+
+# Boots a new slot gets to pass its health check before it is rolled back
+MAX_BOOT_ATTEMPTS = 2
+
+# Hardware watchdog for unconfirmed slots (the RP2040 maximum is about 8.3 s);
+# a hang resets the board, which counts as a failed boot attempt
+WATCHDOG_MS = 8000
+FEED_INTERVAL = 1
+
+
+class OTAError(Exception):
+    """Rejected or failed update"""
+    pass
+
+
+class DirectoryBackend:
+    """
+    Slots as directories under root
+
+    On the Pico these live on the LittleFS flash filesystem, so every
+    chunk written goes straight to flash; on Linux any directory works.
+    """
+
+    def __init__(self, root="/ota"):
+        self.root = root.rstrip("/") or "/"
+
+    def path(self, *parts):
+        return "/".join((self.root,) + parts)
+
+    def exists(self, path):
+        try:
+            os.stat(path)
+            return True
+        except OSError:
+            return False
+
+    def slot_path(self, slot):
+        return self.path(slot)
+
+    def clear_slot(self, slot):
+        """Empty a slot so a new bundle can be written to it"""
+        if not self.exists(self.root):
+            os.mkdir(self.root)
+        path = self.slot_path(slot)
+        if not self.exists(path):
+            os.mkdir(path)
+            return
+        for name in os.listdir(path):
+            os.remove(f"{path}/{name}")
+
+    def open(self, slot, name, mode="rb"):
+        return open(f"{self.slot_path(slot)}/{name}", mode)
+
+    def read_state(self):
+        try:
+            with open(self.path(STATE_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_state(self, state):
+        """Persist the slot state (atomic rename)"""
+        if not self.exists(self.root):
+            os.mkdir(self.root)
+        path = self.path(STATE_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp, path)
+
+
+async def read_exact(reader, size):
+    """Read exactly size bytes from reader or raise OTAError"""
+    data = b""
+    while len(data) < size:
+        chunk = await reader.read(size - len(data))
+        if not chunk:
+            raise OTAError("Upload ended early")
+        data += chunk
+    return data
+
+
+def hex_digest(digest):
+    return binascii.hexlify(digest.digest()).decode()
+
+
+class OTAManager:
+    """Receives updates into the inactive slot and tracks which slot boots"""
+
+    def __init__(self, backend=None, model=None):
+        self.backend = backend or DirectoryBackend()
+        self.model = model
+        self.state = self.backend.read_state()
+        self.busy = False
+        self.last_error = None
+        self.watchdog = None
+
+    def active_slot(self):
+        return self.state.get("active")
+
+    def inactive_slot(self):
+        return SLOTS[1] if self.active_slot() == SLOTS[0] else SLOTS[0]
+
+    def status(self):
+        return {
+            "active": self.active_slot(),
+            "version": self.state.get("version"),
+            "previous": self.state.get("previous"),
+            "pending": self.state.get("pending", False),
+            "boot_attempts": self.state.get("boot_attempts", 0),
+            "rolled_back": self.state.get("rolled_back"),
+            "reason": self.state.get("reason"),
+            "busy": self.busy,
+            "last_error": self.last_error,
+            "watchdog": self.watchdog is not None,
+        }
+
+    def save(self):
+        self.backend.write_state(self.state)
+
+    def boot(self):
+        """
+        Select the slot to run at startup
+
+        Must run before firmware modules are imported: the active slot is
+        put first on sys.path so its modules shadow the built-in ones.
+        A slot still pending after MAX_BOOT_ATTEMPTS boots is rolled back.
+        """
+        if self.state.get("pending"):
+            attempts = self.state.get("boot_attempts", 0) + 1
+            if attempts > MAX_BOOT_ATTEMPTS:
+                self.rollback("health check not passed")
+            else:
+                self.state["boot_attempts"] = attempts
+                self.save()
+
+        slot = self.active_slot()
+        if slot:
+            path = self.backend.slot_path(slot)
+            if path not in sys.path:
+                sys.path.insert(0, path)
+            print(f"OTA: running slot {slot} (v{self.state.get('version')})")
+        return slot
+
+    def mark_healthy(self):
+        """Confirm the running slot so it is kept on the next boot"""
+        if not self.state.get("pending"):
+            return False
+        self.state["pending"] = False
+        self.state["boot_attempts"] = 0
+        self.save()
+        print(f"OTA: slot {self.active_slot()} confirmed")
+        return True
+
+    def arm_watchdog(self):
+        """Start the hardware watchdog so a hung slot is reset before it is confirmed"""
+        try:
+            from machine import WDT
+        except ImportError:
+            return
+        self.watchdog = WDT(timeout=WATCHDOG_MS)
+        print(f"OTA: watchdog armed ({WATCHDOG_MS} ms) until the slot is confirmed")
+
+    def feed(self):
+        if self.watchdog is not None:
+            self.watchdog.feed()
+
+    async def confirm_after(self, delay, check=None):
+        """
+        Mark the running slot healthy once it has run for delay seconds
+
+        A pending slot runs under the hardware watchdog, armed here once
+        the event loop is up (slow imports or WiFi before that can't trip
+        it). A pending slot that fails check is rolled back and the board
+        restarted. The watchdog can't be stopped once armed, so feeding
+        carries on after confirmation.
+        """
+        if self.state.get("pending"):
+            self.arm_watchdog()
+        waited = 0
+        while waited < delay:
+            self.feed()
+            step = min(FEED_INTERVAL, delay - waited)
+            await asyncio.sleep(step)
+            waited += step
+        if self.state.get("pending"):
+            if check is None or check():
+                self.mark_healthy()
+            else:
+                self.rollback("health check failed")
+                self.reset()
+                return
+        while self.watchdog is not None:
+            self.feed()
+            await asyncio.sleep(FEED_INTERVAL)
+
+    def rollback(self, reason):
+        """Switch back to the previous slot (the built-in firmware if there is none)"""
+        failed = self.active_slot()
+        print(f"OTA: rolling back slot {failed}: {reason}")
+        self.state = {
+            "active": self.state.get("previous"),
+            "version": self.state.get("previous_version"),
+            "previous": None,
+            "pending": False,
+            "rolled_back": failed,
+            "reason": reason,
+        }
+        self.save()
+
+    def boot_failed(self, error):
+        """Roll back and restart if an unconfirmed slot crashes at startup"""
+        if not self.state.get("pending"):
+            return
+        self.rollback(f"startup failed: {error}")
+        self.reset()
+
+    def reset(self):
+        try:
+            import machine
+        except ImportError:
+            print("OTA: restart required")
+            return
+        machine.reset()
+
+    async def reboot(self, delay=1):
+        """Restart after delay seconds so a pending response can be sent first"""
+        await asyncio.sleep(delay)
+        self.reset()
+
+    async def receive(self, reader, expected_sha256=None):
+        """
+        Stream a bundle archive into the inactive slot and activate it
+
+        Args:
+            reader: Object with an async read(size) returning b"" at the end
+            expected_sha256: Optional hex digest of the whole archive
+
+        Returns:
+            The new slot state
+        """
+        if self.busy:
+            raise OTAError("Update already in progress")
+        self.busy = True
+        self.last_error = None
+        slot = self.inactive_slot()
+        try:
+            if self.state.get("previous") == slot:
+                # About to be overwritten, so it can no longer be rolled back to
+                self.state["previous"] = None
+                self.state["previous_version"] = None
+                self.save()
+            self.backend.clear_slot(slot)
+            manifest = await self.unpack(reader, slot, expected_sha256)
+            self.activate(slot, manifest)
+            return self.status()
+        except Exception as e:
+            self.last_error = str(e)
+            try:
+                self.backend.clear_slot(slot)
+            except OSError:
+                pass
+            raise
+        finally:
+            self.busy = False
+
+    async def unpack(self, reader, slot, expected_sha256=None):
+        """Write every archive entry to the slot, verifying each against the manifest"""
+        total = hashlib.sha256()
+        header = await read_exact(reader, len(OTA_MAGIC))
+        total.update(header)
+        if header != OTA_MAGIC:
+            raise OTAError("Not an OTA bundle")
+
+        manifest = None
+        manifest_data = None
+        received = set()
+        while True:
+            header = await read_exact(reader, OTA_ENTRY_SIZE)
+            total.update(header)
+            name_len, size = struct.unpack(OTA_ENTRY, header)
+            if not name_len:
+                break
+            raw_name = await read_exact(reader, name_len)
+            total.update(raw_name)
+            name = raw_name.decode()
+            if "/" in name or name.startswith(".") or name == STATE_FILE:
+                raise OTAError(f"Invalid file name {name}")
+
+            if manifest is None:
+                if name != MANIFEST_NAME or size > MAX_MANIFEST_SIZE:
+                    raise OTAError("Bundle must start with its manifest")
+                manifest_data = await read_exact(reader, size)
+                total.update(manifest_data)
+                manifest = self.check_manifest(manifest_data)
+                continue
+
+            info = manifest["files"].get(name)
+            if info is None:
+                raise OTAError(f"{name} is not in the manifest")
+            if size != info.get("size"):
+                raise OTAError(f"{name}: size {size} does not match the manifest")
+            digest = await self.write_entry(reader, slot, name, size, total)
+            if digest != info.get("sha256"):
+                raise OTAError(f"{name}: SHA-256 mismatch")
+            received.add(name)
+
+        if manifest is None:
+            raise OTAError("Bundle has no manifest")
+        missing = [name for name in manifest["files"] if name not in received]
+        if missing:
+            raise OTAError(f"Missing files: {', '.join(missing)}")
+        if expected_sha256 and hex_digest(total) != expected_sha256.lower():
+            raise OTAError("Bundle SHA-256 mismatch")
+
+        # Written last: a slot with a manifest is complete
+        with self.backend.open(slot, MANIFEST_NAME, "wb") as f:
+            f.write(manifest_data)
+        return manifest
+
+    async def write_entry(self, reader, slot, name, size, total):
+        """Copy one file to the slot in chunks, returns its hex SHA-256"""
+        digest = hashlib.sha256()
+        remaining = size
+        with self.backend.open(slot, name, "wb") as f:
+            while remaining:
+                chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OTAError("Upload ended early")
+                f.write(chunk)
+                digest.update(chunk)
+                total.update(chunk)
+                remaining -= len(chunk)
+        return hex_digest(digest)
+
+    def check_manifest(self, data):
+        try:
+            manifest = json.loads(data)
+        except ValueError:
+            raise OTAError("Invalid manifest")
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+            raise OTAError("Invalid manifest")
+        if self.model and manifest.get("model") != self.model:
+            raise OTAError(f"Bundle is for {manifest.get('model')}, not {self.model}")
+        return manifest
+
+    def activate(self, slot, manifest):
+        """Make slot the one to boot next, keeping the current slot for rollback"""
+        self.state = {
+            "active": slot,
+            "version": manifest.get("version"),
+            "previous": self.active_slot(),
+            "previous_version": self.state.get("version"),
+            "pending": True,
+            "boot_attempts": 0,
+        }
+        self.save()
+        print(f"OTA: slot {slot} (v{manifest.get('version')}) installed, active after restart")
@@ -0,0 +1,325 @@
+"""
+Job Scheduler for iRackPilot Pico W
+Runs recurring and deferred IPMI tasks from a single timer heap
+"""
+
+import os
+import json
+import time
+import heapq
+import random
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+SCHEDULE_FILE = "schedule.json"
+
+# The RTC starts in 2021 until NTP sets it; any earlier time means it isn't set
+CLOCK_SET_AFTER = 1704067200  # 2024-01-01
+# Wall-clock moves beyond this (seconds) are clock changes, not elapsed time
+CLOCK_JUMP = 5
+
+
+def clock_is_set():
+    return time.time() >= CLOCK_SET_AFTER
+
+
+def number(data, key, default):
+    """data[key] as an int or float (numeric strings accepted), default when absent"""
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"{key} must be a number of seconds")
+
+
+class Job:
+    """A scheduled IPMI command or script"""
+
+    def __init__(self, job_id, action, interval=0, at=None, jitter=0, name=None, enabled=True):
+        self.id = job_id
+        self.name = name or f"job-{job_id}"
+        self.action = action
+        self.interval = interval
+        self.at = at
+        self.jitter = jitter
+        self.enabled = enabled
+        self.due = None
+        self.generation = 0
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_result = None
+
+    def action_key(self):
+        """Key used to coalesce identical actions due at the same tick"""
+        return json.dumps(self.action)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "action": self.action,
+            "interval": self.interval,
+            "at": self.at,
+            "jitter": self.jitter,
+            "enabled": self.enabled,
+        }
+
+    def status(self):
+        info = self.to_dict()
+        info.update({
+            "next_run": self.due,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+        })
+        return info
+
+    @classmethod
+    def from_dict(cls, job_id, data):
+        action = data.get("action")
+        if not isinstance(action, dict) or action.get("type") not in ("command", "script"):
+            raise ValueError("action must be a command or script")
+        interval = number(data, "interval", 0)
+        at = number(data, "at", None)
+        jitter = number(data, "jitter", 0)
+        if not interval and at is None:
+            raise ValueError("interval or at required")
+        if interval < 0 or jitter < 0 or (at is not None and at < 0):
+            raise ValueError("interval, at and jitter must not be negative")
+        return cls(job_id, action, interval, at, jitter,
+                   data.get("name"), data.get("enabled", True))
+
+
+class Scheduler:
+    """Timer-heap scheduler: one wakeup per tick regardless of job count"""
+
+    def __init__(self, ipmi_client, script_engine, path=SCHEDULE_FILE):
+        self.ipmi_client = ipmi_client
+        self.script_engine = script_engine
+        self.path = path
+        self.jobs = {}
+        self.heap = []
+        self.next_id = 1
+        self.tick = 1
+        self.max_sleep = 60
+        self.max_result_len = 200
+        self.wakeup = asyncio.Event()
+        self.clock = None  # (time.time(), ticks_ms()) at the last loop pass
+
+    def load(self):
+        """Load persisted jobs from flash"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.next_id = data.get("next_id", 1)
+        now = time.time()
+        for item in data.get("jobs", []):
+            try:
+                job = Job.from_dict(item["id"], item)
+            except (KeyError, ValueError, TypeError) as e:
+                print(f"Skipping invalid scheduled job: {e}")
+                continue
+            self.jobs[job.id] = job
+            self.schedule(job, now)
+        print(f"Loaded {len(self.jobs)} scheduled jobs")
+
+    def save(self):
+        """Persist job definitions to flash (atomic rename)"""
+        data = {
+            "next_id": self.next_id,
+            "jobs": [job.to_dict() for job in self.jobs.values()],
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.rename(tmp, self.path)
+
+    def schedule(self, job, now):
+        """Compute a job's next due time and push it on the heap"""
+        job.generation += 1
+        if not job.enabled:
+            job.due = None
+            return
+        if job.at is not None and job.runs == 0:
+            due = max(job.at, now)
+        elif job.interval:
+            due = now + job.interval
+        else:
+            job.due = None
+            return
+        if job.jitter:
+            due += random.random() * job.jitter
+        job.due = due
+        # Stale entries are skipped by generation instead of being removed
+        heapq.heappush(self.heap, (due, job.id, job.generation))
+        self.wakeup.set()
+
+    def list_jobs(self):
+        return [job.status() for job in self.jobs.values()]
+
+    def get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        return job.status() if job else None
+
+    def check_clock(self, data):
+        """Absolute start times need wall-clock time (set by NTP once WiFi is up)"""
+        if data.get("at") is not None and not clock_is_set():
+            raise ValueError("Clock not set yet (no NTP sync): 'at' can't be used")
+
+    def add_job(self, data):
+        job = Job.from_dict(self.next_id, data)
+        self.check_clock(data)
+        # Only a job that scheduled cleanly is kept (and saved)
+        self.schedule(job, time.time())
+        self.next_id += 1
+        self.jobs[job.id] = job
+        self.save()
+        return job.status()
+
+    def update_job(self, job_id, data):
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        merged = job.to_dict()
+        merged.update(data)
+        updated = Job.from_dict(job_id, merged)
+        self.check_clock(data)
+        updated.generation = job.generation
+        self.schedule(updated, time.time())
+        self.jobs[job_id] = updated
+        self.save()
+        return updated.status()
+
+    def delete_job(self, job_id):
+        job = self.jobs.pop(job_id, None)
+        if not job:
+            return False
+        job.generation += 1
+        self.save()
+        return True
+
+    def follow_clock(self, now):
+        """
+        Move relative due times along when the wall clock is set or jumps
+
+        Jobs due at an absolute 'at' stay put; interval jobs keep their
+        distance from now, so an NTP sync at boot doesn't make them all due.
+        """
+        ticks = ticks_ms()
+        last = self.clock
+        self.clock = (now, ticks)
+        if last is None:
+            return
+        jump = now - last[0] - ticks_diff(ticks, last[1]) / 1000
+        if abs(jump) < CLOCK_JUMP:
+            return
+        print(f"Clock moved by {jump:.0f}s, rescheduling interval jobs")
+        heap = []
+        for due, job_id, generation in self.heap:
+            job = self.jobs.get(job_id)
+            if job and job.generation == generation and (job.at is None or job.runs):
+                due += jump
+                job.due = due
+            heap.append((due, job_id, generation))
+        heapq.heapify(heap)
+        self.heap = heap
+
+    def pop_due(self, now):
+        """Pop every live job due at or before now"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, job_id, generation = heapq.heappop(self.heap)
+            job = self.jobs.get(job_id)
+            if job and job.generation == generation:
+                due.append(job)
+        return due
+
+    async def run(self):
+        """Main scheduler loop"""
+        print("Scheduler started")
+        while True:
+            now = time.time()
+            self.follow_clock(now)
+            due = self.pop_due(now)
+            if due:
+                asyncio.create_task(self.run_batch(due, now))
+
+            delay = self.max_sleep
+            if self.heap:
+                delay = min(delay, max(self.tick, self.heap[0][0] - now))
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_batch(self, jobs, now):
+        """Run a tick's due jobs, executing identical actions only once"""
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job.action_key(), []).append(job)
+
+        finished = False
+        for group in groups.values():
+            try:
+                result = await self.run_action(group[0].action)
+                ok = True
+            except Exception as e:
+                result = str(e)
+                ok = False
+            result = str(result)[:self.max_result_len]
+
+            for job in group:
+                job.runs += 1
+                job.last_run = now
+                job.last_result = result
+                if not ok:
+                    job.failures += 1
+                if self.jobs.get(job.id) is not job:
+                    # Updated or deleted while running
+                    continue
+                if job.interval:
+                    self.schedule(job, time.time())
+                else:
+                    # One-shot job is done
+                    del self.jobs[job.id]
+                    finished = True
+
+        if finished:
+            self.save()
+
+    async def run_action(self, action):
+        """Execute a job action"""
+        if action["type"] == "command":
+            if not self.ipmi_client or not self.ipmi_client.is_connected():
+                raise Exception("Not connected to IPMI server")
+            return await self.ipmi_client.execute_command(action.get("command", ""))
+        return await self.script_engine.execute(action.get("language", "Python"),
+                                                action.get("content", ""))
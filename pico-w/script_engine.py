@@ -3,12 +3,446 @@ Script Execution Engine for iRackPilot Pico W
 Handles execution of JavaScript, Python, and other scripts
 """
 
+import gc
 import json
 import time
+import hashlib
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    import ast
+except ImportError:
+    # MicroPython has no ast module; scripts are wrapped by wrap_source instead
+    ast = None
+
+from fleet import Fleet
+from board import board
+
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError:
+    # CPython fallback so the engine can run against a simulated BMC
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+# Filename used for compiled scripts (shown in script tracebacks)
+SCRIPT_FILENAME = "<script>"
+
+# Scripts run as the body of this coroutine so they can await the IPMI API
+SCRIPT_HEADER = "async def __script__():\n"
+
+# First statement of every loop body: the budget is enforced without a
+# trace hook, and coroutine loops yield to the event loop
+AWAIT_CHECKPOINT = "await __checkpoint__()"
+# Loops in plain functions can't await; they only check the budget. Function
+# bodies start with it too, so unbounded recursion is caught as well
+CHECKPOINT_CALL = "__check__()"
+# Comprehensions iterate through this budget-checking generator
+CHECKED_ITER = "__each__"
+
+# Budget kept back from fleet.map() so the script can still use its results
+FLEET_RESERVE_MS = 250
+
+# Builtins available to sandboxed scripts
+SAFE_BUILTINS = {
+    'abs': abs, 'all': all, 'any': any, 'bool': bool, 'bytes': bytes,
+    'chr': chr, 'dict': dict, 'divmod': divmod, 'enumerate': enumerate,
+    'filter': filter, 'float': float, 'hex': hex, 'int': int,
+    'isinstance': isinstance, 'len': len, 'list': list, 'map': map,
+    'max': max, 'min': min, 'ord': ord, 'range': range, 'repr': repr,
+    'reversed': reversed, 'round': round, 'set': set, 'sorted': sorted,
+    'str': str, 'sum': sum, 'tuple': tuple, 'zip': zip,
+    'True': True, 'False': False, 'None': None,
+    'Exception': Exception, 'ValueError': ValueError,
+    'KeyError': KeyError, 'IndexError': IndexError,
+    'TypeError': TypeError, 'RuntimeError': RuntimeError,
+}
+
+# Builtins shadowed with None (MicroPython ignores __builtins__ in globals)
+BLOCKED_BUILTINS = (
+    'open', 'exec', 'eval', 'compile', 'globals', 'locals', 'getattr',
+    'setattr', 'delattr', 'vars', 'dir', 'input', 'help', 'exit',
+    '__import__',
+)
+
+# Attributes that lead to frames, globals or private state (coroutine, generator,
+# frame and traceback internals), and str.format, which can walk attributes by name
+BLOCKED_ATTR_PREFIXES = ('_', 'cr_', 'gi_', 'ag_', 'f_', 'tb_')
+BLOCKED_ATTRS = ('format', 'format_map')
+
+# ScriptIPMI operations fleet.map() accepts by name
+IPMI_OPERATIONS = (
+    'connected', 'power_status', 'power_on', 'power_off', 'power_cycle', 'power_reset',
+    'soft_shutdown', 'device_id', 'guid', 'sensor', 'fru', 'raw', 'command',
+)
+
+
+def wrap_tree(content):
+    """Parse a script, add loop checkpoints and move it into the __script__ coroutine"""
+    tree = ast.parse(content, SCRIPT_FILENAME)
+    add_checkpoints(tree, True)
+    wrapper = ast.parse(SCRIPT_HEADER + "    pass").body[0]
+    if tree.body:
+        wrapper.body = tree.body
+    tree.body = [wrapper]
+    return ast.fix_missing_locations(tree)
+
+
+def add_checkpoints(node, in_async):
+    """
+    Add budget checks under node: every loop and function body starts with
+    a checkpoint (awaited inside coroutines), comprehensions iterate
+    through CHECKED_ITER and lambdas check before evaluating their body
+    """
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, ast.AsyncFunctionDef):
+            add_checkpoints(child, True)
+        elif isinstance(child, (ast.FunctionDef, ast.ClassDef, ast.Lambda)):
+            add_checkpoints(child, False)
+        else:
+            add_checkpoints(child, in_async)
+        if isinstance(child, (ast.For, ast.AsyncFor, ast.While)):
+            check = ast.parse(AWAIT_CHECKPOINT if in_async else CHECKPOINT_CALL).body[0]
+            child.body.insert(0, ast.copy_location(check, child.body[0]))
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            check = ast.parse(CHECKPOINT_CALL).body[0]
+            child.body.insert(0, ast.copy_location(check, child.body[0]))
+        elif isinstance(child, ast.comprehension) and not child.is_async:
+            each = ast.Call(ast.Name(CHECKED_ITER, ast.Load()), [child.iter], [])
+            child.iter = ast.copy_location(each, child.iter)
+        elif isinstance(child, ast.Lambda):
+            # (__check__(), body)[1]
+            check = ast.parse(CHECKPOINT_CALL, mode='eval').body
+            pair = ast.Tuple([check, child.body], ast.Load())
+            body = ast.Subscript(pair, ast.Constant(1), ast.Load())
+            child.body = ast.copy_location(body, child.body)
+
+
+def wrap_source(content):
+    """
+    Source of the __script__ coroutine around a script (without ast)
+
+    Every line is indented one level except lines that continue a string
+    literal, whose text would otherwise change. Loop bodies get the same
+    checkpoints as wrap_tree adds, and so do function bodies: after the
+    header's colon for a body on the same line, else as a new first line
+    of the block. Comprehensions and lambdas are left unchecked.
+    """
+    lines = []
+    quote = None
+    depth = 0
+    continued = False
+    scopes = []     # (indent, is_async) of the enclosing def and class blocks
+    header = None   # checkpoint for the loop header being read
+    pending = None  # checkpoint to put before the next statement (a loop body)
+    for line in content.replace('\r', '').split('\n'):
+        if quote:
+            lines.append(line)
+        else:
+            stripped = line.lstrip()
+            if not (depth or continued) and stripped and stripped[0] != '#':
+                # A new statement
+                indent = len(line) - len(stripped)
+                while scopes and indent <= scopes[-1][0]:
+                    scopes.pop()
+                if pending:
+                    lines.append('    ' + line[:indent] + pending)
+                    pending = None
+                keyword = statement_keyword(stripped)
+                if keyword in ('for', 'while', 'async for'):
+                    in_async = scopes[-1][1] if scopes else True
+                    header = AWAIT_CHECKPOINT if in_async else CHECKPOINT_CALL
+                elif keyword in ('def', 'class', 'async def'):
+                    scopes.append((indent, keyword == 'async def'))
+                    if keyword != 'class':
+                        header = CHECKPOINT_CALL
+            lines.append('    ' + line)
+        quote, depth, continued, colon = scan_line(line, quote, depth, header is not None)
+        if colon is not None:
+            if line[colon + 1:].strip()[:1] in ('', '#'):
+                pending = header
+            else:
+                at = len(lines[-1]) - len(line) + colon + 1
+                lines[-1] = lines[-1][:at] + ' ' + header + ';' + lines[-1][at:]
+            header = None
+    # Keeps an empty script valid
+    lines.append("    pass")
+    return SCRIPT_HEADER + '\n'.join(lines)
+
+
+def statement_keyword(stripped):
+    """Leading keyword of a statement, with "async" kept ("async for")"""
+    words = stripped.replace('(', ' ').replace(':', ' ').split()
+    if words[0] == 'async' and len(words) > 1:
+        return 'async ' + words[1]
+    return words[0]
+
+
+def scan_line(line, quote=None, depth=0, want_colon=False):
+    """
+    Lexical state after one line, given the state at its start
+
+    Returns (string delimiter still open, bracket depth, backslash
+    continuation, index of the first top-level ":" when want_colon).
+    """
+    colon = None
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quote:
+            if char == '\\':
+                i += 2
+            elif line.startswith(quote, i):
+                i += len(quote)
+                quote = None
+            else:
+                i += 1
+        elif char == '#':
+            return None, depth, False, colon
+        elif char in '"\'':
+            quote = char * 3 if line.startswith(char * 3, i) else char
+            i += len(quote)
+        else:
+            if char in '([{':
+                depth += 1
+            elif char in ')]}':
+                depth = max(0, depth - 1)
+            elif (char == ':' and want_colon and not depth and colon is None
+                    and not line.startswith(':=', i)):
+                colon = i
+            i += 1
+    if quote and len(quote) == 1 and not line.endswith('\\'):
+        # Unterminated: left for the compiler to report
+        quote = None
+    return quote, depth, not quote and line.endswith('\\'), colon
+
+
+def attribute_names(content):
+    """
+    Names following a "." anywhere in the source, strings included
+
+    Scanning the raw text rather than parsed code also catches names in
+    format strings; an odd string literal may be rejected needlessly.
+    """
+    names = []
+    i = content.find('.')
+    while i != -1:
+        j = i + 1
+        while j < len(content) and content[j] in ' \t\r\n\\#':
+            if content[j] == '#':
+                # A comment may sit between "." and the name inside brackets
+                while j < len(content) and content[j] != '\n':
+                    j += 1
+            else:
+                j += 1
+        start = j
+        while j < len(content) and (content[j].isalpha() or content[j].isdigit()
+                                    or content[j] == '_'):
+            j += 1
+        if j > start and not content[start].isdigit():
+            names.append(content[start:j])
+        i = content.find('.', i + 1)
+    return names
+
+
+class ScriptBudgetError(Exception):
+    """Raised when a script exceeds its time or heap budget"""
+    pass
+
+
+class ScriptBudget:
+    """Wall-clock and heap budget for a single script run"""
+
+    def __init__(self, time_ms, heap_bytes, yield_ms):
+        self.time_ms = time_ms
+        self.heap_bytes = heap_bytes
+        self.yield_ms = yield_ms
+        self.start = ticks_ms()
+        self.last_yield = self.start
+        self.heap_start = gc.mem_alloc() if hasattr(gc, 'mem_alloc') else None
+
+    def check(self):
+        """Raise ScriptBudgetError if the budget is exhausted"""
+        if ticks_diff(ticks_ms(), self.start) > self.time_ms:
+            raise ScriptBudgetError(f"time budget of {self.time_ms}ms exceeded")
+        if self.heap_start is not None:
+            used = gc.mem_alloc() - self.heap_start
+            if used > self.heap_bytes:
+                # Give the collector a chance before failing the script
+                gc.collect()
+                used = gc.mem_alloc() - self.heap_start
+                if used > self.heap_bytes:
+                    raise ScriptBudgetError(f"heap budget of {self.heap_bytes} bytes exceeded")
+
+    def deadline(self):
+        """ticks_ms at which the time budget runs out"""
+        return ticks_add(self.start, self.time_ms)
+
+    async def checkpoint(self):
+        """Check the budget and yield to the event loop if due"""
+        self.check()
+        now = ticks_ms()
+        if ticks_diff(now, self.last_yield) >= self.yield_ms:
+            self.last_yield = now
+            await asyncio.sleep(0)
+
+
+class ScriptJSON:
+    """json exposed to scripts: dumps and loads only, not the module itself"""
+
+    def dumps(self, value):
+        return json.dumps(value)
+
+    def loads(self, text):
+        return json.loads(text)
+
+
+class ScriptIPMI:
+    """
+    Async IPMI API exposed to scripts as `ipmi`
+
+    The client is only held in closures, so scripts can't reach it (or
+    the BMC credentials) through attributes.
+    """
+
+    def __init__(self, ipmi_client, budget):
+        def connected():
+            """Check whether the BMC session is up"""
+            return bool(ipmi_client and ipmi_client.is_connected())
+
+        async def ready():
+            await budget.checkpoint()
+            if not connected():
+                raise Exception("Not connected to IPMI server")
+
+        async def power_status():
+            """Return "on", "off" or None"""
+            await ready()
+            return await ipmi_client.get_power_state()
+
+        async def chassis_control(action):
+            await ready()
+            return await ipmi_client.chassis_control(action)
+
+        async def power_on():
+            return await chassis_control(0x01)
+
+        async def power_off():
+            return await chassis_control(0x00)
+
+        async def power_cycle():
+            return await chassis_control(0x02)
+
+        async def power_reset():
+            return await chassis_control(0x03)
+
+        async def soft_shutdown():
+            return await chassis_control(0x05)
+
+        async def device_id():
+            await ready()
+            return await ipmi_client.get_device_info()
+
+        async def guid():
+            await ready()
+            return await ipmi_client.get_system_guid()
+
+        async def sensor(number):
+            await ready()
+            return await ipmi_client.get_sensor_reading(number)
+
+        async def fru(refresh=False):
+            """FRU inventory (chassis, board, product), cached by GUID after the first read"""
+            await ready()
+            return await ipmi_client.get_fru(refresh)
+
+        async def raw(netfn, cmd, data=b''):
+            """Send a raw request, returns (completion_code, data) or None"""
+            await ready()
+            parsed = await ipmi_client.request(netfn, cmd, bytes(data))
+            if parsed:
+                # Copied: the response buffer is reused by the next request
+                return parsed.completion_code, bytes(parsed.data)
+            return None
+
+        async def command(text):
+            """Run an ipmitool-style command string"""
+            await ready()
+            return await ipmi_client.execute_command(text)
+
+        self.connected = connected
+        self.power_status = power_status
+        self.power_on = power_on
+        self.power_off = power_off
+        self.power_cycle = power_cycle
+        self.power_reset = power_reset
+        self.soft_shutdown = soft_shutdown
+        self.device_id = device_id
+        self.guid = guid
+        self.sensor = sensor
+        self.fru = fru
+        self.raw = raw
+        self.command = command
+
+
+class ScriptFleet:
+    """Fleet API exposed to scripts as `fleet` (state held in closures, as in ScriptIPMI)"""
+
+    def __init__(self, fleet, ipmi_client, budget):
+        async def map_hosts(hosts, operation, args=(), concurrency=None, timeout=None,
+                            **defaults):
+            """
+            Run an operation on every host concurrently
+
+            operation is either a ScriptIPMI method name ("power_status") or
+            an async callable receiving a per-host `ipmi` object. Hosts are
+            cut off when the script's time budget runs out.
+            """
+            await budget.checkpoint()
+
+            # Hosts without credentials reuse those of the current session
+            if ipmi_client:
+                defaults.setdefault('username', ipmi_client.username)
+                defaults.setdefault('password', ipmi_client.password)
+                defaults.setdefault('vendor', ipmi_client.vendor or "Generic")
+
+            if isinstance(operation, str):
+                if operation not in IPMI_OPERATIONS:
+                    raise ValueError(f"Unknown fleet operation: {operation}")
+                name = operation
+                operation = lambda bmc: getattr(bmc, name)(*args)
+
+            async def run(client):
+                return await operation(ScriptIPMI(client, budget))
+
+            return await fleet.map(hosts, run, concurrency, timeout,
+                                   deadline=ticks_add(budget.deadline(), -FLEET_RESERVE_MS),
+                                   **defaults)
+
+        self.map = map_hosts
+
 
 class ScriptEngine:
-    def __init__(self):
+    def __init__(self, ipmi_client=None):
         self.running_scripts = {}
+        self.ipmi_client = ipmi_client
+        self.fleet = Fleet()
+        self.code_cache = {}
+        self.code_cache_size = board.code_cache
+        self.time_budget_ms = 5000
+        self.heap_budget = board.script_heap
+        self.yield_ms = 20
+        self.next_script_id = 1
         
     async def execute(self, language, content):
         """Execute a script in the specified language"""
@@ -40,30 +474,104 @@ class ScriptEngine:
             raise Exception(f"JavaScript execution error: {str(e)}")
     
     async def execute_python(self, content):
-        """Execute Python code"""
+        """Execute Python code in a restricted, budgeted namespace"""
         try:
-            # Create a safe execution environment
-            # WARNING: This is a simplified implementation
-            # In production, use proper sandboxing
+            code = self.compile_python(content)
+            
+            output = []
+            budget = ScriptBudget(self.time_budget_ms, self.heap_budget, self.yield_ms)
+            namespace = self.build_namespace(output, budget)
             
-            # For security, only allow safe operations
-            allowed_builtins = {
-                'print': print,
-                'len': len,
-                'str': str,
-                'int': int,
-                'float': float,
-                'time': time,
-            }
+            # Defines the script coroutine function in the namespace
+            exec(code, namespace)
             
-            # Execute in restricted environment
-            # Note: This is a placeholder - full implementation needs proper sandboxing
-            result = "Python execution completed"
+            script_id = self.next_script_id
+            self.next_script_id += 1
+            self.running_scripts[script_id] = budget
+            try:
+                result = await asyncio.wait_for(
+                    namespace['__script__'](), self.time_budget_ms / 1000)
+            except asyncio.TimeoutError:
+                raise ScriptBudgetError(f"time budget of {self.time_budget_ms}ms exceeded")
+            finally:
+                del self.running_scripts[script_id]
             
-            return result
+            text = ''.join(output)
+            if result is not None:
+                if text and not text.endswith('\n'):
+                    text += '\n'
+                text += str(result)
+            if text.endswith('\n'):
+                text = text[:-1]
+            return text if output or result is not None else "Python execution completed"
         except Exception as e:
             raise Exception(f"Python execution error: {str(e)}")
     
+    def compile_python(self, content):
+        """Compile a script, reusing cached code objects by source hash"""
+        key = hashlib.sha256(content.encode()).digest()
+        code = self.code_cache.get(key)
+        if code is not None:
+            return code
+        
+        self.check_source(content)
+        
+        # Wrap the script in a coroutine so it can await the IPMI API
+        if ast:
+            code = compile(wrap_tree(content), SCRIPT_FILENAME, 'exec')
+        else:
+            code = compile(wrap_source(content), SCRIPT_FILENAME, 'exec')
+        
+        if len(self.code_cache) >= self.code_cache_size:
+            del self.code_cache[next(iter(self.code_cache))]
+        self.code_cache[key] = code
+        return code
+    
+    def check_source(self, content):
+        """Reject constructs that would escape the sandbox"""
+        if '__' in content:
+            raise ValueError("Dunder names are not allowed in scripts")
+        for line in content.split('\n'):
+            words = line.split()
+            if words and words[0] in ('import', 'from'):
+                raise ValueError("Imports are not allowed in scripts")
+        for name in attribute_names(content):
+            if name in BLOCKED_ATTRS or any(name.startswith(p) for p in BLOCKED_ATTR_PREFIXES):
+                raise ValueError(f"Attribute '{name}' is not allowed in scripts")
+    
+    def build_namespace(self, output, budget):
+        """Build the restricted globals for a script run"""
+        def script_print(*args, sep=' ', end='\n'):
+            output.append(sep.join(str(arg) for arg in args) + end)
+        
+        def each(iterable):
+            for item in iterable:
+                budget.check()
+                yield item
+        
+        async def sleep(seconds):
+            budget.check()
+            await asyncio.sleep(seconds)
+            budget.last_yield = ticks_ms()
+        
+        builtins = dict(SAFE_BUILTINS)
+        builtins['print'] = script_print
+        
+        namespace = dict(builtins)
+        for name in BLOCKED_BUILTINS:
+            namespace[name] = None
+        namespace['__builtins__'] = builtins
+        namespace['ipmi'] = ScriptIPMI(self.ipmi_client, budget)
+        namespace['fleet'] = ScriptFleet(self.fleet, self.ipmi_client, budget)
+        namespace['sleep'] = sleep
+        namespace['checkpoint'] = budget.checkpoint
+        namespace['__checkpoint__'] = budget.checkpoint
+        namespace['__check__'] = budget.check
+        namespace[CHECKED_ITER] = each
+        namespace['ticks_ms'] = ticks_ms
+        namespace['json'] = ScriptJSON()
+        return namespace
+    
     async def execute_cpp(self, content):
         """Execute C++ code"""
         # C++ requires compilation, which is complex on Pico
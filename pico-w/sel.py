@@ -0,0 +1,254 @@
+"""
+SEL Reader for iRackPilot Pico W
+Fetches only new System Event Log entries and keeps them in a compact log on flash
+"""
+
+import json
+import os
+
+from board import board
+from ipmi_protocol import SEL_FIRST, SEL_LAST, SEL_RECORD_SIZE, decode_sel_record
+
+SEL_DIR = "sel"
+# Records fetched from the BMC per sync; a long backlog continues on the next sync
+SYNC_BATCH = 64
+MAX_PAGE = 100
+COPY_CHUNK = 512
+# Records read from flash at a time while a page is streamed
+READ_GROUP = 8
+
+
+class SELLog:
+    """
+    Incremental SEL reader with one on-flash log per BMC
+
+    The log file holds raw 16-byte SEL records in arrival order. Entry IDs
+    are local and only grow (BMC record IDs restart when the SEL is
+    cleared), so entry N is at offset (N - first_id) * 16 and the index
+    in memory is just first_id and count.
+    """
+
+    def __init__(self, ipmi_client, directory=SEL_DIR, max_entries=board.sel_entries):
+        self.ipmi_client = ipmi_client
+        self.directory = directory
+        self.max_entries = max_entries
+        self.session = None  # (host, port, session ID) the open log belongs to
+        self.key = None
+        self.first_id = 1
+        self.count = 0
+        self.last_record = None  # BMC record ID of the newest stored entry
+        self.last_add = None     # BMC timestamps seen at the last complete sync
+        self.last_erase = None
+        self.bmc = {}
+
+    def path(self, suffix):
+        return f"{self.directory}/{self.key}.{suffix}"
+
+    def is_open(self):
+        return self.key is not None
+
+    async def open_session(self):
+        """Open the log of the connected BMC, keyed by its system GUID"""
+        client = self.ipmi_client
+        # Session IDs alone can repeat across BMCs connected in the same second
+        session = (client.host, client.port, client.session_id)
+        if self.key is not None and session == self.session:
+            return
+        guid = await client.get_system_guid()
+        self.open(guid or f"{client.host}-{client.port}".replace(".", "_").replace(":", "_"))
+        self.session = session
+
+    def open(self, key):
+        """Load a BMC's log state from flash"""
+        self.key = key
+        try:
+            os.mkdir(self.directory)
+        except OSError:
+            pass
+        try:
+            with open(self.path("json")) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.first_id = state.get("first_id", 1)
+        self.last_add = state.get("last_add")
+        self.last_erase = state.get("last_erase")
+        # The log itself is authoritative if the state lags behind it
+        try:
+            self.count = os.stat(self.path("bin"))[6] // SEL_RECORD_SIZE
+        except OSError:
+            self.count = 0
+        self.last_record = None
+        if self.count:
+            record = self.read_records(self.count - 1, 1)
+            self.last_record = record[0] | record[1] << 8
+
+    async def sync(self):
+        """
+        Fetch SEL entries added since the last sync
+
+        Costs one Get SEL Info when nothing changed. Returns the number of
+        entries added to the log.
+        """
+        await self.open_session()
+        info = await self.ipmi_client.get_sel_info()
+        if info is None:
+            raise OSError("Get SEL Info failed")
+        # info is reused by the client: copy what we need before awaiting
+        last_add = info.last_add
+        last_erase = info.last_erase
+        empty = info.entries == 0
+        self.bmc = info.to_dict()
+
+        if self.last_erase is not None and last_erase != self.last_erase:
+            # The BMC's SEL was cleared: keep our copy, read the new log from its start
+            self.last_record = None
+        elif last_add == self.last_add:
+            return 0
+        if empty:
+            self.last_add = last_add
+            self.last_erase = last_erase
+            self.save_state()
+            return 0
+
+        record_id = SEL_FIRST
+        seen = None
+        if self.last_record is not None:
+            # The stored entry's next-record pointer now leads to the new ones
+            entry = await self.ipmi_client.get_sel_entry(self.last_record)
+            stored = self.read_records(self.count - 1, 1)
+            if entry is None or bytes(entry[1][2:]) != stored[2:]:
+                # The BMC dropped it or reused its ID (overwrite when full,
+                # partial delete): rescan from the first record, skipping
+                # those already stored
+                seen = self.newest_records()
+            else:
+                record_id = entry[0]
+
+        new = bytearray()
+        while record_id != SEL_LAST and len(new) < SYNC_BATCH * SEL_RECORD_SIZE:
+            entry = await self.ipmi_client.get_sel_entry(record_id)
+            if entry is None:
+                break
+            record_id, record = entry
+            if seen is not None and not is_newer(record, seen):
+                continue
+            seen = None
+            new += record
+        if new:
+            self.append(new)
+        if record_id == SEL_LAST:
+            self.last_add = last_add
+        self.last_erase = last_erase
+        self.save_state()
+        return len(new) // SEL_RECORD_SIZE
+
+    def newest_records(self):
+        """Timestamp of the newest stored record and the stored records sharing it"""
+        count = min(self.count, READ_GROUP)
+        data = self.read_records(self.count - count, count)
+        newest = timestamp(data[-SEL_RECORD_SIZE:])
+        bodies = set()
+        for i in range(count):
+            record = data[i * SEL_RECORD_SIZE:(i + 1) * SEL_RECORD_SIZE]
+            if timestamp(record) == newest:
+                bodies.add(bytes(record[2:]))
+        return newest, bodies
+
+    def append(self, records):
+        with open(self.path("bin"), "ab") as f:
+            f.write(records)
+        self.count += len(records) // SEL_RECORD_SIZE
+        self.last_record = records[-SEL_RECORD_SIZE] | records[-SEL_RECORD_SIZE + 1] << 8
+        if self.count > self.max_entries:
+            self.compact()
+
+    def compact(self):
+        """Drop the oldest entries, keeping three quarters of max_entries"""
+        keep = self.max_entries * 3 // 4
+        drop = self.count - keep
+        tmp = self.path("tmp")
+        with open(self.path("bin"), "rb") as src, open(tmp, "wb") as dst:
+            src.seek(drop * SEL_RECORD_SIZE)
+            while True:
+                chunk = src.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.rename(tmp, self.path("bin"))
+        self.first_id += drop
+        self.count = keep
+        self.save_state()
+
+    def save_state(self):
+        """Persist the log state (atomic rename)"""
+        state = {"first_id": self.first_id, "last_add": self.last_add,
+                 "last_erase": self.last_erase}
+        tmp = self.path("json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp, self.path("json"))
+
+    def read_records(self, position, count):
+        with open(self.path("bin"), "rb") as f:
+            f.seek(position * SEL_RECORD_SIZE)
+            return f.read(count * SEL_RECORD_SIZE)
+
+    def page(self, after=0, limit=50):
+        """
+        Entries with IDs above after, oldest first
+
+        "entries" is a generator that reads and decodes the records as it
+        is consumed, so a page is never held decoded in memory.
+        """
+        limit = max(0, min(limit, MAX_PAGE))
+        position = max(0, after + 1 - self.first_id)
+        count = max(0, min(limit, self.count - position))
+        start_id = self.first_id + position
+        return {
+            "entries": self.iter_entries(start_id, start_id + count),
+            "next": start_id + count - 1 if count else max(after, self.first_id - 1),
+            "more": position + count < self.count,
+            "first_id": self.first_id,
+            "last_id": self.first_id + self.count - 1,
+            "bmc": self.bmc,
+        }
+
+    def iter_entries(self, start_id, end_id):
+        """Decoded entries start_id..end_id - 1 (any compacted away meanwhile are skipped)"""
+        key = self.key
+        entry_id = start_id
+        while entry_id < end_id and key == self.key:
+            # Positions are recomputed per read: a sync may compact the log mid-stream
+            position = max(0, entry_id - self.first_id)
+            entry_id = self.first_id + position
+            count = min(READ_GROUP, end_id - entry_id)
+            if count <= 0:
+                return
+            data = self.read_records(position, count)
+            for i in range(len(data) // SEL_RECORD_SIZE):
+                entry = decode_sel_record(data[i * SEL_RECORD_SIZE:(i + 1) * SEL_RECORD_SIZE])
+                entry["id"] = entry_id + i
+                yield entry
+            entry_id += count
+
+
+def timestamp(record):
+    """SEL record timestamp, None for non-timestamped OEM records"""
+    if record[2] >= 0xE0:
+        return None
+    return record[3] | record[4] << 8 | record[5] << 16 | record[6] << 24
+
+
+def is_newer(record, seen):
+    """
+    Whether a BMC record comes after the stored ones summarised in seen
+
+    Record IDs can be reused after the BMC drops records, so records are
+    compared by timestamp and then by content (everything but the ID).
+    """
+    newest, bodies = seen
+    stamp = timestamp(record)
+    if stamp is not None and newest is not None and stamp != newest:
+        return stamp > newest
+    return bytes(record[2:]) not in bodies
@@ -0,0 +1,194 @@
+"""
+Lazy Subsystems for iRackPilot Pico W
+Imports and builds subsystems on first use and drops idle ones to free heap
+"""
+
+import gc
+import sys
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+
+def mem_alloc():
+    """Allocated heap bytes (0 where the port can't tell)"""
+    return gc.mem_alloc() if hasattr(gc, "mem_alloc") else 0
+
+
+class Provider:
+    """One subsystem: the module to import and how to build it"""
+
+    def __init__(self, name, module, factory, unloadable=False, requires=()):
+        self.name = name
+        self.module = module
+        self.factory = factory
+        self.unloadable = unloadable
+        self.requires = requires
+        self.instance = None
+        self.modules = []
+        self.last_used = 0
+        self.loads = 0
+        self.error = None
+        self.import_ms = None
+        self.import_heap = None
+        self.init_ms = None
+        self.init_heap = None
+
+    def profile(self):
+        return {
+            "loaded": self.instance is not None,
+            "loads": self.loads,
+            "modules": self.modules,
+            "import_ms": self.import_ms,
+            "import_heap": self.import_heap,
+            "init_ms": self.init_ms,
+            "init_heap": self.init_heap,
+            "error": self.error,
+        }
+
+
+class Lazy:
+    """Stands in for a subsystem; the first attribute access builds it"""
+
+    def __init__(self, services, name):
+        self._services = services
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._services.get(self._name), attr)
+
+
+class Services:
+    """Registry of lazily loaded subsystems with a per-module load profile"""
+
+    def __init__(self):
+        self.providers = {}
+
+    def register(self, name, module, factory, unloadable=False, requires=()):
+        """
+        Register a subsystem without importing it
+
+        Args:
+            name: Subsystem name
+            module: Module to import on first use
+            factory: Called with the imported module, returns the instance
+            unloadable: Whether trim() may drop it when idle
+            requires: Subsystems loaded first, so the modules they share
+                are accounted to (and kept alive by) them
+
+        Returns:
+            A Lazy stand-in to hand to code that uses the subsystem
+        """
+        self.providers[name] = Provider(name, module, factory, unloadable, requires)
+        return Lazy(self, name)
+
+    def get(self, name):
+        """The subsystem instance, importing and building it if needed"""
+        provider = self.providers[name]
+        provider.last_used = ticks_ms()
+        if provider.instance is None:
+            self.load(provider)
+        return provider.instance
+
+    def loaded(self, name):
+        return self.providers[name].instance is not None
+
+    def load(self, provider):
+        for name in provider.requires:
+            self.get(name)
+
+        before = set(sys.modules)
+        gc.collect()
+        heap = mem_alloc()
+        start = ticks_ms()
+        try:
+            module = __import__(provider.module)
+            provider.import_ms = ticks_diff(ticks_ms(), start)
+            gc.collect()
+            provider.import_heap = mem_alloc() - heap
+            provider.modules = [name for name in sys.modules if name not in before]
+
+            heap = mem_alloc()
+            start = ticks_ms()
+            provider.instance = provider.factory(module)
+            provider.init_ms = ticks_diff(ticks_ms(), start)
+            provider.init_heap = mem_alloc() - heap
+        except Exception as e:
+            provider.error = str(e)
+            raise
+        provider.error = None
+        provider.loads += 1
+        print(f"Loaded {provider.name}: import {provider.import_ms} ms, "
+              f"{provider.import_heap} B; init {provider.init_ms} ms, {provider.init_heap} B")
+
+    def unload(self, name):
+        """Drop a subsystem and the modules it imported (rebuilt on next use)"""
+        provider = self.providers[name]
+        if provider.instance is None:
+            return False
+        provider.instance = None
+        for module in provider.modules:
+            sys.modules.pop(module, None)
+        gc.collect()
+        print(f"Unloaded {name}")
+        return True
+
+    def trim(self, min_free, idle_ms=60000):
+        """
+        Unload idle unloadable subsystems, least recently used first,
+        until at least min_free heap bytes are free
+
+        Returns:
+            Names of the unloaded subsystems
+        """
+        if not hasattr(gc, "mem_free"):
+            return []
+        gc.collect()
+        now = ticks_ms()
+        idle = [provider for provider in self.providers.values()
+                if provider.unloadable and provider.instance is not None
+                and ticks_diff(now, provider.last_used) >= idle_ms]
+        idle.sort(key=lambda provider: ticks_diff(now, provider.last_used), reverse=True)
+
+        dropped = []
+        for provider in idle:
+            if gc.mem_free() >= min_free:
+                break
+            self.unload(provider.name)
+            dropped.append(provider.name)
+        return dropped
+
+    async def watch_memory(self, min_free, interval=10):
+        """Trim idle subsystems whenever free heap drops below min_free"""
+        while True:
+            await asyncio.sleep(interval)
+            self.trim(min_free)
+
+    def errors(self):
+        return {name: provider.error for name, provider in self.providers.items()
+                if provider.error}
+
+    def status(self):
+        return {name: provider.profile() for name, provider in self.providers.items()}
+
+    def print_profile(self):
+        """Print the import time and heap cost of every loaded subsystem"""
+        print("Subsystem       import ms  import B  init ms    init B")
+        for name, provider in self.providers.items():
+            if provider.loads:
+                print(f"{name:<15} {provider.import_ms:>9} {provider.import_heap:>9} "
+                      f"{provider.init_ms:>8} {provider.init_heap:>9}")
+            else:
+                print(f"{name:<15} (not loaded)")
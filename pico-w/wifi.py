@@ -0,0 +1,267 @@
+"""
+WiFi Manager for iRackPilot Pico W
+Brings the network up without blocking and keeps the station link alive
+"""
+
+import time
+import random
+import socket
+import struct
+import network
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+STAT_GOT_IP = getattr(network, "STAT_GOT_IP", 3)
+
+NTP_PORT = 123
+# Seconds from the NTP era (1900) to this port's epoch (1970, or 2000 on older ports)
+NTP_DELTA = 2208988800 + (946684800 if time.gmtime(0)[0] == 2000 else 0)
+
+
+class WiFiManager:
+    """Station/AP state machine with a reconnect supervisor"""
+
+    def __init__(self, ssid, password, ap_ssid, ap_password, ap_fallback_after=10):
+        self.ssid = ssid
+        self.password = password
+        self.ap_ssid = ap_ssid
+        self.ap_password = ap_password
+        self.ap_fallback_after = ap_fallback_after
+        self.connect_timeout = 15
+        self.check_interval = 2
+        self.poll_interval = 0.25
+        self.min_backoff = 1
+        self.max_backoff = 60
+        self.keep_ap = False
+        self.sta = None
+        self.ap = None
+        self.state = "down"
+        self.last_up = ticks_ms()
+        self.reconnects = 0
+        self.last_error = None
+        self.ready = asyncio.Event()
+        # NTP: the scheduler's absolute times need the RTC set. Failed
+        # syncs back off from ntp_retry up to ntp_interval.
+        self.ntp_host = "pool.ntp.org"
+        self.ntp_timeout = 1
+        self.ntp_interval = 24 * 3600
+        self.ntp_retry = 300
+        self.ntp_wait = self.ntp_retry
+        self.ntp_address = None
+        self.clock_synced = False
+        self.last_ntp = None
+
+    def has_credentials(self):
+        return bool(self.ssid and self.password)
+
+    def is_connected(self):
+        return self.sta is not None and self.sta.isconnected()
+
+    def ap_active(self):
+        return self.ap is not None and self.ap.active()
+
+    def ip(self):
+        """Station address, else the AP address, else None"""
+        if self.is_connected():
+            return self.sta.ifconfig()[0]
+        if self.ap_active():
+            return self.ap.ifconfig()[0]
+        return None
+
+    def status(self):
+        info = {
+            "state": "connected" if self.is_connected() else self.state,
+            "ip": self.ip(),
+            "ap_active": self.ap_active(),
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "clock_synced": self.clock_synced,
+        }
+        if self.is_connected():
+            try:
+                info["rssi"] = self.sta.status('rssi')
+            except (OSError, ValueError):
+                pass
+        return info
+
+    async def wait_ready(self):
+        """Wait until the device has an address (station or AP)"""
+        await self.ready.wait()
+
+    def start_ap(self):
+        """Start Access Point mode for configuration (alongside the station)"""
+        if self.ap_active():
+            return
+        ap = network.WLAN(network.AP_IF)
+        ap.active(True)
+
+        # Generate unique SSID
+        import ubinascii
+        mac = ubinascii.hexlify(network.WLAN().config('mac'), ':').decode()
+        ssid = self.ap_ssid.format(mac[-4:])
+
+        ap.config(essid=ssid, password=self.ap_password)
+        ap.config(authmode=3)  # WPA2
+        self.ap = ap
+        print(f'AP Mode started. SSID: {ssid}, IP: {ap.ifconfig()[0]}')
+        self.ready.set()
+
+    def stop_ap(self):
+        if self.ap_active():
+            self.ap.active(False)
+            print("AP Mode stopped")
+
+    def on_connected(self):
+        self.state = "connected"
+        self.last_error = None
+        print(f'Connected to WiFi. IP: {self.ip()}')
+        self.ready.set()
+        if not self.keep_ap:
+            self.stop_ap()
+
+    async def sync_clock(self):
+        """Set the RTC from NTP without blocking the event loop"""
+        self.last_ntp = ticks_ms()
+        try:
+            seconds = await self.query_ntp()
+            if seconds is None:
+                raise OSError("no reply")
+            set_rtc(seconds)
+        except Exception as e:
+            self.ntp_wait = min(self.ntp_wait * 2, self.ntp_interval)
+            print(f"NTP sync failed: {e}, next try in {self.ntp_wait}s")
+            return
+        self.clock_synced = True
+        self.ntp_wait = self.ntp_interval
+        print("Clock set from NTP")
+
+    async def query_ntp(self):
+        """
+        Ask the NTP server for the time: seconds since the epoch, or None
+
+        The socket is non-blocking and polled, so a missing server costs
+        ntp_timeout of waiting but never stalls other tasks. The server
+        name is resolved once and cached.
+        """
+        if self.ntp_address is None:
+            self.ntp_address = socket.getaddrinfo(self.ntp_host, NTP_PORT)[0][-1]
+        query = bytearray(48)
+        query[0] = 0x1B  # LI 0, version 3, client mode
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sock.sendto(query, self.ntp_address)
+            start = ticks_ms()
+            while ticks_diff(ticks_ms(), start) < self.ntp_timeout * 1000:
+                try:
+                    reply = sock.recv(48)
+                except OSError:
+                    await asyncio.sleep(0.05)
+                    continue
+                if len(reply) >= 48:
+                    return struct.unpack("!I", reply[40:44])[0] - NTP_DELTA
+            return None
+        finally:
+            sock.close()
+
+    def clock_due(self):
+        """Whether to (re)sync: daily once set, with growing backoff until then"""
+        if self.last_ntp is None:
+            return True
+        return ticks_diff(ticks_ms(), self.last_ntp) >= self.ntp_wait * 1000
+
+    async def connect(self):
+        """Associate the station; True once it has an address"""
+        self.state = "connecting"
+        try:
+            self.sta.disconnect()
+        except OSError:
+            pass
+        self.sta.connect(self.ssid, self.password)
+
+        start = ticks_ms()
+        while ticks_diff(ticks_ms(), start) < self.connect_timeout * 1000:
+            status = self.sta.status()
+            if status == STAT_GOT_IP and self.sta.isconnected():
+                self.on_connected()
+                return True
+            if status < 0:
+                # Wrong password, no AP found or connect failure
+                self.last_error = f"status {status}"
+                break
+            await asyncio.sleep(self.poll_interval)
+        else:
+            self.last_error = "timeout"
+
+        self.state = "down"
+        return False
+
+    async def watch_ap(self):
+        """Run the AP whenever the station has been down for too long"""
+        while True:
+            if self.is_connected():
+                self.last_up = ticks_ms()
+            elif (not self.ap_active()
+                    and ticks_diff(ticks_ms(), self.last_up) >= self.ap_fallback_after * 1000):
+                print("WiFi not connected, starting AP mode...")
+                self.start_ap()
+            await asyncio.sleep(self.check_interval)
+
+    async def run(self):
+        """Bring the network up, then reconnect with backoff whenever the link drops"""
+        self.sta = network.WLAN(network.STA_IF)
+        self.sta.active(True)
+
+        if not self.has_credentials():
+            print("No WiFi credentials, starting AP mode...")
+            self.start_ap()
+            return
+
+        print(f"Connecting to {self.ssid}...")
+        asyncio.create_task(self.watch_ap())
+        backoff = self.min_backoff
+
+        while True:
+            if self.is_connected():
+                if self.state != "connected":
+                    # The driver re-associated by itself during a backoff
+                    self.on_connected()
+                    backoff = self.min_backoff
+                elif self.clock_due():
+                    await self.sync_clock()
+                await asyncio.sleep(self.check_interval)
+                continue
+
+            if self.state == "connected":
+                print("WiFi link lost, reconnecting...")
+                self.reconnects += 1
+
+            if await self.connect():
+                backoff = self.min_backoff
+                continue
+
+            # Exponential backoff with jitter so many devices don't retry in step
+            delay = backoff + random.randint(0, backoff * 500) / 1000
+            print(f"WiFi connect failed ({self.last_error}), retrying in {delay:.1f}s")
+            self.state = "backoff"
+            backoff = min(backoff * 2, self.max_backoff)
+            await asyncio.sleep(delay)
+
+
+def set_rtc(seconds):
+    """Set the RTC to seconds since the epoch (UTC), as ntptime.settime does"""
+    import machine
+    tm = time.gmtime(seconds)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+UF2 Delta Tool for iRackPilot Firmware
+Extracts UF2 files to flat images and builds UF2 files holding only changed blocks
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import sys
+
+from create_uf2 import (
+    FAMILY_ID_RP2040,
+    UF2_BLOCK_SIZE,
+    UF2_FLAG_FAMILY_ID_PRESENT,
+    UF2_HEADER,
+    UF2_MAGIC_START0,
+    UF2_MAGIC_START1,
+    UF2_PAYLOAD_SIZE,
+    collect_pages,
+    load_segments,
+    map_input,
+    parse_input_spec,
+    parse_int,
+    uf2_problems,
+    write_uf2_pages,
+)
+
+# Digest size for per-page hashes (128 bits is plenty to detect changes)
+PAGE_DIGEST_SIZE = 16
+
+# The RP2040 bootrom erases a whole flash sector before programming it
+FLASH_SECTOR_SIZE = 4096
+
+def is_uf2(data):
+    """Check whether data starts with a UF2 block"""
+    if len(data) < UF2_BLOCK_SIZE:
+        return False
+    magic0, magic1 = UF2_HEADER.unpack_from(data, 0)[:2]
+    return magic0 == UF2_MAGIC_START0 and magic1 == UF2_MAGIC_START1
+
+def uf2_family(data):
+    """Family ID of the first block, or None if not present"""
+    fields = UF2_HEADER.unpack_from(data, 0)
+    flags, family_id = fields[2], fields[7]
+    return family_id if flags & UF2_FLAG_FAMILY_ID_PRESENT else None
+
+def uf2_pages(data):
+    """
+    Decode a UF2 image into (address, payload) pages sorted by address
+
+    Payloads are memoryviews into data, so nothing is copied.
+    """
+    problems = uf2_problems(data, contiguous=False, payload_size=None)
+    if problems:
+        raise ValueError('; '.join(problems))
+
+    view = memoryview(data)
+    pages = []
+    for offset in range(0, len(view), UF2_BLOCK_SIZE):
+        fields = UF2_HEADER.unpack_from(data, offset)
+        addr, size = fields[3], fields[4]
+        start = offset + UF2_HEADER.size
+        pages.append((addr, view[start:start + size]))
+    pages.sort(key=lambda page: page[0])
+    return pages
+
+def page_digest(payload):
+    """Hash of one page payload"""
+    return hashlib.blake2b(payload, digest_size=PAGE_DIGEST_SIZE).digest()
+
+def page_hashes(pages):
+    """Hash every page, returns {address: digest}"""
+    return {addr: page_digest(payload) for addr, payload in pages}
+
+class Image:
+    """A UF2 file, flat binary, ELF or Intel HEX file opened as pages"""
+
+    def __init__(self, spec, base_address=0x10000000):
+        self.maps = []
+        self.family_id = None
+        path, address = parse_input_spec(spec)
+        with open(path, 'rb') as f:
+            data = map_input(f)
+        if is_uf2(data):
+            self.maps.append(data)
+            self.family_id = uf2_family(data)
+            self.pages = uf2_pages(data)
+        else:
+            if isinstance(data, mmap.mmap):
+                data.close()
+            segments = load_segments(path, base_address if address is None else address,
+                                     self.maps)
+            self.pages = collect_pages(segments)
+
+    def close(self):
+        self.pages = []
+        for data in self.maps:
+            try:
+                data.close()
+            except BufferError:
+                # A caller still holds a payload view; freed with it
+                pass
+        self.maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_hashes(spec, base_address):
+    """Page hashes from a saved manifest (.json) or any image"""
+    if spec.endswith('.json'):
+        with open(spec) as f:
+            manifest = json.load(f)
+        return {int(addr, 16): bytes.fromhex(digest)
+                for addr, digest in manifest['pages'].items()}
+    with Image(spec, base_address) as image:
+        return page_hashes(image.pages)
+
+def save_hashes(hashes, filename):
+    """Write a page hash manifest usable as the "old" side of a diff"""
+    manifest = {
+        "page_size": UF2_PAYLOAD_SIZE,
+        "pages": {f"0x{addr:08x}": digest.hex() for addr, digest in sorted(hashes.items())},
+    }
+    with open(filename, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+def extract_uf2(uf2_file, output_file, fill=0xFF):
+    """
+    Extract a UF2 file to a flat, address-mapped image
+
+    Gaps between blocks are filled with the fill byte (erased flash).
+
+    Returns:
+        (base_address, image_size)
+    """
+    with Image(uf2_file) as image:
+        if not image.maps:
+            raise ValueError(f"{uf2_file} is not a UF2 file")
+        if not image.pages:
+            raise ValueError(f"{uf2_file} has no blocks")
+
+        base = image.pages[0][0]
+        gap = bytes([fill]) * UF2_PAYLOAD_SIZE
+        position = base
+        with open(output_file, 'wb') as dst:
+            for addr, payload in image.pages:
+                while position < addr:
+                    count = min(addr - position, len(gap))
+                    dst.write(gap[:count])
+                    position += count
+                if addr < position:
+                    raise ValueError(f"Overlapping blocks at 0x{addr:08x}")
+                dst.write(payload)
+                position = addr + len(payload)
+        return base, position - base
+
+def diff_images(old_spec, new_spec, output_file, family_id=None, base_address=0x10000000,
+                sector_size=FLASH_SECTOR_SIZE):
+    """
+    Write a UF2 file holding only the blocks of new that differ from old
+
+    old may be a UF2 file, binary, ELF, Intel HEX or a saved hash manifest.
+    Because the bootloader erases a sector before programming it, every
+    page of new in a sector with a changed page is included as well;
+    pass sector_size=256 for a strict page-level delta.
+
+    Returns:
+        Dict with total, changed, emitted, unchanged and removed page counts
+    """
+    old_hashes = load_hashes(old_spec, base_address)
+    
+    with Image(new_spec, base_address) as new:
+        changed = [addr for addr, payload in new.pages
+                   if old_hashes.get(addr) != page_digest(payload)]
+        dirty = {addr - addr % sector_size for addr in changed}
+        emitted = [page for page in new.pages if page[0] - page[0] % sector_size in dirty]
+        
+        family_id = family_id or new.family_id or FAMILY_ID_RP2040
+        write_uf2_pages(emitted, output_file, family_id)
+        new_addrs = {addr for addr, _ in new.pages}
+        
+        stats = {
+            "total": len(new.pages),
+            "changed": len(changed),
+            "emitted": len(emitted),
+            "unchanged": len(new.pages) - len(changed),
+            # Pages only in old can't be expressed in UF2 (no erase blocks)
+            "removed": sum(1 for addr in old_hashes if addr not in new_addrs),
+        }
+        del emitted
+        return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="UF2 extract/diff tool for iRackPilot firmware")
+    parser.add_argument('--base', type=parse_int, default=0x10000000,
+                        help="base address for binary inputs without @address")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    extract = sub.add_parser('extract', help="extract a UF2 file to a flat image")
+    extract.add_argument('uf2')
+    extract.add_argument('output')
+    extract.add_argument('--fill', type=parse_int, default=0xFF,
+                         help="byte used for gaps between blocks (default: 0xff)")
+
+    diff = sub.add_parser('diff', help="write a UF2 holding only changed blocks")
+    diff.add_argument('old', help="previous image (UF2, bin, ELF, HEX or hash manifest .json)")
+    diff.add_argument('new', help="new image (UF2, bin, ELF or HEX)")
+    diff.add_argument('-o', '--output', required=True)
+    diff.add_argument('--family', type=parse_int, default=None)
+    diff.add_argument('--sector-size', type=parse_int, default=FLASH_SECTOR_SIZE,
+                      help="erase sector size; changed sectors are emitted whole "
+                           "(256 for a page-level delta)")
+
+    hashes = sub.add_parser('hashes', help="save a page hash manifest of an image")
+    hashes.add_argument('image')
+    hashes.add_argument('-o', '--output', required=True)
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'extract':
+            base, size = extract_uf2(args.uf2, args.output, args.fill)
+            print(f"Extracted {args.output} ({size} bytes at 0x{base:08x})")
+
+        elif args.command == 'diff':
+            stats = diff_images(args.old, args.new, args.output, args.family, args.base,
+                                args.sector_size)
+            print(f"{stats['changed']}/{stats['total']} pages changed, "
+                  f"{stats['emitted']} emitted with their sectors")
+            if stats['removed']:
+                print(f"Warning: {stats['removed']} pages only exist in the old image "
+                      "and are left as-is on the device")
+            print(f"Created {args.output} ({stats['emitted'] * UF2_BLOCK_SIZE} bytes, "
+                  f"{stats['emitted']} blocks)")
+
+        else:
+            with Image(args.image, args.base) as image:
+                page_map = page_hashes(image.pages)
+            save_hashes(page_map, args.output)
+            print(f"Saved {len(page_map)} page hashes to {args.output}")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()